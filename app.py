@@ -12,7 +12,10 @@ from imaplib import IMAP4_SSL
 from email import policy
 from email.parser import BytesParser
 from email.utils import parsedate_to_datetime
-import re
+from email_normalizer import normalize_email
+from mbox_index import INDEX_EXTENSION, load_raw_message
+from llm_json import extract_json
+from llm_metrics import metrics_callbacks, start_metrics_server
 
 # Load environment variables
 load_dotenv()
@@ -24,9 +27,21 @@ SMTP_PORT = 587
 EMAIL_USER = os.getenv("EMAIL_USER")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 
+# Converted archive (see mbox_to_csv.py) and the mbox files it was converted from
+ARCHIVE_DIR = "./Past_email_mbox"
+MBOX_DIR = "./Mbox_Files"
+
 # Initialize OpenAI LLM
 llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
 
+# Calls are recorded per feature in llm_metrics; with LLM_METRICS_PORT set, /metrics is
+# served from the start so it can be scraped before the first call
+start_metrics_server()
+
+def ask_llm(stage, prompt):
+    """Send one prompt to the LLM, recording the call under stage."""
+    return llm.invoke([HumanMessage(content=prompt)], config={"callbacks": metrics_callbacks(stage)})
+
 # Streamlit Setup
 st.set_page_config(page_title="AI Email Assistant", layout="wide")
 st.title("AI-Powered Email Assistant")
@@ -157,11 +172,8 @@ local event and advanced to the global finalist stage. Git.
 """
 
 def clean_email_body(body: str) -> str:
-    """Clean email body by removing unnecessary links and tracking details."""
-    cleaned_body = re.sub(r"https?://\S+", "", body)  # Remove all URLs
-    cleaned_body = re.sub(r"\s{2,}", " ", cleaned_body)  # Replace multiple spaces with a single space
-    cleaned_body = re.sub(r"\n+", "\n", cleaned_body)  # Remove excessive line breaks
-    return cleaned_body.strip()  # Trim leading/trailing whitespace
+    """Clean email body by removing quoted replies, signatures, footers and tracking links (see email_normalizer)."""
+    return normalize_email(body, shorten_urls=False)  # the drafted replies need the full URLs
 
 def fetch_emails_from_past_1_hour():
     """Fetch emails from the past 1 hour using IMAP."""
@@ -222,8 +234,15 @@ def analyze_email(email_content: str):
         "action_needed": "Yes or No"
     }}
     """
-    response = llm.invoke([HumanMessage(content=analysis_prompt)])
-    return eval(response.content.strip())  # Convert JSON string to dictionary
+    response = ask_llm("app.analyze_email", analysis_prompt)
+    try:
+        analysis = extract_json(response.content)  # Parse the JSON answer, never evaluate it
+    except ValueError as e:
+        st.warning(f"Could not parse the analysis: {e}")
+        analysis = {}
+    if not isinstance(analysis, dict):
+        analysis = {}
+    return {key: analysis.get(key, "Unknown") for key in ("category", "importance", "action_needed")}
 
 def draft_cold_email(company_name: str, recruiter_name: str, jd: str = None):
     """Draft a cold email to a recruiter."""
@@ -236,7 +255,7 @@ def draft_cold_email(company_name: str, recruiter_name: str, jd: str = None):
     - Have a professional tone.
     - Reference a specific job description (if provided): {jd}.
     """
-    response = llm.invoke([HumanMessage(content=email_prompt)])
+    response = ask_llm("app.cold_email", email_prompt)
     return response.content.strip()
 
 def draft_linkedin_message(company_name: str, recruiter_name: str):
@@ -245,7 +264,7 @@ def draft_linkedin_message(company_name: str, recruiter_name: str):
     Write a LinkedIn message to {recruiter_name} from Zeel Prajapati, showing interest in connecting and discussing opportunities at {company_name}.
     Keep it concise (50-60 words), professional, and use a warm tone. Add emojis to make it engaging.
     """
-    response = llm.invoke([HumanMessage(content=linkedin_prompt)])
+    response = ask_llm("app.linkedin_message", linkedin_prompt)
     return response.content.strip()
 
 def draft_connection_request(company_name: str, recruiter_name: str):
@@ -254,7 +273,7 @@ def draft_connection_request(company_name: str, recruiter_name: str):
     Write a LinkedIn connection request message to {recruiter_name} from Zeel Prajapati, showing interest in {company_name}.
     Keep it concise (under 300 characters) and friendly. Add 1-2 emojis for a positive tone.
     """
-    response = llm.invoke([HumanMessage(content=connection_prompt)])
+    response = ask_llm("app.connection_request", connection_prompt)
     return response.content.strip()
 
 def send_email(recipient, subject, body):
@@ -295,12 +314,12 @@ def draft_cover_letter(company_name: str, recruiter_name: str, jd: str = None):
     - Highlight relevant skills and achievements.
     - Conclude with a strong call to action.
     """
-    response = llm.invoke([HumanMessage(content=cover_letter_prompt)])
+    response = ask_llm("app.cover_letter", cover_letter_prompt)
     return response.content.strip()
 
 # Sidebar Menu
 st.sidebar.title("Menu")
-action = st.sidebar.selectbox("Choose an action:", ["Fetch and Analyze Emails", "Generate Outreach Messages", "Send Email"])
+action = st.sidebar.selectbox("Choose an action:", ["Fetch and Analyze Emails", "Generate Outreach Messages", "Send Email", "View Archived Email"])
 
 if action == "Fetch and Analyze Emails":
     st.header("Emails from the Past 1 Hour with Analysis")
@@ -360,4 +379,29 @@ elif action == "Send Email":
         if recipient and subject and body:
             send_email(recipient, subject, body)
         else:
-            st.error("Please fill in all fields.")
\ No newline at end of file
+            st.error("Please fill in all fields.")
+
+elif action == "View Archived Email":
+    st.header("View an Archived Email")
+    index_files = sorted(f for f in os.listdir(ARCHIVE_DIR) if f.endswith(INDEX_EXTENSION)) if os.path.isdir(ARCHIVE_DIR) else []
+    if index_files:
+        index_file = st.selectbox("Label:", index_files)
+        lookup = st.text_input("Enter a row number or Message-ID:")
+        if st.button("Load Email") and lookup:
+            index_path = os.path.join(ARCHIVE_DIR, index_file)
+            try:
+                if lookup.strip().isdigit():
+                    raw_message = load_raw_message(index_path, MBOX_DIR, row=int(lookup))
+                else:
+                    raw_message = load_raw_message(index_path, MBOX_DIR, message_id=lookup)
+            except (IndexError, OSError, ValueError) as e:
+                st.error(f"Error loading email: {e}")
+                raw_message = None
+            if raw_message:
+                msg = BytesParser(policy=policy.default).parsebytes(raw_message)
+                st.write(f"**{msg['subject'] or 'No Subject'}** from {msg['from']} ({msg['date']})")
+                st.text_area("Raw Email", value=raw_message.decode("utf-8", errors="replace"), height=400)
+            else:
+                st.write("Email not found in the archive.")
+    else:
+        st.write("No archive index found. Run mbox_to_csv.py first.")
\ No newline at end of file
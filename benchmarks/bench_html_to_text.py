@@ -0,0 +1,104 @@
+"""
+Benchmark html_to_text against a naive BeautifulSoup get_text() pass.
+
+Run from the repository root:
+    python -m benchmarks.bench_html_to_text --count 2000
+"""
+import argparse
+import random
+import time
+
+from html_to_text import html_to_text
+
+NEWSLETTER_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style type="text/css">body{{margin:0;padding:0}} .btn{{background:#0a66c2;color:#fff}} @media (max-width:600px){{.col{{width:100%!important}}}}</style>
+<!--[if mso]><xml><o:OfficeDocumentSettings><o:PixelsPerInch>96</o:PixelsPerInch></o:OfficeDocumentSettings></xml><![endif]-->
+</head><body>
+<div style="display:none;max-height:0;overflow:hidden">{preheader}&zwnj;&nbsp;&zwnj;&nbsp;&zwnj;&nbsp;</div>
+<table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0"><tr><td align="center">
+<table role="presentation" width="600" cellpadding="0" cellspacing="0" border="0" class="col">
+{rows}
+</table></td></tr></table>
+<img src="https://t.example.com/open/{tracking}.gif" width="1" height="1" alt="" style="display:block">
+<script type="application/ld+json">{{"@context":"http://schema.org","@type":"EmailMessage"}}</script>
+</body></html>
+"""
+
+ROW_TEMPLATE = """<tr><td style="padding:12px 24px;font-family:Arial,sans-serif;font-size:14px;color:#333333">
+<h2 style="margin:0">{heading}</h2><p>{text}</p>
+<a class="btn" href="https://click.example.com/ls/click?upn={tracking}&amp;utm_source=newsletter">Apply now</a>
+</td></tr>"""
+
+WORDS = (
+    "data scientist role team apply application interview deadline python machine learning "
+    "opportunity remote hybrid salary benefits hiring manager update status recruiter offer"
+).split()
+
+def sample_newsletter_html(rng, sections=8):
+    """Build a synthetic marketing/ATS style HTML email with layout tables and tracking."""
+    rows = "\n".join(
+        ROW_TEMPLATE.format(
+            heading=" ".join(rng.choices(WORDS, k=4)).title(),
+            text=" ".join(rng.choices(WORDS, k=rng.randint(20, 60))),
+            tracking="%032x" % rng.getrandbits(128)
+        )
+        for _ in range(sections)
+    )
+    return NEWSLETTER_TEMPLATE.format(
+        title=" ".join(rng.choices(WORDS, k=5)),
+        preheader=" ".join(rng.choices(WORDS, k=10)),
+        rows=rows,
+        tracking="%032x" % rng.getrandbits(128)
+    )
+
+def beautifulsoup_to_text(markup):
+    """The naive baseline: parse the whole document and take every text node."""
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(markup, "html.parser").get_text(" ")
+
+def run(convert, documents, repeat):
+    """Return (best seconds per pass, total output characters) for a converter."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output_chars = sum(len(convert(document)) for document in documents)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output_chars
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1000, help="number of HTML emails")
+    parser.add_argument("--sections", type=int, default=8, help="content sections per email")
+    parser.add_argument("--repeat", type=int, default=3, help="passes per converter; the best is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    documents = [sample_newsletter_html(rng, args.sections) for _ in range(args.count)]
+    input_mb = sum(len(document.encode("utf-8")) for document in documents) / 1e6
+    input_chars = sum(len(document) for document in documents)
+    print(f"{args.count} HTML emails, {input_mb:.1f} MB")
+
+    converters = [("html_to_text", html_to_text)]
+    try:
+        import bs4  # noqa: F401
+        converters.append(("BeautifulSoup", beautifulsoup_to_text))
+    except ImportError:
+        print("bs4 is not installed; skipping the BeautifulSoup baseline")
+
+    results = {}
+    for name, convert in converters:
+        seconds, output_chars = run(convert, documents, args.repeat)
+        results[name] = seconds
+        print(
+            f"{name:>14}: {args.count / seconds:10.0f} emails/s  {input_mb / seconds:8.1f} MB/s  "
+            f"output {output_chars / input_chars:6.1%} of input characters"
+        )
+    if "BeautifulSoup" in results:
+        print(f"html_to_text speedup: {results['BeautifulSoup'] / results['html_to_text']:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Guard startup latency: import each pipeline module in a fresh interpreter, report how long
+the import takes and which heavy dependencies it pulled in, and fail (exit status 1) if any
+module is over --max-ms, loads one of HEAVY_MODULES, or cannot be imported.
+
+Run from the repository root:
+    python -m benchmarks.bench_import
+    python -m benchmarks.bench_import --max-ms 150 --repeat 5 cli faq
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+MODULES = [
+    "cli", "email_cleaning", "email_cleaning_larger_chunk", "mbox_to_csv", "faq", "create_knowledge_base",
+    "task_engine", "task_planner", "email_normalizer", "llm_tokens", "local_classifier",
+]
+
+# Loaded on first use only; importing a module must not bring any of them in
+HEAVY_MODULES = [
+    "openai", "langchain", "langchain_community", "transformers", "torch", "tiktoken", "sklearn", "pyarrow",
+    "chromadb", "streamlit", "pandas", "bs4",
+]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps([elapsed, sorted(name for name in {heavy!r} if name in sys.modules)]))
+"""
+
+def measure(module):
+    """(seconds to import module in a fresh interpreter, heavy modules it loaded), or raises RuntimeError."""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)], capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    elapsed, heavy = json.loads(result.stdout.strip().splitlines()[-1])
+    return elapsed, heavy
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=MODULES, help="modules to import (default: the pipeline's)")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh imports per module; the best is reported")
+    parser.add_argument("--max-ms", type=float, default=300, help="slowest acceptable import")
+    args = parser.parse_args()
+
+    failures = 0
+    for module in args.modules:
+        try:
+            runs = [measure(module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{module:>28}: FAILED to import ({e})")
+            failures += 1
+            continue
+        elapsed = min(seconds for seconds, heavy in runs)
+        heavy = runs[0][1]
+        problems = []
+        if elapsed * 1000 > args.max_ms:
+            problems.append(f"over {args.max_ms:g} ms")
+        if heavy:
+            problems.append(f"loads {', '.join(heavy)}")
+        failures += bool(problems)
+        print(f"{module:>28}: {elapsed * 1000:7.1f} ms  {'; '.join(problems) or 'ok'}")
+    if failures:
+        print(f"{failures} of {len(args.modules)} modules failed the import-time guard")
+        sys.exit(1)
+    print(f"All {len(args.modules)} modules import in under {args.max_ms:g} ms without heavy dependencies")
+
+if __name__ == "__main__":
+    main()
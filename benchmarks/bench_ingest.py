@@ -0,0 +1,86 @@
+"""
+Benchmark the mbox ingest stage (mbox_to_csv.convert_mboxes_to_csv) on a synthetic mbox.
+
+Each configuration runs in a fresh process so its peak RSS is measured on its own;
+worker processes are included. Runs fully offline.
+
+Run from the repository root:
+    python -m benchmarks.bench_ingest --count 5000 --attachment-kb 300 --workers 1,4
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_mbox import add_generator_arguments, generator_options, write_synthetic_mbox
+from mbox_to_csv import MIN_SHARD_BYTES, convert_mboxes_to_csv
+
+def peak_rss_mb():
+    """Peak resident set size of this process and its finished children, in MB."""
+    scale = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is in bytes on macOS, KB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return max(own, children) / 1e6
+
+def convert_once(input_dir, output_dir, workers, min_shard_bytes, output_format, results):
+    """Run one conversion in this (fresh) process and report (seconds, peak RSS MB)."""
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        convert_mboxes_to_csv(input_dir, output_dir, workers=workers, min_shard_bytes=min_shard_bytes,
+                              incremental=False, output_format=output_format)
+    results.put((time.perf_counter() - started, peak_rss_mb()))
+
+def run(input_dir, workers, min_shard_bytes, output_format, repeat):
+    """Return (best seconds, highest peak RSS MB) over repeat runs of one configuration."""
+    context = multiprocessing.get_context("spawn")
+    best, peak = None, 0.0
+    for _ in range(repeat):
+        output_dir = tempfile.mkdtemp(prefix="bench_ingest_out_")
+        try:
+            results = context.Queue()
+            process = context.Process(
+                target=convert_once, args=(input_dir, output_dir, workers, min_shard_bytes, output_format, results)
+            )
+            process.start()
+            seconds, rss = results.get()
+            process.join()
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        best = seconds if best is None else min(best, seconds)
+        peak = max(peak, rss)
+    return best, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_generator_arguments(parser)
+    parser.add_argument("--workers", default="1", help="comma-separated worker counts to compare")
+    parser.add_argument("--min-shard-mb", type=float, default=MIN_SHARD_BYTES / 2 ** 20,
+                        help="smallest byte range converted by one worker, in MiB")
+    parser.add_argument("--formats", default="csv", help="comma-separated output formats (csv, parquet)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per configuration; the best time is reported")
+    args = parser.parse_args()
+
+    input_dir = tempfile.mkdtemp(prefix="bench_ingest_in_")
+    try:
+        started = time.perf_counter()
+        size = write_synthetic_mbox(os.path.join(input_dir, "Synthetic.mbox"), **generator_options(args))
+        print(f"{args.count} synthetic messages, {size / 1e6:.1f} MB (generated in {time.perf_counter() - started:.1f}s)")
+
+        for output_format in args.formats.split(","):
+            for workers in [int(value) for value in args.workers.split(",")]:
+                seconds, rss = run(input_dir, workers, int(args.min_shard_mb * 2 ** 20), output_format, args.repeat)
+                print(
+                    f"{output_format:>8} workers={workers:<3}: {args.count / seconds:9.0f} msgs/s  "
+                    f"{size / 1e6 / seconds:8.1f} MB/s  peak RSS {rss:7.1f} MB"
+                )
+    finally:
+        shutil.rmtree(input_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark llm_executor.map_concurrently against one-at-a-time API calls, using the local
+fake OpenAI endpoint (benchmarks/fake_openai.py), so it runs fully offline.
+
+Run from the repository root:
+    python -m benchmarks.bench_llm_concurrency --count 200 --latency 0.3 --concurrency 1,8,32
+"""
+import argparse
+import json
+import random
+import time
+
+import openai
+
+from benchmarks.bench_html_to_text import WORDS
+from benchmarks.fake_openai import ECHO_CHARS, start_fake_openai
+from llm_executor import map_concurrently
+
+def chat(text):
+    """One chat completion call, like the parse_* functions in email_cleaning."""
+    response = openai.ChatCompletion.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "Convert the email into original message / reply pairs."},
+            {"role": "user", "content": text}
+        ]
+    )
+    return response["choices"][0]["message"]["content"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200, help="number of emails")
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per fake API call")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--rpm", type=int, default=3500, help="requests per minute allowed by the limiter")
+    parser.add_argument("--tpm", type=int, default=10 ** 9, help="tokens per minute allowed by the limiter")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    emails = [f"email {index:06d} " + " ".join(rng.choices(WORDS, k=rng.randint(50, 400))) for index in range(args.count)]
+    server, openai.api_base, stats = start_fake_openai(latency=args.latency)
+    openai.api_key = "fake"
+    print(f"{args.count} emails, fake API latency {args.latency * 1000:.0f} ms")
+
+    try:
+        for max_concurrency in [int(value) for value in args.concurrency.split(",")]:
+            stats["max_in_flight"] = 0
+            started = time.perf_counter()
+            results = map_concurrently(chat, emails, max_concurrency, args.rpm, args.tpm)
+            seconds = time.perf_counter() - started
+            in_order = all(
+                json.loads(result)["original_message"] == email[:ECHO_CHARS] for result, email in zip(results, emails)
+            )
+            print(
+                f"concurrency {max_concurrency:>3}: {args.count / seconds:8.1f} emails/s  "
+                f"max in flight {stats['max_in_flight']:>3}  results in order: {in_order}"
+            )
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Measure how many tokens email_normalizer saves per email category: the average tokens of a
+body as stored in the tables against the normalized body the cleaning stages send.
+
+By default it runs on synthetic emails of each category; with --input it runs on converted
+tables instead (see mbox_to_csv), one category per table (its Gmail label).
+
+Run from the repository root:
+    python -m benchmarks.bench_normalize --count 500
+    python -m benchmarks.bench_normalize --input ./Past_email_mbox/Inbox.csv ./Past_email_mbox/Sent.csv
+"""
+import argparse
+import random
+import time
+from itertools import islice
+
+from benchmarks.bench_html_to_text import WORDS
+from email_normalizer import DROP_QUOTES, LATEST_QUOTE, normalize_email
+from email_store import iter_rows, table_label
+from llm_executor import estimate_tokens
+from llm_tokens import count_tokens
+
+def sentence(rng, low=8, high=20):
+    return " ".join(rng.choices(WORDS, k=rng.randint(low, high))).capitalize() + "."
+
+def paragraph(rng, sentences=3):
+    return " ".join(sentence(rng) for _ in range(sentences))
+
+def tracking_url(rng, host):
+    return f"https://{host}/ls/click?upn={rng.getrandbits(256):064x}&utm_source=email&utm_campaign={rng.getrandbits(32):08x}"
+
+FOOTER = (
+    "You are receiving this email because you signed up for updates. Unsubscribe {unsubscribe} | "
+    "Manage your email preferences | Privacy Policy\n(c) 2024 Example Inc. All rights reserved. 1 Main Street, Springfield"
+)
+LEGAL = (
+    "This email and any attachments are confidential and intended solely for the addressee. If you have received it in "
+    "error, please notify the sender and delete it. Any unauthorized use or disclosure is prohibited."
+)
+SIGNATURE = "Best regards,\n{name}\n{title} | Example Corp\n+1 555 {phone} | www.example.com\n1 Main Street, Springfield"
+
+def promotion(rng):
+    sections = "\n\n".join(f"{paragraph(rng)}\nShop now: {tracking_url(rng, 'click.example.com')}" for _ in range(4))
+    return (f"View this email in your browser: {tracking_url(rng, 'view.example.com')}\n\n{sections}\n\n"
+            f"Offer expires Friday.\n==========================\n"
+            f"{FOOTER.format(unsubscribe=tracking_url(rng, 'email.example.com'))}\n"
+            f"https://t.example.com/open/{rng.getrandbits(128):032x}.gif")
+
+def job_application(rng):
+    return (f"Dear Zeel,\n\nThank you for applying. {paragraph(rng)}\n\nPlease complete the online assessment by "
+            f"March 14: {tracking_url(rng, 'app.hackerrank.com')}\n\n{paragraph(rng, 2)}\n\n"
+            f"{SIGNATURE.format(name='Jane Doe', title='Talent Acquisition', phone=rng.randint(1000, 9999))}\n\n"
+            f"{LEGAL}\n\n{FOOTER.format(unsubscribe=tracking_url(rng, 'greenhouse.io'))}")
+
+def interview(rng):
+    return (f"Hi Zeel,\n\n{paragraph(rng, 2)} Please pick a slot before Wednesday: {tracking_url(rng, 'calendly.com')}\n\n"
+            f"Join with Zoom: https://zoom.us/j/{rng.randint(10 ** 9, 10 ** 10)}?pwd={rng.getrandbits(128):032x}\n\n"
+            f"{SIGNATURE.format(name='John Smith', title='Engineering Manager', phone=rng.randint(1000, 9999))}\n\n"
+            f"Sent from my iPhone\n\n{LEGAL}")
+
+def social(rng):
+    return (f"{paragraph(rng, 2)}\n\nSee the post: {tracking_url(rng, 'www.linkedin.com')}\n"
+            f"Reply: {tracking_url(rng, 'www.linkedin.com')}\n\n-------------------------------\n"
+            f"This is an automated email. Do not reply to this email.\n"
+            f"{FOOTER.format(unsubscribe=tracking_url(rng, 'www.linkedin.com'))}")
+
+def reply_thread(rng, depth=4):
+    """A reply quoting depth earlier messages, each with its own signature."""
+    body = f"Hi Jane,\n\n{paragraph(rng)}\n\nThanks,\nZeel"
+    for level in range(depth):
+        quoted = f"{paragraph(rng)}\n\n{SIGNATURE.format(name='Jane Doe', title='Recruiter', phone=rng.randint(1000, 9999))}"
+        prefix = "> " * (level + 1)
+        body += (f"\n\nOn Mon, Jan {level + 6}, 2025 at 9:0{level} AM Jane Doe <jane@example.com> wrote:\n"
+                 + "\n".join(prefix + line for line in quoted.split("\n")))
+    return body
+
+CATEGORIES = {
+    "promotions": promotion,
+    "job applications": job_application,
+    "interviews": interview,
+    "social": social,
+    "reply threads": reply_thread,
+}
+
+def synthetic_emails(count, seed):
+    """{category: bodies}, flattened the way the tables store them."""
+    rng = random.Random(seed)
+    return {name: [make(rng).replace("\n", " ") for _ in range(count)] for name, make in CATEGORIES.items()}
+
+def table_emails(paths, count):
+    """{table label: bodies} of the first count rows of each table."""
+    return {
+        table_label(path): [row["Body"] for row in islice(iter_rows(path, ["Body"]), count) if row["Body"].strip()]
+        for path in paths
+    }
+
+def token_counter():
+    """count(texts) with the model's tokenizer, or a four-characters-per-token estimate without it."""
+    try:
+        count_tokens(["probe"])
+        return count_tokens
+    except (ImportError, FileNotFoundError) as e:
+        print(f"No tokenizer ({e}); estimating tokens at four characters per token")
+        return lambda texts: [estimate_tokens(text) for text in texts]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=500, help="emails per category")
+    parser.add_argument("--input", nargs="+", help="converted tables (CSV or Parquet) to measure instead")
+    parser.add_argument("--quotes", choices=[DROP_QUOTES, LATEST_QUOTE], default=DROP_QUOTES,
+                        help="quoted history kept, as for classification or for reply tasks")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    emails = table_emails(args.input, args.count) if args.input else synthetic_emails(args.count, args.seed)
+    count = token_counter()
+
+    print(f"{'category':>18}  {'emails':>6}  {'tokens before':>13}  {'after':>7}  {'reduction':>9}  {'emails/s':>9}")
+    total_before = total_after = 0
+    for category, bodies in emails.items():
+        if not bodies:
+            continue
+        started = time.perf_counter()
+        normalized = [normalize_email(body, args.quotes) for body in bodies]
+        elapsed = time.perf_counter() - started
+        before, after = sum(count(bodies)), sum(count(normalized))
+        total_before += before
+        total_after += after
+        print(f"{category:>18}  {len(bodies):6d}  {before / len(bodies):13.0f}  {after / len(bodies):7.0f}  "
+              f"{1 - after / max(before, 1):9.1%}  {len(bodies) / elapsed:9.0f}")
+    print(f"Overall: {1 - total_after / max(total_before, 1):.1%} fewer tokens sent")
+
+if __name__ == "__main__":
+    main()
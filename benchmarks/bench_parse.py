@@ -0,0 +1,68 @@
+"""
+Benchmark message parsing for conversion: the full MIME parse (parse_message + get_body)
+against the lazy parse (parse_message_lazily) and the headers-only fast path (parse_headers),
+on a synthetic mbox with attachments. Runs fully offline.
+
+Run from the repository root:
+    python -m benchmarks.bench_parse --count 2000 --attachment-ratio 0.5 --attachment-kb 500
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic_mbox import add_generator_arguments, generator_options, write_synthetic_mbox
+from mbox_to_csv import get_body, iter_mbox_messages, parse_headers, parse_message, parse_message_lazily
+
+def full_parse(raw_message):
+    message = parse_message(raw_message)
+    return message, get_body(message)
+
+PARSERS = [
+    ("full", full_parse),
+    ("lazy", parse_message_lazily),
+    ("headers-only", parse_headers),
+]
+
+def run(parse, raw_messages, repeat):
+    """Return (best seconds per pass, peak traced MB while parsing one message at a time)."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for raw_message in raw_messages:
+            parse(raw_message)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    for raw_message in raw_messages:
+        parse(raw_message)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_generator_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=3, help="passes per parser; the best is reported")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_parse_") as directory:
+        mbox_file_path = os.path.join(directory, "Synthetic.mbox")
+        size = write_synthetic_mbox(mbox_file_path, **generator_options(args))
+        raw_messages = [raw_message for offset, raw_message in iter_mbox_messages(mbox_file_path)]
+    print(f"{len(raw_messages)} synthetic messages, {size / 1e6:.1f} MB")
+
+    results = {}
+    for name, parse in PARSERS:
+        seconds, peak_mb = run(parse, raw_messages, args.repeat)
+        results[name] = seconds
+        print(
+            f"{name:>12}: {len(raw_messages) / seconds:9.0f} msgs/s  {size / 1e6 / seconds:8.1f} MB/s  "
+            f"peak parse memory {peak_mb:7.1f} MB"
+        )
+    print(f"lazy speedup over full parse: {results['full'] / results['lazy']:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+A local stand-in for the OpenAI chat completions endpoint, for offline benchmarks and
+trying the pipeline without an API key. Every request sleeps for a configurable latency
+and returns a JSON object with the keys the cleaning prompts ask for; original_message
+echoes the start of the user message so callers can check that results stay in order.
+With --rpm, requests over that many per minute get a 429 like the real API.
+
+It also simulates the Batch API lifecycle used by llm_batch: uploaded batch files are
+validated, stay in progress for --batch-seconds and then complete with one answer per
+request, downloadable like the real output file.
+
+Run from the repository root and point the openai client at it:
+    python -m benchmarks.fake_openai --port 8765 --latency 0.5
+    OPENAI_API_BASE=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake python email_cleaning.py
+"""
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from collections import deque
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ECHO_CHARS = 40
+
+def completion_content(user_content):
+    """The JSON answer to one request: an array with an object per email for packed requests."""
+    emails = re.split(r"^Email (\d+):\n", user_content, flags=re.MULTILINE)
+    if len(emails) > 1:
+        return json.dumps([
+            dict(json.loads(completion_content(content.strip())), id=int(number))
+            for number, content in zip(emails[1::2], emails[2::2])
+        ])
+    return json.dumps({
+        "original_message": user_content[:ECHO_CHARS],
+        "Zeel_reply": "Thank you, I am available.",
+        "zeel_reply": "Thank you, I am available.",
+        "follow_up_message": "",
+        "action_required": "No action required",
+        "deadline": "",
+        "important_links": [],
+        "important_instructions": "",
+        "importance": "not important",
+        "category": "Non-Important",
+    })
+
+def chat_completion_response(request):
+    """The chat.completion object answering one request."""
+    messages = request.get("messages", [])
+    user_content = messages[-1]["content"] if messages else ""
+    prompt_tokens = sum(len(message.get("content", "")) for message in messages) // 4
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "gpt-3.5-turbo"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": completion_content(user_content)},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 60, "total_tokens": prompt_tokens + 60},
+    }
+
+def multipart_fields(content_type, body):
+    """{name: bytes} of a multipart/form-data upload."""
+    message = BytesParser().parsebytes(b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body)
+    return {
+        part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+        for part in message.get_payload()
+    }
+
+def batch_status(batch, files, batch_seconds):
+    """Advance a batch through validating, in_progress and completed as time passes."""
+    elapsed = time.time() - batch["created_at"]
+    requests = [json.loads(line) for line in files[batch["input_file_id"]].decode("utf-8").splitlines() if line.strip()]
+    batch["request_counts"]["total"] = len(requests)
+    if batch["status"] == "validating" and elapsed >= batch_seconds / 4:
+        batch["status"] = "in_progress"
+    if batch["status"] == "in_progress" and elapsed >= batch_seconds:
+        output_file_id = f"file-{len(files)}"
+        files[output_file_id] = "".join(
+            json.dumps({
+                "id": f"batch_req_{index}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "request_id": f"req_{index}", "body": chat_completion_response(request["body"])},
+                "error": None,
+            }) + "\n"
+            for index, request in enumerate(requests)
+        ).encode("utf-8")
+        batch.update(status="completed", output_file_id=output_file_id, completed_at=int(time.time()))
+        batch["request_counts"]["completed"] = len(requests)
+
+def make_handler(stats, latency, rpm, batch_seconds):
+    lock = threading.Lock()
+    recent = deque()
+    files = {}  # file id: content
+    batches = {}  # batch id: batch object
+    ids = itertools.count()
+
+    class FakeOpenAIHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            parts = self.path.split("?")[0].rstrip("/").split("/")
+            with lock:
+                if "batches" in parts[:-1]:
+                    batch = batches.get(parts[-1])
+                    if batch is None:
+                        self.send_json(404, {"error": {"message": "No such batch", "type": "invalid_request_error"}})
+                        return
+                    batch_status(batch, files, batch_seconds)
+                    self.send_json(200, batch)
+                elif parts[-1] == "content" and parts[-2] in files:
+                    body = files[parts[-2]]
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self.send_json(200, dict(stats))
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            path = self.path.split("?")[0].rstrip("/")
+            if path.endswith("/files"):
+                fields = multipart_fields(self.headers["Content-Type"], body)
+                with lock:
+                    file_id = f"file-{next(ids)}"
+                    files[file_id] = fields["file"]
+                self.send_json(200, {
+                    "id": file_id, "object": "file", "bytes": len(fields["file"]), "created_at": int(time.time()),
+                    "filename": "batch.jsonl", "purpose": fields["purpose"].decode("utf-8"),
+                })
+                return
+            if path.endswith("/batches"):
+                request = json.loads(body)
+                with lock:
+                    batch_id = f"batch_{next(ids)}"
+                    batches[batch_id] = {
+                        "id": batch_id, "object": "batch", "endpoint": request["endpoint"], "errors": None,
+                        "input_file_id": request["input_file_id"], "completion_window": request["completion_window"],
+                        "status": "validating", "output_file_id": None, "error_file_id": None,
+                        "created_at": time.time(), "completed_at": None,
+                        "request_counts": {"total": 0, "completed": 0, "failed": 0},
+                    }
+                    stats["batches"] += 1
+                    self.send_json(200, batches[batch_id])
+                return
+
+            request = json.loads(body or b"{}")
+            with lock:
+                now = time.monotonic()
+                while recent and now - recent[0] >= 60:
+                    recent.popleft()
+                if rpm and len(recent) >= rpm:
+                    stats["rate_limited"] += 1
+                    limited = True
+                else:
+                    recent.append(now)
+                    stats["requests"] += 1
+                    stats["in_flight"] += 1
+                    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+                    limited = False
+            if limited:
+                self.send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}})
+                return
+
+            time.sleep(latency)
+            with lock:
+                stats["in_flight"] -= 1
+            self.send_json(200, chat_completion_response(request))
+
+    return FakeOpenAIHandler
+
+def start_fake_openai(port=0, latency=0.2, rpm=None, batch_seconds=2.0):
+    """
+    Serve the fake endpoint from a background thread.
+    Returns (server, api_base, stats); stop it with server.shutdown().
+    """
+    stats = {"requests": 0, "rate_limited": 0, "in_flight": 0, "max_in_flight": 0, "batches": 0}
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(stats, latency, rpm, batch_seconds))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1", stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per request")
+    parser.add_argument("--rpm", type=int, default=None, help="answer 429 above this many requests per minute")
+    parser.add_argument("--batch-seconds", type=float, default=2.0, help="seconds until a batch completes")
+    args = parser.parse_args()
+
+    server, api_base, stats = start_fake_openai(args.port, args.latency, args.rpm, args.batch_seconds)
+    print(f"Fake OpenAI endpoint at {api_base} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"Served {stats['requests']} requests, {stats['rate_limited']} rate limited, "
+              f"at most {stats['max_in_flight']} at once, {stats['batches']} batches")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Generate a synthetic Gmail-style mbox file for offline benchmarks.
+
+Messages are a configurable mix of plain text, HTML-only newsletters, multipart/alternative
+emails and emails with binary attachments, with bodies encoded in a rotation of charsets.
+
+Run from the repository root:
+    python -m benchmarks.synthetic_mbox Mbox_Files/Synthetic.mbox --count 10000 --attachment-kb 200
+"""
+import argparse
+import random
+from email.generator import BytesGenerator
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.bench_html_to_text import WORDS, sample_newsletter_html
+
+DEFAULT_CHARSETS = ["utf-8", "iso-8859-1", "windows-1252", "shift_jis"]
+
+# Words outside ASCII for each charset, so bodies really need decoding
+CHARSET_WORDS = {
+    "utf-8": "café résumé naïve 日本 Zürich – “quoted”".split(),
+    "iso-8859-1": "café résumé naïve Zürich señor façade".split(),
+    "windows-1252": "café résumé naïve Zürich “quoted” – €".split(),
+    "shift_jis": "日本 東京 面接 採用 応募 締切".split(),
+}
+
+SENDERS = ["recruiting@example.com", "jobs@ats.example.net", "news@shop.example.org", "friend@example.com"]
+START_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def sample_text(rng, charset, words=80):
+    """Plain text paragraphs mixing ASCII and charset-specific words."""
+    extra = CHARSET_WORDS.get(charset, [])
+    lines = []
+    for _ in range(max(1, words // 20)):
+        line = rng.choices(WORDS, k=16) + rng.choices(extra, k=4) if extra else rng.choices(WORDS, k=20)
+        rng.shuffle(line)
+        lines.append(" ".join(line))
+    return "\n".join(lines)
+
+def sample_message(rng, index, charset, html_ratio=0.3, multipart_ratio=0.3, attachment_ratio=0.1,
+                   attachment_kb=100):
+    """Build one synthetic email.message.Message."""
+    kind = rng.random()
+    if kind < html_ratio:
+        body = MIMEText(sample_newsletter_html(rng, rng.randint(3, 10)), "html", charset)
+    elif kind < html_ratio + multipart_ratio:
+        body = MIMEMultipart("alternative")
+        body.attach(MIMEText(sample_text(rng, charset), "plain", charset))
+        body.attach(MIMEText(sample_newsletter_html(rng, rng.randint(3, 10)), "html", charset))
+    else:
+        body = MIMEText(sample_text(rng, charset, rng.randint(40, 400)), "plain", charset)
+
+    message = body
+    if rng.random() < attachment_ratio:
+        message = MIMEMultipart("mixed")
+        message.attach(body)
+        size = max(1, int(rng.uniform(0.5, 1.5) * attachment_kb * 1024))
+        message.attach(MIMEApplication(rng.randbytes(size), "pdf", Name=f"attachment-{index}.pdf"))
+
+    message["Subject"] = " ".join(rng.choices(WORDS, k=6)).capitalize()
+    message["From"] = rng.choice(SENDERS)
+    message["To"] = "zeel@example.com"
+    message["Date"] = format_datetime(START_DATE + timedelta(minutes=7 * index))
+    message["Message-ID"] = f"<synthetic-{index}@example.com>"
+    message["X-GM-THRID"] = str(1000000 + index // 3)
+    return message
+
+def write_synthetic_mbox(path, count=1000, html_ratio=0.3, multipart_ratio=0.3, attachment_ratio=0.1,
+                         attachment_kb=100, charsets=DEFAULT_CHARSETS, seed=0):
+    """
+    Write count synthetic messages to an mbox file at path.
+    The same arguments and seed always produce the same file. Returns its size in bytes.
+    """
+    rng = random.Random(seed)
+    with open(path, "wb") as file:
+        generator = BytesGenerator(file, mangle_from_=True)
+        for index in range(count):
+            message = sample_message(rng, index, charsets[index % len(charsets)], html_ratio, multipart_ratio,
+                                     attachment_ratio, attachment_kb)
+            date = (START_DATE + timedelta(minutes=7 * index)).strftime("%a %b %d %H:%M:%S %Y")
+            file.write(f"From {message['From']} {date}\n".encode("ascii"))
+            generator.flatten(message, linesep="\n")
+            file.write(b"\n")
+        return file.tell()
+
+def add_generator_arguments(parser):
+    """Add the generator options shared by the benchmarks that use synthetic mboxes."""
+    parser.add_argument("--count", type=int, default=1000, help="number of messages")
+    parser.add_argument("--html-ratio", type=float, default=0.3, help="share of HTML-only messages")
+    parser.add_argument("--multipart-ratio", type=float, default=0.3, help="share of multipart/alternative messages")
+    parser.add_argument("--attachment-ratio", type=float, default=0.1, help="share of messages with an attachment")
+    parser.add_argument("--attachment-kb", type=int, default=100, help="average attachment size in KB")
+    parser.add_argument("--charsets", default=",".join(DEFAULT_CHARSETS), help="comma-separated body charsets")
+    parser.add_argument("--seed", type=int, default=0)
+
+def generator_options(args):
+    """Keyword arguments for write_synthetic_mbox from parsed generator options."""
+    return dict(
+        count=args.count, html_ratio=args.html_ratio, multipart_ratio=args.multipart_ratio,
+        attachment_ratio=args.attachment_ratio, attachment_kb=args.attachment_kb,
+        charsets=[charset.strip() for charset in args.charsets.split(",") if charset.strip()], seed=args.seed
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="mbox file to write")
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+    size = write_synthetic_mbox(args.path, **generator_options(args))
+    print(f"Wrote {args.count} messages to {args.path} ({size / 1e6:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
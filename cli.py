@@ -0,0 +1,135 @@
+import argparse
+import os
+
+# One command line for the whole pipeline:
+#   python cli.py convert                      .mbox files -> tables (mbox_to_csv)
+#   python cli.py clean --stage interviews     cleaning stages -> Clean_Mails/ (task_engine)
+#   python cli.py train-classifier --stage social
+#   python cli.py faq | knowledge-base | metrics
+# Each subcommand imports only the modules it runs, and importing those runs nothing, so
+# `python cli.py --help` and the helpers used from other modules start in milliseconds
+# (benchmarks/bench_import guards this).
+
+def all_stages():
+    """
+    {stage name: (task, input table, output CSV)} of every cleaning stage, reading each
+    label's Parquet dataset when it was converted with --format parquet and its CSV otherwise.
+    """
+    import email_cleaning
+    import email_cleaning_larger_chunk
+    from email_store import find_table
+
+    stages = {**email_cleaning.STAGES, **email_cleaning_larger_chunk.STAGES}
+    return {name: (task, find_table(input_stem), output_csv_path)
+            for name, (task, input_stem, output_csv_path) in stages.items()}
+
+def selected_stages(args):
+    stages = all_stages()
+    names = list(stages) if args.all else args.stage or []
+    if not names:
+        raise SystemExit(f"Choose stages with --stage (or --all): {', '.join(stages)}")
+    unknown = [name for name in names if name not in stages]
+    if unknown:
+        raise SystemExit(f"Unknown stages {', '.join(unknown)}; known: {', '.join(stages)}")
+    return {name: stages[name] for name in names}
+
+def convert(args):
+    from mbox_to_csv import convert_mboxes_to_csv
+
+    convert_mboxes_to_csv(args.input_dir, args.output_dir, workers=args.workers, incremental=not args.full,
+                          output_format=args.format, dedupe=not args.no_dedupe)
+
+def clean(args):
+    from task_engine import retry_failed, run_tasks
+
+    # Stages reading the same table share one pass over it
+    tables = {}
+    for name, (task, input_csv_path, output_csv_path) in selected_stages(args).items():
+        if args.max_tokens is not None and task.max_tokens is not None:
+            task = task._replace(max_tokens=args.max_tokens)
+        if args.retry_failed:
+            retry_failed(task, output_csv_path)
+            continue
+        tables.setdefault(input_csv_path, []).append((task, output_csv_path))
+    for input_csv_path, task_outputs in tables.items():
+        run_tasks(input_csv_path, task_outputs, batch=True if args.batch else None, dry_run=args.dry_run)
+
+def train(args):
+    from local_classifier import labels_path, train_classifier
+
+    for name, (task, input_csv_path, output_csv_path) in selected_stages(args).items():
+        if task.classifier_field is None:
+            print(f"{name}: this stage does not use a local classifier.")
+            continue
+        if not os.path.exists(labels_path(output_csv_path)):
+            print(f"{name}: run the stage first; the labels it logs in {labels_path(output_csv_path)} "
+                  f"are the training data.")
+            continue
+        train_classifier(task, input_csv_path, output_csv_path, threshold=args.threshold)
+
+def faq(args):
+    import faq
+
+    faq.main(args.workers)
+
+def knowledge_base(args):
+    import create_knowledge_base
+
+    create_knowledge_base.main()
+
+def metrics(args):
+    from llm_metrics import load_records
+
+    load_records(args.path)  # summarized at exit
+
+def add_stage_arguments(parser):
+    parser.add_argument('--stage', action='append', help='stage to run (repeatable); see `clean --list`')
+    parser.add_argument('--all', action='store_true', help='every stage')
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Email archive pipeline: convert, clean, and build the FAQ and knowledge base.')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+
+    command = subcommands.add_parser('convert', help='convert .mbox files into tables')
+    command.add_argument('--input-dir', default='./Mbox_Files')
+    command.add_argument('--output-dir', default='./Past_email_mbox')
+    command.add_argument('--workers', type=int, default=os.cpu_count())
+    command.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    command.add_argument('--full', action='store_true', help='convert everything again instead of only new messages')
+    command.add_argument('--no-dedupe', action='store_true', help='do not write the dedup index')
+    command.set_defaults(run=convert)
+
+    command = subcommands.add_parser('clean', help='run cleaning stages')
+    add_stage_arguments(command)
+    command.add_argument('--list', action='store_true', help='list the stages and exit')
+    command.add_argument('--batch', action='store_true', help='use the Batch API (also LLM_BATCH=1)')
+    command.add_argument('--dry-run', action='store_true', help='plan the run without calling the API')
+    command.add_argument('--max-tokens', type=int, help="token limit per email for the stages that have one")
+    command.add_argument('--retry-failed', action='store_true', help="send the stages' failed rows again")
+    command.set_defaults(run=clean)
+
+    command = subcommands.add_parser('train-classifier', help="train stages' local classifiers from earlier runs")
+    add_stage_arguments(command)
+    command.add_argument('--threshold', type=float, help='confidence needed to skip the LLM')
+    command.set_defaults(run=train)
+
+    command = subcommands.add_parser('faq', help='extract FAQs from past replies')
+    command.add_argument('--workers', type=int, help='replies sent at a time (default: LLM_MAX_CONCURRENCY)')
+    command.set_defaults(run=faq)
+    subcommands.add_parser('knowledge-base', help='build the vector store').set_defaults(run=knowledge_base)
+
+    command = subcommands.add_parser('metrics', help='summarize recorded LLM calls')
+    command.add_argument('path', nargs='?', help='records file (default: LLM_METRICS_PATH)')
+    command.set_defaults(run=metrics)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, 'list', False):
+        for name, (task, input_csv_path, output_csv_path) in all_stages().items():
+            print(f"{name:>16}: {input_csv_path} -> {output_csv_path}")
+        return
+    args.run(args)
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,14 @@
 # create_knowledge_base.py
 
 import os
-import csv
+import time
 from dotenv import load_dotenv
+from email_store import load_rows
+from llm_metrics import record_call
 
-# Update imports according to deprecation warnings
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.vectorstores import Chroma
-
-def load_csv(file_path):
-    """Load data from a CSV file into a list of dictionaries."""
-    data_list = []
-    with open(file_path, 'r', encoding='utf-8') as csv_file:
-        csv_reader = csv.DictReader(csv_file)
-        for row in csv_reader:
-            data_list.append(row)
-    return data_list
+def load_csv(file_path, columns=None):
+    """Load data from a CSV file (or Parquet dataset) into a list of dictionaries, optionally only some columns."""
+    return load_rows(file_path, columns)
 
 def process_faqs(faqs):
     """Process FAQs into texts and metadatas."""
@@ -196,6 +189,11 @@ def process_job_application_emails(job_application_emails):
     return texts, metadatas
 
 def create_knowledge_base():
+    # Imported here so that importing this module stays cheap
+    # (update imports according to deprecation warnings)
+    from langchain.embeddings import OpenAIEmbeddings
+    from langchain.vectorstores import Chroma
+
     # Load environment variables
     load_dotenv()
 
@@ -219,70 +217,85 @@ def create_knowledge_base():
     faq_csv_file = './Clean_Mails/faq.csv'  # Adjust if necessary
 
     # Load and process FAQs
-    faqs = load_csv(faq_csv_file)
+    faqs = load_csv(faq_csv_file, columns=['Question', 'Answer'])
     faq_texts, faq_metadatas = process_faqs(faqs)
     all_texts.extend(faq_texts)
     all_metadatas.extend(faq_metadatas)
     print(f"Loaded {len(faqs)} FAQs.")
 
     # Load and process email pairs (sent emails)
-    email_pairs = load_csv(sent_emails_path)
+    email_pairs = load_csv(sent_emails_path, columns=['original_message', 'zeels_reply'])
     email_pair_texts, email_pair_metadatas = process_email_pairs(email_pairs)
     all_texts.extend(email_pair_texts)
     all_metadatas.extend(email_pair_metadatas)
     print(f"Loaded {len(email_pairs)} Email Pairs.")
 
     # Load and process action archived pairs
-    action_archived_pairs = load_csv(archived_pairs_emails_path)
+    action_archived_pairs = load_csv(archived_pairs_emails_path, columns=['original_message', 'follow_up_message'])
     archived_texts, archived_metadatas = process_action_archived_pairs(action_archived_pairs)
     all_texts.extend(archived_texts)
     all_metadatas.extend(archived_metadatas)
     print(f"Loaded {len(action_archived_pairs)} Action Archived Pairs.")
 
     # Load and process action assessment pairs
-    action_assessment_pairs = load_csv(assessment_pairs_emails_path)
+    action_assessment_pairs = load_csv(
+        assessment_pairs_emails_path,
+        columns=['action_required', 'deadline', 'important_links', 'important_instructions']
+    )
     assessment_texts, assessment_metadatas = process_action_assessment_pairs(action_assessment_pairs)
     all_texts.extend(assessment_texts)
     all_metadatas.extend(assessment_metadatas)
     print(f"Loaded {len(action_assessment_pairs)} Action Assessment Pairs.")
 
     # Load and process action needed pairs
-    action_needed_pairs = load_csv(action_needed_pairs_emails_path)
+    action_needed_pairs = load_csv(action_needed_pairs_emails_path, columns=['original_message', 'zeels_reply'])
     action_needed_texts, action_needed_metadatas = process_action_needed_pairs(action_needed_pairs)
     all_texts.extend(action_needed_texts)
     all_metadatas.extend(action_needed_metadatas)
     print(f"Loaded {len(action_needed_pairs)} Action Needed Pairs.")
 
     # Load and process promotion emails
-    promotion_emails = load_csv(action_promotion_pairs_emails_path)
+    promotion_emails = load_csv(
+        action_promotion_pairs_emails_path,
+        columns=['Promotion Title', 'Offer Details', 'Expiration', 'Action Links', 'Brand Name', 'Importance']
+    )
     promotion_texts, promotion_metadatas = process_promotion_emails(promotion_emails)
     all_texts.extend(promotion_texts)
     all_metadatas.extend(promotion_metadatas)
     print(f"Loaded {len(promotion_emails)} Promotion Emails.")
 
     # Load and process important emails
-    important_emails = load_csv(importance_emails_path)
+    important_emails = load_csv(
+        importance_emails_path, columns=['Subject', 'From', 'Date', 'To', 'Importance', 'Action Required']
+    )
     important_texts, important_metadatas = process_clean_mails_important(important_emails)
     all_texts.extend(important_texts)
     all_metadatas.extend(important_metadatas)
     print(f"Loaded {len(important_emails)} Important Emails.")
 
     # Load and process social emails
-    social_emails = load_csv(social_emails_path)
+    social_emails = load_csv(
+        social_emails_path, columns=['Subject', 'From', 'Date', 'To', 'Importance', 'Action Required']
+    )
     social_texts, social_metadatas = process_clean_mails_social(social_emails)
     all_texts.extend(social_texts)
     all_metadatas.extend(social_metadatas)
     print(f"Loaded {len(social_emails)} Social Emails.")
 
     # Load and process interview emails
-    interview_emails = load_csv(interview_emails_path)
+    interview_emails = load_csv(
+        interview_emails_path, columns=['Subject', 'From', 'Date', 'To', 'Category', 'Action Required']
+    )
     interview_texts, interview_metadatas = process_interview_emails(interview_emails)
     all_texts.extend(interview_texts)
     all_metadatas.extend(interview_metadatas)
     print(f"Loaded {len(interview_emails)} Interview Emails.")
 
     # Load and process job application emails
-    job_application_emails = load_csv(job_application_emails_path)
+    job_application_emails = load_csv(
+        job_application_emails_path,
+        columns=['Subject', 'From', 'Date', 'To', 'Category', 'Importance', 'Action Required']
+    )
     job_app_texts, job_app_metadatas = process_job_application_emails(job_application_emails)
     all_texts.extend(job_app_texts)
     all_metadatas.extend(job_app_metadatas)
@@ -291,13 +304,21 @@ def create_knowledge_base():
     # Directory to save the vector store
     persist_directory = "./vector_store"
 
-    # Create vector store with persist_directory specified
-    vector_store = Chroma.from_texts(
-        texts=all_texts,
-        embedding=embeddings,
-        metadatas=all_metadatas,
-        persist_directory=persist_directory
-    )
+    # Create vector store with persist_directory specified. The embedding calls are recorded
+    # in llm_metrics as one "knowledge_base" call, with tokens estimated at four characters each
+    started = time.perf_counter()
+    try:
+        vector_store = Chroma.from_texts(
+            texts=all_texts,
+            embedding=embeddings,
+            metadatas=all_metadatas,
+            persist_directory=persist_directory
+        )
+    except Exception as e:
+        record_call("knowledge_base", embeddings.model, time.perf_counter() - started, error=e)
+        raise
+    record_call("knowledge_base", embeddings.model, time.perf_counter() - started,
+                sum(len(text) for text in all_texts) // 4)
     print("Knowledge base created.")
 
     # Save the vector store
@@ -1,24 +1,6 @@
-import os
-import json
-import csv
-from dotenv import find_dotenv, load_dotenv
-import openai
-from transformers import GPT2TokenizerFast
-from email.header import decode_header
-from openai.error import OpenAIError
-from email.header import decode_header
-from bs4 import BeautifulSoup
-import sys
-from langchain.prompts import PromptTemplate
-from langchain.chat_models import ChatOpenAI
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.chains.summarize import load_summarize_chain
-
-# Load OpenAI API key from environment variables
-load_dotenv(find_dotenv())
-openai.api_key = os.environ.get("OPENAI_API_KEY")
-
-csv.field_size_limit(2147483647)
+from email_store import find_table
+from task_engine import Task, run_tasks
+from map_reduce import join_distinct, ranked
 
 # Define the resume for context
 zeel_resume = """
@@ -34,14 +16,20 @@ Spark, and Hive, and cloud platforms like AWS, Azure, and GCP. Adept at statisti
 Tableau and Power BI, delivering actionable insights and leading cross-functional teams in AI and data-driven projects.
 """
 
-# Initialize GPT-2 tokenizer (compatible with GPT-3.5 and GPT-4)
-tokenizer = GPT2TokenizerFast.from_pretrained("gpt2")
-
-def parse_promotional_email(email_content):
-    """
-    Extracts critical promotional information from an email using OpenAI API.
-    """
-    system_prompt = """
+# Each category is declared as a Task (prompt, fields read from the JSON answer and output
+# columns) and run by task_engine, which tokenizes every email once. An email over the
+# task's token limit is split into parts that are classified concurrently, and their
+# answers are merged with the task's merge rules (see map_reduce). None of these stages needs an answer right away: pass batch=True
+# (or set LLM_BATCH=1) to run them through the cheaper Batch API instead (see llm_batch).
+# The prompts embedding the resume are much longer than most of the emails they classify,
+# so those tasks pack several emails into each request. Social and update emails are
+# mostly routine: once a local classifier has been trained from an earlier run
+# (python cli.py train-classifier), only the emails it is unsure about go to the LLM.
+# Importing this module runs nothing; STAGES at the end lists the stages for cli.py.
+CONTACT_COLUMNS = ['Subject', 'From', 'Date', 'To']
+
+# Promotional emails: the critical promotional information
+PROMOTIONAL_PROMPT = """
     You are tasked to analyze and summarize promotional emails. The critical details to extract include:
     
     1. Promotion Title: A concise title summarizing the key offering.
@@ -61,93 +49,30 @@ def parse_promotional_email(email_content):
         "importance": "important" or "not important"
     }
     """
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": email_content}
-            ]
-        )
-        return json.loads(response["choices"][0]["message"]["content"])
-    except Exception as e:
-        print(f"Error parsing promotional email: {e}")
-        return {}
-
-def count_tokens(text):
-    """
-    Counts the number of tokens in the given text using GPT-2 tokenizer.
-    """
-    return len(tokenizer.encode(text))
-
-def truncate_email(email_content, max_tokens):
-    """
-    Truncates the email content to fit within the maximum token limit.
-    """
-    tokens = tokenizer.encode(email_content)
-    if len(tokens) > max_tokens:
-        truncated_content = tokenizer.decode(tokens[:max_tokens])
-        print("Email content truncated to fit within token limit.")
-        return truncated_content
-    return email_content
 
-def process_promotional_emails_with_importance(input_csv_path, output_csv_path, max_token_limit=3000):
+PROMOTIONAL_TASK = Task(
+    name='Promotional emails',
+    system_prompt=PROMOTIONAL_PROMPT,
+    fields=[
+        ('promotion_title', ''), ('offer_details', ''), ('expiration', ''), ('action_links', []),
+        ('brand_name', ''), ('importance', 'not important')
+    ],
+    output_columns=['Promotion Title', 'Offer Details', 'Expiration', 'Action Links', 'Brand Name', 'Importance'],
+    max_tokens=3000,
+    keep=bool,
+    merge={'offer_details': join_distinct(' '), 'importance': ranked('important', 'not important')}
+)
+
+def process_promotional_emails_with_importance(input_csv_path, output_csv_path, max_token_limit=3000, batch=None, dry_run=False):
     """
-    Processes promotional emails, truncating or skipping emails that exceed the token limit.
+    Processes promotional emails, splitting emails that exceed the token limit into parts.
     """
-    processed_data = []
-
-    # Open and read the input CSV file
-    with open(input_csv_path, newline='', encoding='utf-8') as csvfile:
-        csv_reader = csv.DictReader(csvfile)
-
-        for idx, row in enumerate(csv_reader, start=1):
-            print(f"Processing email {idx}...")
-            email_body = row.get('Body', '').strip()
-            if not email_body:
-                print("Empty email body found. Skipping...")
-                continue
-
-            # Check token count and truncate if necessary
-            email_token_count = count_tokens(email_body)
-            if email_token_count > max_token_limit:
-                print(f"Email {idx} exceeds token limit ({email_token_count} tokens). Truncating...")
-                email_body = truncate_email(email_body, max_token_limit)
-
-            try:
-                parsed_data = parse_promotional_email(email_body)
-                if parsed_data:
-                    processed_data.append([
-                        parsed_data.get("promotion_title", ""),
-                        parsed_data.get("offer_details", ""),
-                        parsed_data.get("expiration", ""),
-                        ", ".join(parsed_data.get("action_links", [])),  # Convert links to a string
-                        parsed_data.get("brand_name", ""),
-                        parsed_data.get("importance", "not important")  # Default to "not important" if missing
-                    ])
-            except Exception as e:
-                print(f"Error processing email {idx}: {e}. Skipping...")
-                continue
-
-    # Write processed data to the output CSV
-    with open(output_csv_path, mode='w', newline='', encoding='utf-8') as csvfile:
-        csv_writer = csv.writer(csvfile)
-        # Write the header row
-        csv_writer.writerow(['Promotion Title', 'Offer Details', 'Expiration', 'Action Links', 'Brand Name', 'Importance'])
-        # Write data rows
-        csv_writer.writerows(processed_data)
-
-    print(f"Processed data has been saved to {output_csv_path}.")
-
-#input_csv_path_5 = './Past_email_mbox/Category Promotions.csv'  
-#output_csv_path_5 = './Clean_Mails/action_promotion_pairs.csv'
-#process_promotional_emails_with_importance(input_csv_path_5,output_csv_path_5)
+    run_tasks(input_csv_path, [(PROMOTIONAL_TASK._replace(max_tokens=max_token_limit), output_csv_path)], batch, dry_run)
 
 #Importtant Mails
-def parse_important_email(email_subject, email_body, resume):
-    system_prompt = f"""
+IMPORTANT_PROMPT = f"""
     You are tasked to analyze professional emails and classify their importance based on their content. Use Zeel's resume for context:
-    {resume}
+    {zeel_resume}
 
     Rules:
     - Emails related to rejections, interview updates, or application follow-ups are "important."
@@ -160,84 +85,27 @@ def parse_important_email(email_subject, email_body, resume):
         "action_required": "Action details or 'No action required'"
     }}
     """
-    email_content = f"Subject: {email_subject}\nBody: {email_body}"
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": email_content}
-            ]
-        )
-        return json.loads(response["choices"][0]["message"]["content"])
-    except Exception as e:
-        print(f"Error parsing important email: {e}")
-        return {}
-
-def count_tokens(text):
-    return len(tokenizer.encode(text))
-
-def truncate_email(email_content, max_tokens):
-    tokens = tokenizer.encode(email_content)
-    if len(tokens) > max_tokens:
-        truncated_content = tokenizer.decode(tokens[:max_tokens])
-        print("Email content truncated to fit within token limit.")
-        return truncated_content
-    return email_content
-
-def process_important_emails(input_csv_path, output_csv_path, max_token_limit=3000):
-    processed_data = []
 
-    with open(input_csv_path, newline='', encoding='utf-8') as csvfile:
-        csv_reader = csv.DictReader(csvfile)
-        
-        for idx, row in enumerate(csv_reader, start=1):
-            print(f"Processing email {idx}...")
-            email_subject = row.get('Subject', '').strip()
-            email_body = row.get('Body', '').strip()
-
-            if not email_body:
-                print("Empty email body found. Skipping...")
-                continue
-
-            email_content = f"Subject: {email_subject}\nBody: {email_body}"
-            email_token_count = count_tokens(email_content)
-            
-            if email_token_count > max_token_limit:
-                print(f"Email {idx} exceeds token limit ({email_token_count} tokens). Truncating...")
-                email_body = truncate_email(email_body, max_token_limit - count_tokens(f"Subject: {email_subject}\n"))
-
-            try:
-                parsed_data = parse_important_email(email_subject, email_body, zeel_resume)
-                if parsed_data:
-                    processed_data.append([
-                        email_subject,
-                        row.get("From", ""),
-                        row.get("Date", ""),
-                        row.get("To", ""),
-                        parsed_data.get("importance", "not important"),
-                        parsed_data.get("action_required", "No action required")
-                    ])
-            except Exception as e:
-                print(f"Error processing email {idx}: {e}. Skipping...")
-                continue
-
-    with open(output_csv_path, mode='w', newline='', encoding='utf-8') as csvfile:
-        csv_writer = csv.writer(csvfile)
-        csv_writer.writerow(['Subject', 'From', 'Date', 'To', 'Importance', 'Action Required'])
-        csv_writer.writerows(processed_data)
-
-    print(f"Processed data has been saved to {output_csv_path}.")
-
-#input_csv_path = './Past_email_mbox/Important.csv'
-#output_csv_path = './Clean_Mails/clean_mails_important.csv'
-#process_important_emails(input_csv_path, output_csv_path)
+IMPORTANT_TASK = Task(
+    name='Important emails',
+    system_prompt=IMPORTANT_PROMPT,
+    fields=[('importance', 'not important'), ('action_required', 'No action required')],
+    output_columns=['Subject', 'From', 'Date', 'To', 'Importance', 'Action Required'],
+    copy_columns=CONTACT_COLUMNS,
+    with_subject=True,
+    max_tokens=3000,
+    pack=True,
+    keep=bool,
+    merge={'importance': ranked('important', 'not important'), 'action_required': join_distinct()}
+)
+
+def process_important_emails(input_csv_path, output_csv_path, max_token_limit=3000, batch=None, dry_run=False):
+    run_tasks(input_csv_path, [(IMPORTANT_TASK._replace(max_tokens=max_token_limit), output_csv_path)], batch, dry_run)
 
 #Socails
-def parse_social_email(email_subject, email_body, resume):
-    system_prompt = f"""
+SOCIAL_PROMPT = f"""
     You are tasked to analyze social and networking emails and classify their importance based on their content. Use Zeel's resume for context:
-    {resume}
+    {zeel_resume}
 
     Rules:
     - Emails related to networking opportunities, professional connections, or career-related events are "important."
@@ -251,84 +119,28 @@ def parse_social_email(email_subject, email_body, resume):
         "action_required": "Action details or 'No action required'"
     }}
     """
-    email_content = f"Subject: {email_subject}\nBody: {email_body}"
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": email_content}
-            ]
-        )
-        return json.loads(response["choices"][0]["message"]["content"])
-    except Exception as e:
-        print(f"Error parsing social email: {e}")
-        return {}
-
-def count_tokens(text):
-    return len(tokenizer.encode(text))
 
-def truncate_email(email_content, max_tokens):
-    tokens = tokenizer.encode(email_content)
-    if len(tokens) > max_tokens:
-        truncated_content = tokenizer.decode(tokens[:max_tokens])
-        print("Email content truncated to fit within token limit.")
-        return truncated_content
-    return email_content
-
-def process_social_emails(input_csv_path, output_csv_path, max_token_limit=3000):
-    processed_data = []
-
-    with open(input_csv_path, newline='', encoding='utf-8') as csvfile:
-        csv_reader = csv.DictReader(csvfile)
-        
-        for idx, row in enumerate(csv_reader, start=1):
-            print(f"Processing email {idx}...")
-            email_subject = row.get('Subject', '').strip()
-            email_body = row.get('Body', '').strip()
-
-            if not email_body:
-                print("Empty email body found. Skipping...")
-                continue
-
-            email_content = f"Subject: {email_subject}\nBody: {email_body}"
-            email_token_count = count_tokens(email_content)
-            
-            if email_token_count > max_token_limit:
-                print(f"Email {idx} exceeds token limit ({email_token_count} tokens). Truncating...")
-                email_body = truncate_email(email_body, max_token_limit - count_tokens(f"Subject: {email_subject}\n"))
-
-            try:
-                parsed_data = parse_social_email(email_subject, email_body, zeel_resume)
-                if parsed_data and parsed_data.get("importance") == "important":
-                    processed_data.append([
-                        email_subject,
-                        row.get("From", ""),
-                        row.get("Date", ""),
-                        row.get("To", ""),
-                        parsed_data.get("importance", "not important"),
-                        parsed_data.get("action_required", "No action required")
-                    ])
-            except Exception as e:
-                print(f"Error processing email {idx}: {e}. Skipping...")
-                continue
-
-    with open(output_csv_path, mode='w', newline='', encoding='utf-8') as csvfile:
-        csv_writer = csv.writer(csvfile)
-        csv_writer.writerow(['Subject', 'From', 'Date', 'To', 'Importance', 'Action Required'])
-        csv_writer.writerows(processed_data)
-
-    print(f"Processed data has been saved to {output_csv_path}.")
-
-# Usage
-#input_csv_path = './Past_email_mbox/Category Social.csv'
-#output_csv_path = './Clean_Mails/clean_mails_social.csv'
-#process_social_emails(input_csv_path, output_csv_path)
+# Only emails classified as important are kept
+SOCIAL_TASK = Task(
+    name='Social emails',
+    system_prompt=SOCIAL_PROMPT,
+    fields=[('importance', 'not important'), ('action_required', 'No action required')],
+    output_columns=['Subject', 'From', 'Date', 'To', 'Importance', 'Action Required'],
+    copy_columns=CONTACT_COLUMNS,
+    with_subject=True,
+    max_tokens=3000,
+    pack=True,
+    classifier_field='importance',
+    classifier_labels=('not important',),
+    keep=lambda parsed_data: parsed_data.get("importance") == "important",
+    merge={'importance': ranked('important', 'not important'), 'action_required': join_distinct()}
+)
+
+def process_social_emails(input_csv_path, output_csv_path, max_token_limit=3000, batch=None, dry_run=False):
+    run_tasks(input_csv_path, [(SOCIAL_TASK._replace(max_tokens=max_token_limit), output_csv_path)], batch, dry_run)
 
 #Interview
-tokenizer = GPT2TokenizerFast.from_pretrained("gpt2")
-def parse_interview_email(email_subject, email_body, resume):
-    system_prompt = f"""
+INTERVIEW_PROMPT = f"""
     You are tasked with analyzing interview-related emails and categorizing them into:
     - Highly Important: Emails directly related to interview invitations, confirmations, or scheduled interviews.
     - Important: Emails related to interview follow-ups, thank-you notes, or rejections with actionable advice.
@@ -337,7 +149,7 @@ def parse_interview_email(email_subject, email_body, resume):
     Additionally, extract any actionable steps from the email, if applicable.
 
     Use the following resume for context:
-    {resume}
+    {zeel_resume}
 
     Output Format:
     {{
@@ -345,85 +157,28 @@ def parse_interview_email(email_subject, email_body, resume):
         "action_required": "Action details or 'No action required'"
     }}
     """
-    email_content = f"Subject: {email_subject}\nBody: {email_body}"
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": email_content}
-            ]
-        )
-        return json.loads(response["choices"][0]["message"]["content"])
-    except Exception as e:
-        print(f"Error parsing interview email: {e}")
-        return {}
-
-def count_tokens(text):
-    return len(tokenizer.encode(text))
-
-def truncate_email(email_content, max_tokens):
-    tokens = tokenizer.encode(email_content)
-    if len(tokens) > max_tokens:
-        truncated_content = tokenizer.decode(tokens[:max_tokens])
-        print("Email content truncated to fit within token limit.")
-        return truncated_content
-    return email_content
-
-def process_interview_emails(input_csv_path, output_csv_path, max_token_limit=3000):
-    processed_data = []
-
-    with open(input_csv_path, newline='', encoding='utf-8') as csvfile:
-        csv_reader = csv.DictReader(csvfile)
-        
-        for idx, row in enumerate(csv_reader, start=1):
-            print(f"Processing email {idx}...")
-            email_subject = row.get('Subject', '').strip()
-            email_body = row.get('Body', '').strip()
-
-            if not email_body:
-                print("Empty email body found. Skipping...")
-                continue
-
-            email_content = f"Subject: {email_subject}\nBody: {email_body}"
-            email_token_count = count_tokens(email_content)
-            
-            if email_token_count > max_token_limit:
-                print(f"Email {idx} exceeds token limit ({email_token_count} tokens). Truncating...")
-                email_body = truncate_email(email_body, max_token_limit - count_tokens(f"Subject: {email_subject}\n"))
 
-            try:
-                parsed_data = parse_interview_email(email_subject, email_body, zeel_resume)
-                if parsed_data:
-                    processed_data.append([
-                        email_subject,
-                        row.get("From", ""),
-                        row.get("Date", ""),
-                        row.get("To", ""),
-                        parsed_data.get("category", "Non-Important"),
-                        parsed_data.get("action_required", "No action required")
-                    ])
-            except Exception as e:
-                print(f"Error processing email {idx}: {e}. Skipping...")
-                continue
-
-    with open(output_csv_path, mode='w', newline='', encoding='utf-8') as csvfile:
-        csv_writer = csv.writer(csvfile)
-        csv_writer.writerow(['Subject', 'From', 'Date', 'To', 'Category', 'Action Required'])
-        csv_writer.writerows(processed_data)
-
-    print(f"Processed data has been saved to {output_csv_path}.")
+INTERVIEW_TASK = Task(
+    name='Interview emails',
+    system_prompt=INTERVIEW_PROMPT,
+    fields=[('category', 'Non-Important'), ('action_required', 'No action required')],
+    output_columns=['Subject', 'From', 'Date', 'To', 'Category', 'Action Required'],
+    copy_columns=CONTACT_COLUMNS,
+    with_subject=True,
+    max_tokens=3000,
+    pack=True,
+    keep=bool,
+    merge={
+        'category': ranked('Highly Important', 'Important', 'Non-Important'),
+        'action_required': join_distinct()
+    }
+)
 
-# Usage
-#input_csv_path = './Past_email_mbox/Interview.csv'
-#output_csv_path = './Clean_Mails/interview_emails_processed.csv'
-#process_interview_emails(input_csv_path, output_csv_path)
+def process_interview_emails(input_csv_path, output_csv_path, max_token_limit=3000, batch=None, dry_run=False):
+    run_tasks(input_csv_path, [(INTERVIEW_TASK._replace(max_tokens=max_token_limit), output_csv_path)], batch, dry_run)
 
 #Update
-tokenizer = GPT2TokenizerFast.from_pretrained("gpt2")
-
-def parse_job_application_email(email_subject, email_body, resume):
-    system_prompt = f"""
+JOB_APPLICATION_PROMPT = f"""
     You are tasked with analyzing job application-related emails and categorizing them into:
     - Application Submitted: Confirmation of job application submission.
     - Interview Invitation: Invitations for interviews or next steps in the application process.
@@ -435,7 +190,7 @@ def parse_job_application_email(email_subject, email_body, resume):
     Additionally, determine the importance level and extract any actionable steps.
 
     Use the following resume for context:
-    {resume}
+    {zeel_resume}
 
     Output Format:
     {{
@@ -445,78 +200,48 @@ def parse_job_application_email(email_subject, email_body, resume):
         "application_status": "Pending" or "Rejected" or "Progressing" or "N/A"
     }}
     """
-    email_content = f"Subject: {email_subject}\nBody: {email_body}"
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": email_content}
-            ]
-        )
-        return json.loads(response["choices"][0]["message"]["content"])
-    except Exception as e:
-        print(f"Error parsing job application email: {e}")
-        return {}
-
-def count_tokens(text):
-    return len(tokenizer.encode(text))
-
-def truncate_email(email_content, max_tokens):
-    tokens = tokenizer.encode(email_content)
-    if len(tokens) > max_tokens:
-        truncated_content = tokenizer.decode(tokens[:max_tokens])
-        print("Email content truncated to fit within token limit.")
-        return truncated_content
-    return email_content
-
-def process_job_application_emails(input_csv_path, output_csv_path, max_token_limit=3000):
-    processed_data = []
 
-    with open(input_csv_path, newline='', encoding='utf-8') as csvfile:
-        csv_reader = csv.DictReader(csvfile)
-        
-        for idx, row in enumerate(csv_reader, start=1):
-            print(f"Processing email {idx}...")
-            email_subject = row.get('Subject', '').strip()
-            email_body = row.get('Body', '').strip()
-
-            if not email_body:
-                print("Empty email body found. Skipping...")
-                continue
-
-            email_content = f"Subject: {email_subject}\nBody: {email_body}"
-            email_token_count = count_tokens(email_content)
-            
-            if email_token_count > max_token_limit:
-                print(f"Email {idx} exceeds token limit ({email_token_count} tokens). Truncating...")
-                email_body = truncate_email(email_body, max_token_limit - count_tokens(f"Subject: {email_subject}\n"))
-
-            try:
-                parsed_data = parse_job_application_email(email_subject, email_body, zeel_resume)
-                if parsed_data:
-                    processed_data.append([
-                        email_subject,
-                        row.get("From", ""),
-                        row.get("Date", ""),
-                        row.get("To", ""),
-                        parsed_data.get("category", "Irrelevant"),
-                        parsed_data.get("importance", "Low"),
-                        parsed_data.get("action_required", "No action required"),
-                        parsed_data.get("application_status", "N/A")
-                    ])
-            except Exception as e:
-                print(f"Error processing email {idx}: {e}. Skipping...")
-                continue
-
-    with open(output_csv_path, mode='w', newline='', encoding='utf-8') as csvfile:
-        csv_writer = csv.writer(csvfile)
-        csv_writer.writerow(['Subject', 'From', 'Date', 'To', 'Category', 'Importance', 'Action Required', 'Application Status'])
-        csv_writer.writerows(processed_data)
-
-    print(f"Processed data has been saved to {output_csv_path}.")
-
-# Usage
-input_csv_path = './Past_email_mbox/Category Updates.csv'
-output_csv_path = './Clean_Mails/job_application_updates_processed.csv'
-process_job_application_emails(input_csv_path, output_csv_path)
\ No newline at end of file
+JOB_APPLICATION_TASK = Task(
+    name='Job application emails',
+    system_prompt=JOB_APPLICATION_PROMPT,
+    fields=[
+        ('category', 'Irrelevant'), ('importance', 'Low'), ('action_required', 'No action required'),
+        ('application_status', 'N/A')
+    ],
+    output_columns=['Subject', 'From', 'Date', 'To', 'Category', 'Importance', 'Action Required', 'Application Status'],
+    copy_columns=CONTACT_COLUMNS,
+    with_subject=True,
+    max_tokens=3000,
+    pack=True,
+    classifier_field='category',
+    classifier_labels=('Irrelevant',),
+    keep=bool,
+    merge={
+        'category': ranked('Interview Invitation', 'Follow-up Required', 'Rejection', 'Status Update',
+                           'Application Submitted', 'Irrelevant'),
+        'importance': ranked('High', 'Medium', 'Low'),
+        'action_required': join_distinct(),
+        'application_status': ranked('Progressing', 'Rejected', 'Pending', 'N/A')
+    }
+)
+
+def process_job_application_emails(input_csv_path, output_csv_path, max_token_limit=3000, batch=None, dry_run=False):
+    run_tasks(input_csv_path, [(JOB_APPLICATION_TASK._replace(max_tokens=max_token_limit), output_csv_path)], batch, dry_run)
+
+# Stages run by cli.py: name: (task, input table without extension, output CSV)
+STAGES = {
+    'promotions': (PROMOTIONAL_TASK, './Past_email_mbox/Category Promotions',
+                   './Clean_Mails/action_promotion_pairs.csv'),
+    'important': (IMPORTANT_TASK, './Past_email_mbox/Important', './Clean_Mails/clean_mails_important.csv'),
+    'social': (SOCIAL_TASK, './Past_email_mbox/Category Social', './Clean_Mails/clean_mails_social.csv'),
+    'interviews': (INTERVIEW_TASK, './Past_email_mbox/Interview', './Clean_Mails/interview_emails_processed.csv'),
+    'job-applications': (JOB_APPLICATION_TASK, './Past_email_mbox/Category Updates',
+                         './Clean_Mails/job_application_updates_processed.csv'),
+}
+
+def main():
+    task, input_stem, output_csv_path = STAGES['job-applications']
+    process_job_application_emails(find_table(input_stem), output_csv_path)
+
+if __name__ == "__main__":
+    main()
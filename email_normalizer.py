@@ -0,0 +1,217 @@
+import re
+from urllib.parse import urlsplit
+
+from email_threads import find_quote
+
+# One normalizer for every body sent to a model: the cleaning stages, faq.py and app.py,
+# when they build a request (the tables keep the raw bodies). It removes the text that costs tokens without informing any answer: quoted
+# history, signatures, legal and unsubscribe footers, invisible characters, separator
+# lines and long tracking URLs. It works on multi-line bodies as well as the flattened ones
+# stored in the tables (quote attributions and footers are found without relying on line
+# starts), with a few precompiled regular expressions per body.
+# Nothing that matters is dropped silently: long URLs become short numbered placeholders
+# ("[link 2: boards.greenhouse.io]") whose targets restore_links puts back into answers,
+# and a sentence naming a deadline in any removed text is kept as a "[deadline: ...]" note.
+# quotes selects what is kept of a thread: DROP_QUOTES only the new text, LATEST_QUOTE the
+# new text and the one message it quotes (split_segments), KEEP_QUOTES all.
+DROP_QUOTES = 'drop'
+LATEST_QUOTE = 'latest'
+KEEP_QUOTES = 'keep'
+NORMALIZER_VERSION = 3  # part of the task signature; bump when the output changes
+
+URL_MAX_CHARS = 60  # longer URLs become placeholders
+SIGNATURE_MAX_CHARS = 400  # a delimiter or sign-off further from the end than this is not a signature
+SIGN_OFF_KEEP_CHARS = 40  # kept after a sign-off, for the sender's name
+FOOTER_WINDOW_CHARS = 2000  # footers are only looked for in this many trailing characters
+FOOTER_MAX_LINES = 8  # and, in a multi-line body, in this many trailing lines
+DEADLINE_MAX_CHARS = 160
+MAX_DEADLINE_NOTES = 3
+
+INVISIBLE = re.compile('[\u00ad\u034f\u200b-\u200f\u2060\ufeff]')
+URL = re.compile(r'(?:https?://|www\.)[^\s<>"\'()\[\]{}]+', re.I)
+URL_TRAILING = '.,;:!?'
+TRACKING_URL = re.compile(r'\.(?:png|gif|jpe?g|webp|bmp)(?:[?#]|$)|/(?:open|pixel|beacon)(?:[./?]|$)', re.I)
+PLACEHOLDER = re.compile(r'\[link (\d+)(?::[^\]]*)?\]')
+QUOTED_LINE = re.compile(r'^[ \t]*>.*(?:\n|$)', re.M)
+SEPARATOR = re.compile(r'([-=*~#+.])\1{4,}')  # not _: a line of them starts an Outlook quote
+SPACES = re.compile(r'[ \t\xa0]+')
+BLANK_LINES = re.compile(r' ?\n[ \n]*\n')
+LINE_END_SPACES = re.compile(r' \n')
+SENTENCE_END = re.compile(r'[.!?|]\s|\n')
+FORWARDED = re.compile(r'\s*-{2,}\s*Forwarded', re.I)
+
+SIGNATURE = re.compile(
+    r'(?:^|\n)-- \n'  # the standard "-- " delimiter line (a bare "--" is often just a separator)
+    r'|\s--  (?=\S)'  # the same, in a flattened body
+    r'|\bSent from my (?:iPhone|iPad|Android|BlackBerry|mobile|Galaxy|Samsung|Pixel)'
+    r'|\bGet Outlook for (?:iOS|Android)',
+    re.I
+)
+SIGN_OFF = re.compile(
+    r'\b(?:best|kind|warm|warmest|many|thanks and|thanks &) regards\b|\bregards,'
+    r'|\b(?:best|warm) wishes,|\bsincerely,|\bcheers,|\byours (?:truly|sincerely),',
+    re.I
+)
+FOOTER = re.compile(
+    r'unsubscribe|opt[- ]out\b'
+    r'|you (?:are )?receiv(?:e|ed|ing) this (?:e-?mail|message|because)'
+    r'|this (?:e-?mail|message)(?: and any attachments?)? (?:is|are|may contain|contains?|may be) '
+    r'(?:confidential|privileged|intended)'
+    r'|confidentiality notice|privileged and confidential'
+    r'|(?:manage|update) (?:your )?(?:e-?mail |notification |subscription )?(?:preferences|settings|subscriptions)'
+    r'|privacy policy|all rights reserved|\xa9|\(c\) \d{4}'
+    r'|do not reply to this (?:e-?mail|message)|this is an automated (?:e-?mail|message)',
+    re.I
+)
+# A footer is a trailing block, so a footer phrase only counts at the start of one: after a
+# line break, a separator or (in a flattened body, where it is two spaces) a blank line,
+# optionally behind a short lead-in ("To unsubscribe", "Click here to unsubscribe")
+FOOTER_START = re.compile(
+    r'(?:\n|  |-{2,}|_{3,}|={3,}|\*{3,})\s*'
+    r'(?:(?:to|please|click here to|you can|you may|if you (?:no longer )?(?:wish|want|would like) to) )?'
+    rf'(?:{FOOTER.pattern})',
+    re.I
+)
+
+MONTHS = r'jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?' \
+         r'|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?'
+DAYS = r'monday|tuesday|wednesday|thursday|friday|saturday|sunday|today|tonight|tomorrow' \
+       r'|end of (?:the )?(?:day|week|month)|eod|cob'
+DATE = rf'(?:{DAYS}|(?:{MONTHS})\.? \d|\d{{1,2}}(?:st|nd|rd|th)?(?: of)? (?:{MONTHS})\b|\d{{1,2}}[/.-]\d{{1,2}})'
+DEADLINE = re.compile(  # a deadline word followed closely by a date, or a time window
+    rf'\b(?:deadline|due|expir(?:e|es|ing|ation)|no later than|by|before|until)\b[^.!?\n]{{0,12}}?\b{DATE}'
+    rf'|\bwithin \d+ (?:hours|days|business days)\b',
+    re.I
+)
+
+def deadline_notes(text):
+    """The sentences of text naming a deadline, shortened, for text about to be removed."""
+    notes = []
+    for match in DEADLINE.finditer(text):
+        start = max(text.rfind(separator, 0, match.start()) for separator in ('. ', '! ', '? ', '\n')) + 1
+        end = SENTENCE_END.search(text, match.end())
+        sentence = ' '.join(text[start:end.start() + 1 if end else len(text)].split()).lstrip('> ')
+        if len(sentence) > DEADLINE_MAX_CHARS:
+            sentence = sentence[:DEADLINE_MAX_CHARS].rsplit(' ', 1)[0] + '...'
+        if sentence not in notes:
+            notes.append(sentence)
+    return notes
+
+def split_segments(text):
+    """text split before each quote attribution: [new text, quoted message, older messages...]."""
+    segments = []
+    start = 0
+    quote = find_quote(text)
+    while quote is not None:
+        if quote[0] > start:
+            segments.append(text[start:quote[0]])
+            start = quote[0]
+        quote = find_quote(text, quote[1])
+    segments.append(text[start:])
+    return segments
+
+def cut_signature(text):
+    """Where the signature of one message starts, or len(text)."""
+    window = max(len(text) - SIGNATURE_MAX_CHARS, 0)
+    match = SIGNATURE.search(text, window)
+    if match:
+        return match.start()
+    sign_off = None
+    for sign_off in SIGN_OFF.finditer(text, window):
+        pass
+    if sign_off is not None and len(text) - sign_off.end() > SIGN_OFF_KEEP_CHARS:
+        end = text.find(' ', sign_off.end() + SIGN_OFF_KEEP_CHARS)
+        return len(text) if end == -1 else end
+    return len(text)
+
+def cut_footer(text):
+    """Where the boilerplate footer of one message starts, or len(text)."""
+    window = max(len(text) // 2, len(text) - FOOTER_WINDOW_CHARS)
+    line_start = len(text.rstrip())
+    for _ in range(FOOTER_MAX_LINES):
+        line_start = text.rfind('\n', 0, line_start)
+        if line_start == -1:
+            break
+    window = max(window, line_start)
+    match = FOOTER_START.search(text, window)
+    if match is None:
+        return len(text)
+    # A separator line just before the footer belongs to it
+    kept = text[:match.start()].rstrip()
+    separator = len(kept) - len(kept.rstrip('-_=*'))
+    return len(kept) - separator if separator >= 2 else match.start()
+
+def clean_message(text, notes):
+    """One message of a thread without its signature and footer; deadlines in them go to notes."""
+    end = min(cut_signature(text), cut_footer(text))
+    if end < len(text):
+        notes.extend(deadline_notes(text[end:]))
+    return text[:end].rstrip()
+
+def shorten_links(text, links):
+    """Long URLs replaced by numbered placeholders (their targets appended to links), tracking pixels removed."""
+    def replace(match):
+        url = match.group(0).rstrip(URL_TRAILING)
+        trailing = match.group(0)[len(url):]
+        if TRACKING_URL.search(url):
+            return trailing
+        if len(url) <= URL_MAX_CHARS:
+            return url + trailing
+        links.append(url)
+        host = urlsplit(url if '://' in url else 'http://' + url).hostname or ''
+        return f"[link {len(links)}: {host[4:] if host.startswith('www.') else host}]{trailing}"
+
+    return URL.sub(replace, text)
+
+def normalize_email(body, quotes=DROP_QUOTES, shorten_urls=True, links=None):
+    """
+    The body without quoted history (as selected by quotes), signatures, footers, tracking
+    pixels and, with shorten_urls, long URLs. Pass a list as links to collect the URLs the
+    "[link N: host]" placeholders stand for.
+    """
+    text = INVISIBLE.sub('', (body or '').replace('\r\n', '\n').replace('\r', '\n'))
+    notes = []
+    segments = split_segments(text)
+    kept = {DROP_QUOTES: 1, LATEST_QUOTE: 2}.get(quotes, len(segments))
+    if kept == 1 and len(segments) > 1 and FORWARDED.match(segments[1]):
+        kept = 2  # a forwarded message is the content, not history
+    for dropped in segments[kept:]:
+        notes.extend(deadline_notes(dropped))
+    if quotes == DROP_QUOTES and '\n' in text:
+        quoted_lines = ''.join(QUOTED_LINE.findall(segments[0]))
+        if quoted_lines:
+            notes.extend(deadline_notes(quoted_lines))
+            segments[0] = QUOTED_LINE.sub('', segments[0])
+    text = ('\n\n' if '\n' in text else ' ').join(
+        message for message in (clean_message(segment, notes) for segment in segments[:kept]) if message.strip()
+    )
+
+    if shorten_urls:
+        text = shorten_links(text, [] if links is None else links)
+    else:
+        text = URL.sub(lambda match: '' if TRACKING_URL.search(match.group(0).rstrip(URL_TRAILING)) else match.group(0),
+                       text)
+    text = SEPARATOR.sub(r'\1\1\1', text)
+    text = SPACES.sub(' ', text)
+    text = BLANK_LINES.sub('\n\n', LINE_END_SPACES.sub('\n', text)).strip()
+    notes = list(dict.fromkeys(notes))[:MAX_DEADLINE_NOTES]
+    if notes:
+        text += ('\n' if '\n' in text else ' ') + ' '.join(f"[deadline: {note}]" for note in notes)
+    return text
+
+def restore_links(data, links):
+    """A parsed answer with the "[link N: host]" placeholders in its values replaced by their URLs."""
+    if not links:
+        return data
+
+    def restore(value):
+        if isinstance(value, str):
+            return PLACEHOLDER.sub(
+                lambda match: links[int(match.group(1)) - 1] if 0 < int(match.group(1)) <= len(links) else match.group(0),
+                value
+            )
+        if isinstance(value, list):
+            return [restore(item) for item in value]
+        return value
+
+    return {key: restore(value) for key, value in data.items()}
@@ -0,0 +1,173 @@
+import csv
+import hashlib
+import os
+
+# Intermediate email tables are either CSV files or Parquet datasets: a directory of
+# zstd-compressed part files read back in name order. Parquet stores every column
+# separately, so a loader asking for a few header columns never reads the bodies.
+PARQUET_EXTENSION = '.parquet'
+PARQUET_BATCH_ROWS = 1000
+CSV_FIELD_SIZE_LIMIT = 2147483647  # a long body is one field; the csv module's default is 128 KB
+
+# Written by mbox_to_csv next to the tables: every unique message, the labels (tables)
+# it appears under, and the one label whose table owns it for the cleaning stages
+DEDUP_INDEX_FILENAME = 'dedup_index.csv'
+DEDUP_INDEX_HEADER = ['Key', 'Labels', 'Label']
+
+def is_parquet(path):
+    """Return True when path names a Parquet dataset rather than a CSV file."""
+    return path.endswith(PARQUET_EXTENSION)
+
+def find_table(stem):
+    """
+    The table converted to stem (a path without extension, e.g. Past_email_mbox/Sent):
+    the Parquet dataset when there is one, otherwise the CSV file.
+    """
+    if os.path.isdir(stem + PARQUET_EXTENSION):
+        return stem + PARQUET_EXTENSION
+    return stem + '.csv'
+
+def parquet_part_path(dataset_path, index):
+    return os.path.join(dataset_path, f'part-{index:05d}{PARQUET_EXTENSION}')
+
+def parquet_part_paths(dataset_path):
+    """List the part files of a Parquet dataset in order."""
+    return [
+        os.path.join(dataset_path, filename)
+        for filename in sorted(os.listdir(dataset_path))
+        if filename.endswith(PARQUET_EXTENSION)
+    ]
+
+def write_parquet_part(rows, part_file_path, columns, batch_rows=PARQUET_BATCH_ROWS):
+    """
+    Stream rows (lists ordered like columns) into a zstd-compressed Parquet file.
+    Rows are buffered batch_rows at a time, so memory does not grow with the input.
+    Missing values are stored as empty strings, like csv.writer does.
+    Returns the number of rows written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(column, pa.string()) for column in columns])
+
+    def write_batch(writer, batch):
+        arrays = [pa.array([values[index] for values in batch], pa.string()) for index in range(len(columns))]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+    written = 0
+    with pq.ParquetWriter(part_file_path, schema, compression='zstd') as writer:
+        batch = []
+        for row in rows:
+            batch.append(['' if value is None else str(value) for value in row])
+            if len(batch) >= batch_rows:
+                write_batch(writer, batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            write_batch(writer, batch)
+            written += len(batch)
+    return written
+
+def iter_rows(file_path, columns=None):
+    """
+    Yield each row of a CSV file or Parquet dataset as a dictionary.
+    If columns is given, rows only contain those columns; for Parquet datasets the other
+    columns are never read from disk.
+    """
+    if is_parquet(file_path):
+        import pyarrow.parquet as pq
+
+        for part_file_path in parquet_part_paths(file_path):
+            for batch in pq.ParquetFile(part_file_path).iter_batches(columns=columns):
+                yield from batch.to_pylist()
+        return
+
+    csv.field_size_limit(CSV_FIELD_SIZE_LIMIT)
+    with open(file_path, newline='', encoding='utf-8') as csv_file:
+        for row in csv.DictReader(csv_file):
+            if columns is None:
+                yield row
+            else:
+                yield {column: row.get(column, '') for column in columns}
+
+def load_rows(file_path, columns=None):
+    """Load a CSV file or Parquet dataset into a list of dictionaries."""
+    return list(iter_rows(file_path, columns))
+
+def table_label(file_path):
+    """The Gmail label a table was converted from, e.g. 'Sent' for Past_email_mbox/Sent.csv."""
+    return os.path.splitext(os.path.basename(os.path.normpath(file_path)))[0]
+
+def row_key(message_id, body):
+    """
+    Identify a message across label exports: its Message-ID, or when it has none,
+    a hash of its body with case and whitespace normalized.
+    """
+    message_id = str(message_id).strip() if message_id else ''
+    if message_id:
+        return message_id
+    normalized_body = ' '.join(str(body or '').lower().split())
+    return 'sha1:' + hashlib.sha1(normalized_body.encode('utf-8')).hexdigest()
+
+def write_dedup_index(label_keys, index_path, label_priority=()):
+    """
+    Write the global dedup index from {label: message keys of that label's table}.
+    A message found under several labels is owned by the label that comes first in
+    label_priority; labels missing from it rank after, alphabetically.
+    Returns (unique messages, duplicate rows).
+    """
+    rank = {label: index for index, label in enumerate(label_priority)}
+    ordered_labels = sorted(label_keys, key=lambda label: (rank.get(label, len(rank)), label))
+    message_labels = {}
+    for label in ordered_labels:
+        for key in label_keys[label]:
+            labels = message_labels.setdefault(key, [])
+            if label not in labels:
+                labels.append(label)
+
+    with open(index_path, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(DEDUP_INDEX_HEADER)
+        for key, labels in message_labels.items():
+            writer.writerow([key, ', '.join(labels), labels[0]])
+    total_rows = sum(len(keys) for keys in label_keys.values())
+    return len(message_labels), total_rows - len(message_labels)
+
+def load_dedup_index(index_path):
+    """Load the dedup index as {key: (labels, owning label)}."""
+    index = {}
+    for row in iter_rows(index_path):
+        index[row['Key']] = (row['Labels'], row['Label'])
+    return index
+
+def iter_unique_rows(file_path, columns=None, index_path=None):
+    """
+    Like iter_rows, but yield each unique message only once across all label tables.
+    Rows repeating an earlier row of the same table are dropped, and so are rows whose
+    message is owned by another label according to the dedup index (by default the
+    index next to file_path, if there is one). Each row gets a 'Labels' entry listing
+    every label the message appears under.
+    """
+    if index_path is None:
+        index_path = os.path.join(os.path.dirname(os.path.normpath(file_path)), DEDUP_INDEX_FILENAME)
+    index = load_dedup_index(index_path) if os.path.exists(index_path) else {}
+    label = table_label(file_path)
+
+    read_columns = None
+    if columns is not None:
+        read_columns = list(dict.fromkeys(list(columns) + ['Message-ID', 'Body']))
+    seen_keys = set()
+    skipped = 0
+    for row in iter_rows(file_path, read_columns):
+        key = row_key(row.get('Message-ID'), row.get('Body'))
+        labels, owner = index.get(key, (label, label))
+        if key in seen_keys or owner != label:
+            skipped += 1
+            continue
+        seen_keys.add(key)
+        if columns is not None:
+            row = {column: row[column] for column in columns}
+        row['Labels'] = labels
+        yield row
+    if skipped:
+        print(f"Skipped {skipped} duplicate emails in {file_path}.")
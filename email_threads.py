@@ -0,0 +1,150 @@
+import glob
+import os
+import re
+from collections import namedtuple
+
+from email_store import iter_rows, table_label
+from mbox_index import INDEX_EXTENSION, iter_records, load_index, message_id_hash
+
+# Thread reconstruction for the cleaning stages. mbox_to_csv records the Message-ID each
+# message replies to in the sidecar indexes (see mbox_index), so the reply graph of the
+# whole archive loads without reading a single body. Quoted-reply detection then splits a
+# body into its new text and the message it quotes, which together give the
+# (last incoming message, reply) pair the LLM was otherwise asked to find.
+
+# Label of the messages Zeel sent; every other label holds incoming mail
+SENT_LABEL = 'Sent'
+
+# Attribution lines that start a quoted message; bodies are flattened to one line by
+# mbox_to_csv, so these cannot rely on line starts
+_QUOTE_ATTRIBUTIONS = re.compile(
+    r'\bOn [^<>]{0,160}?(?:<[^<>\s]{1,100}>)?\s{0,3}wrote:'
+    r'|-{2,}\s*(?:Original|Forwarded) Message\s*-{2,}'
+    r'|_{8,}\s*From:'
+    r'|From: .{1,200}? Sent: .{1,100}? To: ',
+    re.I
+)
+_QUOTE_MARKERS = re.compile(r'(^|\s)(?:>\s?)+')
+
+# parents: {message hash: hash of the message it replies to}
+# sent: hashes of the messages in the Sent label
+# sent_replies: {message hash: hashes of the Sent messages replying to it, oldest first}
+ThreadGraph = namedtuple('ThreadGraph', ['parents', 'sent', 'sent_replies'])
+
+# graph: the archive's ThreadGraph; bodies: {message hash: body} for the messages a table's
+# rows reply to or are answered by
+Threads = namedtuple('Threads', ['graph', 'bodies'])
+
+def index_paths(archive_dir):
+    """The sidecar indexes of every table in an archive directory."""
+    return sorted(glob.glob(os.path.join(archive_dir, '*' + INDEX_EXTENSION)))
+
+def table_path_for(index_path):
+    """The CSV file or Parquet dataset an index belongs to."""
+    base = os.path.splitext(index_path)[0]
+    return base + '.csv' if os.path.exists(base + '.csv') else base + '.parquet'
+
+def load_thread_graph(archive_dir):
+    """Build the reply graph of an archive from its sidecar indexes."""
+    parents, sent, sent_replies = {}, set(), {}
+    for index_path in index_paths(archive_dir):
+        is_sent = table_label(index_path) == SENT_LABEL
+        mbox_filename, mapping = load_index(index_path)
+        try:
+            for record in iter_records(mapping):
+                if not record.id_hash:
+                    continue
+                if record.parent:
+                    parents.setdefault(record.id_hash, record.parent)
+                if is_sent:
+                    sent.add(record.id_hash)
+                    if record.parent:
+                        sent_replies.setdefault(record.parent, []).append((record.date, record.id_hash))
+        finally:
+            mapping.close()
+    for parent, replies in sent_replies.items():
+        sent_replies[parent] = list(dict.fromkeys(id_hash for date, id_hash in sorted(replies)))
+    return ThreadGraph(parents, sent, sent_replies)
+
+def load_bodies(archive_dir, id_hashes):
+    """Read the bodies of the given messages from the tables of an archive, {hash: body}."""
+    bodies = {}
+    if not id_hashes:
+        return bodies
+    for index_path in index_paths(archive_dir):
+        table_path = table_path_for(index_path)
+        if not os.path.exists(table_path):
+            continue
+        for row in iter_rows(table_path, columns=['Message-ID', 'Body']):
+            id_hash = message_id_hash(row['Message-ID'])
+            if id_hash in id_hashes and id_hash not in bodies:
+                bodies[id_hash] = row['Body']
+    return bodies
+
+def load_threads(table_path):
+    """
+    Load what reply_pair needs for the rows of one table: the archive's reply graph and
+    the bodies of the messages those rows reply to, or that Zeel sent in reply to them.
+    Returns None when the archive has no sidecar indexes.
+    """
+    archive_dir = os.path.dirname(os.path.normpath(table_path))
+    if not index_paths(archive_dir):
+        return None
+    graph = load_thread_graph(archive_dir)
+    wanted = set()
+    for row in iter_rows(table_path, columns=['Message-ID']):
+        id_hash = message_id_hash(row['Message-ID'])
+        if id_hash in graph.parents:
+            wanted.add(graph.parents[id_hash])
+        wanted.update(graph.sent_replies.get(id_hash, [])[-1:])
+    return Threads(graph, load_bodies(archive_dir, wanted))
+
+def find_quote(body, start=0):
+    """(start, end) of the first quote attribution in body at or after start, or None."""
+    match = _QUOTE_ATTRIBUTIONS.search(body, start)
+    return None if match is None else match.span()
+
+def split_quote(body):
+    """
+    Split a flattened body at its first quoted message.
+    Returns (new text, quoted message, rest): the quoted message stops at the next
+    attribution, so older history in the thread ends up in rest. quoted and rest are
+    None when nothing is quoted.
+    """
+    first = find_quote(body)
+    if first is None:
+        return body.strip(), None, None
+    second = find_quote(body, first[1])
+    end = second[0] if second else len(body)
+    quoted = _QUOTE_MARKERS.sub(r'\1', body[first[1]:end]).strip()
+    return body[:first[0]].strip(), quoted, body[end:]
+
+def reply_pair(threads, row):
+    """
+    Find the (last incoming message, Zeel's reply) pair of a table row with
+    'Message-ID' and 'Body' columns, from the reply graph and quoted-reply detection.
+    Returns (original_message, reply, unambiguous); when unambiguous is False the
+    pair is incomplete and the LLM has to work it out from the body normalized with
+    email_normalizer.LATEST_QUOTE (the new text and the one message it quotes).
+    """
+    if threads is None:
+        return '', '', False
+    new_text, quoted, rest = split_quote(row['Body'])
+    id_hash = message_id_hash(row['Message-ID'])
+    parent = threads.graph.parents.get(id_hash)
+
+    if id_hash in threads.graph.sent:
+        # Zeel's own message: the incoming one is its parent, or failing that what it quotes
+        if parent in threads.bodies:
+            return split_quote(threads.bodies[parent])[0], new_text, bool(new_text)
+        if quoted:
+            return quoted, new_text, bool(new_text)
+        # A message that starts its thread is a reply on its own
+        return '', new_text, bool(new_text) and not parent
+
+    # An incoming message: the reply is the latest Sent message answering it
+    replies = threads.graph.sent_replies.get(id_hash, [])
+    if replies and replies[-1] in threads.bodies:
+        reply = split_quote(threads.bodies[replies[-1]])[0]
+        return new_text, reply, bool(new_text and reply)
+    return new_text, '', False
@@ -1,70 +1,107 @@
 import csv
 import json
 from dotenv import load_dotenv
-from langchain.prompts import PromptTemplate
-from langchain.chat_models import ChatOpenAI
+from email_normalizer import normalize_email
+from email_store import load_rows
+from llm_cache import cache_get, cache_put
+from llm_executor import map_concurrently
+from llm_json import extract_json
+from llm_metrics import metrics_callbacks
 
-# Load environment variables from .env file (ensure your OpenAI API key is set in this file)
-load_dotenv()
+# FAQs are extracted from each reply on its own, several replies at a time (at most
+# max_workers, default LLM_MAX_CONCURRENCY, within the rate limits of llm_executor). The
+# parsed FAQs of every reply are kept in the LLM response cache (llm_cache) under the
+# reply's hash and the prompt with FAQ_PROMPT_VERSION, so regenerating faq.csv after new
+# mail arrives only sends the new replies. Bump FAQ_PROMPT_VERSION to extract every
+# reply again (editing FAQ_PROMPT does too).
+FAQ_MODEL = "gpt-3.5-turbo"
+FAQ_PROMPT_VERSION = 1
+FAQ_PROMPT = """
+        PAST EMAIL:
+        {reply}
+        ----
+
+        You are an AI assistant. The above is a past email reply from Zeel (an AI student at Penn State and researcher).
+        Your goal is to extract any potential FAQs about Zeel based on this email.
+        Identify potential questions and provide Zeel's answers.
+        Return the results in JSON format as a list of dictionaries with "Question" and "Answer" fields.
+        """
+FAQ_CACHE_KEY = f"FAQ prompt version {FAQ_PROMPT_VERSION}\n{FAQ_PROMPT}"
+
+_llm = None  # created on first use, so importing this module starts nothing
+
+def get_llm():
+    """
+    The OpenAI language model (you can switch to 'gpt-4' if you have access), created the
+    first time it is needed. Every call is recorded in llm_metrics under the "faq" stage.
+    """
+    global _llm
+    if _llm is None:
+        from langchain.chat_models import ChatOpenAI
 
-# Initialize the OpenAI language model (you can switch to 'gpt-4' if you have access)
-llm = ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo")
+        # Load environment variables from .env file (ensure your OpenAI API key is set in this file)
+        load_dotenv()
+        _llm = ChatOpenAI(temperature=0, model_name=FAQ_MODEL, callbacks=metrics_callbacks("faq"))
+    return _llm
 
-def load_csv(file_path):
+def load_csv(file_path, columns=None):
     """
-    Load data from a CSV file into a list of dictionaries.
+    Load data from a CSV file (or Parquet dataset) into a list of dictionaries.
     Each row in the CSV is converted to a dictionary.
+    If columns is given, only those columns are kept (and read, for Parquet).
     """
-    data_list = []
-    with open(file_path, 'r', encoding='utf-8') as csv_file:
-        csv_reader = csv.DictReader(csv_file)
-        for row in csv_reader:
-            data_list.append(row)
-    return data_list
+    return load_rows(file_path, columns)
 
-def extract_faq_individual(past_replies):
+def extract_reply_faqs(item):
     """
-    Process each email reply individually to extract FAQs.
+    The FAQs of one (index, reply), cached once parsed, or None if they could not be
+    extracted (the reply is then sent again on the next run).
+    """
+    idx, reply = item
+    response = ''
+    try:
+        # Get the model's response and parse the JSON in it (code fences and all)
+        response = get_llm().predict(FAQ_PROMPT.format(reply=reply))
+        faq_list = extract_json(response)
+    except ValueError:
+        print(f"JSON decode error for email {idx+1}. Response was:\n{response}")
+        return None
+    except Exception as e:
+        print(f"Error processing email {idx+1}: {e}")
+        return None
+    if isinstance(faq_list, dict):  # a single FAQ
+        faq_list = [faq_list]
+    faq_list = [faq for faq in faq_list if isinstance(faq, dict)]
+    cache_put(FAQ_MODEL, FAQ_CACHE_KEY, reply, json.dumps(faq_list))
+    return faq_list
+
+def extract_faq_individual(past_replies, max_workers=None):
+    """
+    Process each email reply individually to extract FAQs, up to max_workers replies at a
+    time (default: LLM_MAX_CONCURRENCY). Replies whose FAQs are cached are not sent again.
     Avoids issues with text splitting and reduces the potential for looping.
     """
-    faqs = []
+    reply_faqs = [None] * len(past_replies)
+    pending = []
     for idx, reply in enumerate(past_replies):
-        prompt = f"""
-        PAST EMAIL:
-        {reply}
-        ----
-
-        You are an AI assistant. The above is a past email reply from Zeel (an AI student at Penn State and researcher).
-        Your goal is to extract any potential FAQs about Zeel based on this email.
-        Identify potential questions and provide Zeel's answers.
-        Return the results in JSON format as a list of dictionaries with "Question" and "Answer" fields.
-        """
-        try:
-            # Get the model's response
-            response = llm.predict(prompt)
-            # Clean up the response to ensure valid JSON
-            response = response.strip()
-            if response.startswith("```json"):
-                response = response[7:]
-            if response.endswith("```"):
-                response = response[:-3]
-            # Parse the JSON response
-            faq_list = json.loads(response)
-            # Add to the main FAQ list
-            faqs.extend(faq_list)
-        except json.JSONDecodeError:
-            print(f"JSON decode error for email {idx+1}. Response was:\n{response}")
-            continue
-        except Exception as e:
-            print(f"Error processing email {idx+1}: {e}")
-            continue
+        cached = cache_get(FAQ_MODEL, FAQ_CACHE_KEY, reply)
+        if cached is None:
+            pending.append((idx, reply))
+        else:
+            reply_faqs[idx] = json.loads(cached)
+    print(f"FAQs of {len(past_replies) - len(pending)} replies found in the cache; extracting {len(pending)}.")
+    if pending:
+        get_llm()  # created once, before the workers share it
+        for (idx, reply), faq_list in zip(pending, map_concurrently(extract_reply_faqs, pending, max_workers)):
+            reply_faqs[idx] = faq_list
+    faqs = [faq for faq_list in reply_faqs if faq_list for faq in faq_list]
 
     # Remove duplicate FAQs based on the question text
     unique_faqs = []
     seen_questions = set()
     for faq in faqs:
-        question = faq.get('Question', '').strip()
-        answer = faq.get('Answer', '').strip()
+        question = str(faq.get('Question', '')).strip()
+        answer = str(faq.get('Answer', '')).strip()
         if question and question not in seen_questions:
             seen_questions.add(question)
             unique_faqs.append({'Question': question, 'Answer': answer})
@@ -85,18 +122,19 @@ def save_json_to_csv(data, file_name):
         for entry in data:
             writer.writerow(entry)
 
-def main():
+def main(max_workers=None):
     # Load past emails
-    past_emails = load_csv("./Clean_Mails/email_pairs.csv")
+    past_emails = load_csv("./Clean_Mails/email_pairs.csv", columns=["zeels_reply"])
     print(f"Number of email pairs loaded: {len(past_emails)}")
 
-    # Extract Zeel's replies and remove duplicates
-    zeels_replies = [entry.get("zeels_reply", "") for entry in past_emails]
-    zeels_replies = list(set(zeels_replies))  # Remove duplicate replies
+    # Extract Zeel's replies, normalized (see email_normalizer) with their full URLs, since
+    # the FAQ answers quote them, and remove duplicates
+    zeels_replies = [normalize_email(entry.get("zeels_reply", ""), shorten_urls=False) for entry in past_emails]
+    zeels_replies = sorted(set(reply for reply in zeels_replies if reply))  # Remove duplicate and empty replies
     print(f"Number of unique replies: {len(zeels_replies)}")
 
     # Extract FAQs
-    faqs = extract_faq_individual(zeels_replies)
+    faqs = extract_faq_individual(zeels_replies, max_workers)
     print(f"Number of FAQs extracted: {len(faqs)}")
 
     # Save FAQs to CSV
@@ -0,0 +1,71 @@
+import html
+import re
+
+# Fast HTML to plain text conversion for HTML-only emails (newsletters, ATS notifications).
+# A handful of precompiled regular expressions instead of a parse tree: elements that never
+# carry readable text are dropped whole, block-level tags become line breaks, table cells
+# become spaces so layout tables flatten into readable lines, links keep their target as
+# "text (URL)", and every other tag (including images, so tracking pixels) is removed.
+# Long URLs are left as they are; email_normalizer shortens them.
+
+_COMMENTS = re.compile(r'<!--.*?-->|<!\[CDATA\[.*?\]\]>|<!DOCTYPE[^>]*>', re.S | re.I)
+_NON_TEXT_ELEMENTS = re.compile(
+    r'<(script|style|head|title|noscript|template|svg|object|xml)\b[^>]*>.*?</\1\s*>', re.S | re.I
+)
+# Hidden preheaders and spacers; only matches elements without nested tags of the same name
+_HIDDEN_ELEMENTS = re.compile(
+    r'<(div|span|td|p)\b[^>]*style\s*=\s*["\'][^"\']*(?:display\s*:\s*none|mso-hide\s*:\s*all)[^>]*>.*?</\1\s*>',
+    re.S | re.I
+)
+_LINE_BREAK_TAGS = re.compile(
+    r'<\s*/?\s*(?:br|p|div|tr|li|ul|ol|table|tbody|thead|tfoot|h[1-6]|blockquote|section|article|header|footer'
+    r'|hr|center|dd|dt|dl|pre|address|form)\b[^>]*>',
+    re.I
+)
+_ANCHORS = re.compile(
+    r'<a\b[^>]*?\bhref\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))[^>]*>(.*?)</a\s*>', re.S | re.I
+)
+# Links that lead nowhere outside the email keep only their text
+_LOCAL_LINKS = re.compile(r'^(?:#|javascript:)', re.I)
+_CELL_TAGS = re.compile(r'<\s*/?\s*(?:td|th)\b[^>]*>', re.I)
+_TAGS = re.compile(r'<[^>]*>')
+# Invisible characters newsletters use to pad preheaders
+_INVISIBLE = re.compile('[\u200b\u200c\u200d\u2060\ufeff\u034f\u00ad]')
+_SPACES = re.compile(r'[ \t\r\f\v\u00a0]+')
+_BLANK_LINES = re.compile(r'\n\s*\n+')
+
+def _render_anchor(match):
+    """An <a href> element as "text (URL)", or just the URL when the text is empty or the URL itself."""
+    url = next(group for group in match.groups()[:3] if group is not None).strip()
+    text = match.group(4)
+    label = html.unescape(_TAGS.sub('', text)).strip()
+    if not url or _LOCAL_LINKS.match(url):
+        return text
+    if not label or label == html.unescape(url):
+        return f' {url} '
+    return f'{text} ({url})'
+
+def html_to_text(markup):
+    """Convert an HTML document or fragment to readable plain text."""
+    text = _COMMENTS.sub('', markup)
+    text = _NON_TEXT_ELEMENTS.sub('', text)
+    text = _HIDDEN_ELEMENTS.sub('', text)
+    text = _ANCHORS.sub(_render_anchor, text)
+    text = _LINE_BREAK_TAGS.sub('\n', text)
+    text = _CELL_TAGS.sub(' ', text)
+    text = _TAGS.sub('', text)
+    text = html.unescape(text)
+    text = _INVISIBLE.sub('', text)
+    text = _SPACES.sub(' ', text)
+    text = _BLANK_LINES.sub('\n', text.replace(' \n', '\n').replace('\n ', '\n'))
+    return text.strip()
+
+def html_part_to_text(part):
+    """Decode a text/html MIME part with its declared charset and convert it to plain text."""
+    payload = part.get_payload(decode=True) or b''
+    charset = part.get_content_charset() or 'utf-8'
+    try:
+        markup = payload.decode(charset, errors='replace')
+    except LookupError:
+        markup = payload.decode('utf-8', errors='replace')
+    return html_to_text(markup)
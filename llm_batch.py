@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import time
+
+import openai
+from openai.api_requestor import APIRequestor
+
+from llm_cache import cache_put
+from llm_executor import setting
+from llm_metrics import record_call, stage_of, usage_tokens
+
+# OpenAI Batch API mode for the bulk cleaning stages. Instead of one synchronous call per
+# email, a stage's requests are written to a JSONL batch file, uploaded and run as a batch
+# (half the price, outside the per-minute rate limits, done within 24 hours), and the
+# answers are merged back in request order. The submitted batch ids are kept in a state
+# file next to the output CSV, so a run that is interrupted while waiting picks the same
+# batches up again instead of paying for them twice. LLM_BATCH_POLL_SECONDS sets how often
+# the status is checked (default 60).
+BATCH_ENDPOINT = '/v1/chat/completions'
+BATCH_COMPLETION_WINDOW = '24h'
+BATCH_MAX_REQUESTS = 50000  # per batch, the API's limit
+DEFAULT_POLL_SECONDS = 60
+FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+def batch_paths(output_csv_path):
+    """The state file and the JSONL batch file prefix used for an output CSV."""
+    base = os.path.splitext(output_csv_path)[0]
+    return f"{base}.batch.json", f"{base}.batch"
+
+def batch_line(custom_id, request):
+    model, system_prompt, user_content = request
+    return json.dumps({
+        'custom_id': custom_id,
+        'method': 'POST',
+        'url': BATCH_ENDPOINT,
+        'body': {
+            'model': model,
+            'messages': [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content}
+            ]
+        }
+    }) + '\n'
+
+def api_request(method, url, params=None):
+    """A JSON request to an API endpoint the installed openai client has no resource for."""
+    response, _, _ = APIRequestor().request(method, url, params)
+    return response.data
+
+def submit_batch(jsonl_path):
+    with open(jsonl_path, 'rb') as batch_file:
+        input_file = openai.File.create(file=batch_file, purpose='batch')
+    return api_request('post', '/batches', {
+        'input_file_id': input_file['id'],
+        'endpoint': BATCH_ENDPOINT,
+        'completion_window': BATCH_COMPLETION_WINDOW
+    })
+
+def load_state(state_path):
+    if not os.path.exists(state_path):
+        return {'batches': []}
+    with open(state_path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_state(state_path, state):
+    temporary_path = state_path + '.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temporary_path, state_path)
+
+def wait_for_batch(batch_id, poll_seconds):
+    """Poll a batch until it reaches a final status; returns the batch object."""
+    last_progress = None
+    while True:
+        batch = api_request('get', f'/batches/{batch_id}')
+        counts = batch.get('request_counts') or {}
+        progress = (batch['status'], counts.get('completed'))
+        if progress != last_progress:
+            print(f"Batch {batch_id}: {batch['status']} "
+                  f"({counts.get('completed', 0)}/{counts.get('total', 0)} requests done)")
+            last_progress = progress
+        if batch['status'] in FINAL_STATUSES:
+            return batch
+        time.sleep(poll_seconds)
+
+def read_results(batch):
+    """{custom_id: response body} of the requests that succeeded in a finished batch."""
+    results = {}
+    if batch.get('output_file_id'):
+        for line in openai.File.download(batch['output_file_id']).decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get('response') or {}
+            if response.get('status_code') == 200:
+                results[result['custom_id']] = response['body']
+            else:
+                print(f"Batch request {result['custom_id']} failed: {result.get('error') or response.get('body')}")
+    if batch.get('error_file_id'):
+        errors = openai.File.download(batch['error_file_id']).decode('utf-8').splitlines()
+        print(f"Batch {batch['id']}: {len([line for line in errors if line.strip()])} requests failed.")
+    return results
+
+def run_batch(requests, output_csv_path, poll_seconds=None):
+    """
+    Run (model, system prompt, user content) requests through the Batch API and wait for
+    them. Replies are cached and returned in request order, None for requests that failed
+    (the next run sends those again).
+    """
+    if not requests:
+        return []
+    poll_seconds = poll_seconds or setting('LLM_BATCH_POLL_SECONDS', DEFAULT_POLL_SECONDS)
+    state_path, jsonl_prefix = batch_paths(output_csv_path)
+    state = load_state(state_path)
+    submitted = {entry['hash']: entry['id'] for entry in state['batches']}
+
+    # Write and submit the batch files, reusing batches already submitted for the same requests
+    batch_ids = []
+    for part, start in enumerate(range(0, len(requests), BATCH_MAX_REQUESTS)):
+        part_requests = requests[start:start + BATCH_MAX_REQUESTS]
+        lines = ''.join(
+            batch_line(f'request-{index}', request) for index, request in enumerate(part_requests, start=start)
+        )
+        lines_hash = hashlib.sha256(lines.encode('utf-8', errors='surrogatepass')).hexdigest()
+        if lines_hash in submitted:
+            print(f"Resuming batch {submitted[lines_hash]}.")
+            batch_ids.append(submitted[lines_hash])
+            continue
+        jsonl_path = f"{jsonl_prefix}-{part}.jsonl"
+        with open(jsonl_path, 'w', encoding='utf-8', errors='surrogatepass') as f:
+            f.write(lines)
+        batch = submit_batch(jsonl_path)
+        print(f"Submitted batch {batch['id']} with {len(part_requests)} requests ({jsonl_path}).")
+        state['batches'].append({'hash': lines_hash, 'id': batch['id']})
+        save_state(state_path, state)
+        batch_ids.append(batch['id'])
+
+    results = {}
+    for batch_id in batch_ids:
+        batch = wait_for_batch(batch_id, poll_seconds)
+        if batch['status'] != 'completed':
+            print(f"Batch {batch_id} ended as {batch['status']}: {batch.get('errors')}")
+        results.update(read_results(batch))
+
+    # Cache the replies before forgetting the batches, so a restart never pays for them again
+    replies = []
+    for index, request in enumerate(requests):
+        body = results.get(f'request-{index}')
+        replies.append(None if body is None else body['choices'][0]['message']['content'])
+        if body is not None:
+            cache_put(*request, replies[-1])
+            record_call(stage_of(request[1]), request[0], None, *usage_tokens(body), batch=True)
+    os.remove(state_path)
+    for part in range(len(batch_ids)):
+        if os.path.exists(f"{jsonl_prefix}-{part}.jsonl"):
+            os.remove(f"{jsonl_prefix}-{part}.jsonl")
+    return replies
@@ -0,0 +1,169 @@
+import atexit
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from llm_metrics import record_call, stage_of, usage_tokens
+
+# Persistent cache of chat completion responses, read with cache_get and filled with
+# cache_put by task_engine (and by faq.py for its parsed FAQs). Entries are
+# content-addressed by the model, a hash of the system prompt and a hash of the user
+# content, so re-running a stage only pays for rows whose email or prompt changed. The
+# least recently used entries are evicted once the database outgrows LLM_CACHE_MAX_MB.
+# Set LLM_CACHE_PATH to another file in the environment (.env), or to an empty value to
+# turn the cache off.
+DEFAULT_MODEL = "gpt-3.5-turbo"
+DEFAULT_CACHE_PATH = './llm_cache.sqlite'
+DEFAULT_CACHE_MAX_MB = 512
+EVICT_TO_FRACTION = 0.9  # eviction frees space down to this share of the limit
+
+_lock = threading.Lock()
+_connections = {}  # cache path: (connection, total content bytes)
+_stats = {'hits': 0, 'misses': 0}
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8', errors='surrogatepass')).hexdigest()
+
+def cache_path():
+    return os.environ.get('LLM_CACHE_PATH', DEFAULT_CACHE_PATH)
+
+def max_cache_bytes():
+    return int(float(os.environ.get('LLM_CACHE_MAX_MB', DEFAULT_CACHE_MAX_MB)) * 1024 * 1024)
+
+def _connect(path):
+    """Open (once per process) the cache database at path; call with _lock held."""
+    if path not in _connections:
+        connection = sqlite3.connect(path, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' model TEXT NOT NULL, system_hash TEXT NOT NULL, user_hash TEXT NOT NULL,'
+            ' content TEXT NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL,'
+            ' PRIMARY KEY (model, system_hash, user_hash))'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+        connection.commit()
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total > max_cache_bytes():  # the limit may have been lowered since the last run
+            total = _evict(connection, total, int(max_cache_bytes() * EVICT_TO_FRACTION))
+            connection.commit()
+        _connections[path] = (connection, total)
+    return _connections[path][0]
+
+def cache_get(model, system_prompt, user_content):
+    """The cached response content, or None."""
+    path = cache_path()
+    if not path:
+        return None
+    key = (model, text_hash(system_prompt), text_hash(user_content))
+    with _lock:
+        connection = _connect(path)
+        row = connection.execute(
+            'SELECT content FROM responses WHERE model = ? AND system_hash = ? AND user_hash = ?', key
+        ).fetchone()
+        if row is None:
+            _stats['misses'] += 1
+            return None
+        connection.execute(
+            'UPDATE responses SET last_used = ? WHERE model = ? AND system_hash = ? AND user_hash = ?',
+            (time.time(),) + key
+        )
+        connection.commit()
+        _stats['hits'] += 1
+        return row[0]
+
+def cache_put(model, system_prompt, user_content, content):
+    """Store a response, evicting the least recently used entries if the cache is over its size limit."""
+    path = cache_path()
+    if not path:
+        return
+    key = (model, text_hash(system_prompt), text_hash(user_content))
+    size = len(content.encode('utf-8', errors='surrogatepass'))
+    now = time.time()
+    with _lock:
+        connection = _connect(path)
+        replaced = connection.execute(
+            'SELECT size FROM responses WHERE model = ? AND system_hash = ? AND user_hash = ?', key
+        ).fetchone()
+        connection.execute(
+            'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)', key + (content, size, now, now)
+        )
+        total = _connections[path][1] + size - (replaced[0] if replaced else 0)
+        limit = max_cache_bytes()
+        if total > limit:
+            total = _evict(connection, total, int(limit * EVICT_TO_FRACTION))
+        connection.commit()
+        _connections[path] = (connection, total)
+
+def cache_delete(model, system_prompt, user_content):
+    """Forget a cached response, e.g. one that turned out to be unusable."""
+    path = cache_path()
+    if not path:
+        return
+    key = (model, text_hash(system_prompt), text_hash(user_content))
+    with _lock:
+        connection = _connect(path)
+        row = connection.execute(
+            'SELECT size FROM responses WHERE model = ? AND system_hash = ? AND user_hash = ?', key
+        ).fetchone()
+        if row is None:
+            return
+        connection.execute('DELETE FROM responses WHERE model = ? AND system_hash = ? AND user_hash = ?', key)
+        connection.commit()
+        _connections[path] = (connection, _connections[path][1] - row[0])
+
+def _evict(connection, total, target):
+    """Delete least recently used entries until total size is at most target; returns the new total."""
+    for rowid, size in connection.execute('SELECT rowid, size FROM responses ORDER BY last_used').fetchall():
+        if total <= target:
+            break
+        connection.execute('DELETE FROM responses WHERE rowid = ?', (rowid,))
+        total -= size
+    return total
+
+def chat_completion(system_prompt, user_content, model=DEFAULT_MODEL, attempt=0):
+    """
+    One uncached chat completion call; returns the assistant's reply. The call is recorded
+    in llm_metrics, attempt being the number of failed tries before it.
+    """
+    import openai
+
+    started = time.perf_counter()
+    try:
+        response = openai.ChatCompletion.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content}
+            ]
+        )
+    except Exception as e:
+        record_call(stage_of(system_prompt), model, time.perf_counter() - started, attempt=attempt, error=e)
+        raise
+    record_call(stage_of(system_prompt), model, time.perf_counter() - started, *usage_tokens(response), attempt=attempt)
+    return response["choices"][0]["message"]["content"]
+
+def cache_stats():
+    """Hits and misses of this process, and the number of entries and bytes in the cache."""
+    stats = dict(_stats)
+    path = cache_path()
+    stats['entries'], stats['bytes'] = 0, 0
+    if path:
+        with _lock:
+            stats['entries'] = _connect(path).execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            stats['bytes'] = _connections[path][1]
+    return stats
+
+def print_cache_stats():
+    if not _stats['hits'] and not _stats['misses']:
+        return
+    stats = cache_stats()
+    lookups = stats['hits'] + stats['misses']
+    print(
+        f"LLM cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hits'] / lookups:.0%} hit rate), "
+        f"{stats['entries']} entries, {stats['bytes'] / 1e6:.1f} MB"
+    )
+
+atexit.register(print_cache_stats)
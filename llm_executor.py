@@ -0,0 +1,83 @@
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Bounded-concurrency execution of LLM calls. The openai client used here is blocking, so
+# calls run in worker threads driven by an asyncio loop: at most LLM_MAX_CONCURRENCY are in
+# flight, and a sliding one-minute window keeps them under the account's requests- and
+# tokens-per-minute limits. Results always come back in input order. The defaults can be
+# overridden with LLM_MAX_CONCURRENCY, LLM_RPM and LLM_TPM in the environment (.env) to
+# match the account's rate limit tier.
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_RPM = 3500
+DEFAULT_TPM = 90000
+RATE_WINDOW_SECONDS = 60
+
+# Added to each input's estimate for the system prompt and the completion
+TOKENS_PER_CALL = 700
+
+def estimate_tokens(text):
+    """Rough token count of a prompt (about four characters per token), for TPM accounting."""
+    return len(str(text)) // 4 + TOKENS_PER_CALL
+
+def setting(name, default):
+    """An integer setting from the environment, read when it is used so .env files loaded later apply."""
+    return int(os.environ.get(name, default))
+
+def rate_limiter(rpm, tpm, window=RATE_WINDOW_SECONDS):
+    """
+    Return an async acquire(tokens) that waits until one more request of that many tokens
+    fits in the last window seconds under both rpm and tpm. Must be used inside one loop.
+    """
+    calls = deque()  # (time, tokens) of the calls in the current window
+    used = 0
+    lock = asyncio.Lock()
+
+    async def acquire(tokens):
+        nonlocal used
+        tokens = min(tokens, tpm)  # an oversized call still goes through, alone
+        async with lock:
+            while True:
+                now = time.monotonic()
+                while calls and now - calls[0][0] >= window:
+                    used -= calls.popleft()[1]
+                if len(calls) < rpm and used + tokens <= tpm:
+                    calls.append((now, tokens))
+                    used += tokens
+                    return
+                await asyncio.sleep(window - (now - calls[0][0]))
+
+    return acquire
+
+async def _map_concurrently(func, inputs, max_concurrency, acquire, count_tokens):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        async def call(item):
+            async with semaphore:
+                await acquire(count_tokens(item))
+                return await loop.run_in_executor(executor, func, item)
+
+        return await asyncio.gather(*(call(item) for item in inputs))
+
+def map_concurrently(func, inputs, max_concurrency=None, rpm=None, tpm=None, count_tokens=estimate_tokens):
+    """
+    Call func (e.g. a parse_* function making one API call) on every input, with up to
+    max_concurrency calls in flight and at most rpm requests / tpm tokens per minute.
+    Limits left as None come from the environment or the defaults above.
+    Returns the results in the order of inputs.
+    """
+    inputs = list(inputs)
+    if not inputs:
+        return []
+    max_concurrency = max_concurrency or setting('LLM_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY)
+    rpm = rpm or setting('LLM_RPM', DEFAULT_RPM)
+    tpm = tpm or setting('LLM_TPM', DEFAULT_TPM)
+
+    async def run():
+        return await _map_concurrently(func, inputs, max_concurrency, rate_limiter(rpm, tpm), count_tokens)
+
+    return asyncio.run(run())
@@ -0,0 +1,68 @@
+import ast
+import json
+import re
+
+# Models often wrap their JSON answer in a ```json fence, add a sentence around it, leave a
+# trailing comma or answer with a Python-style dict. extract_json recovers the value from
+# all of these without ever evaluating the text as code.
+FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+CLOSING = {'{': '}', '[': ']'}
+
+def json_span(text):
+    """The first balanced {...} or [...] in text (the rest of text if it never closes), or None."""
+    start = min((index for index in (text.find('{'), text.find('[')) if index != -1), default=-1)
+    if start == -1:
+        return None
+    stack = []
+    quote = None
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char in CLOSING:
+            stack.append(CLOSING[char])
+        elif stack and char == stack[-1]:
+            stack.pop()
+            if not stack:
+                return text[start:index + 1]
+    return text[start:]
+
+def extract_json(text):
+    """
+    Parse the JSON object or array in a model's reply, tolerating code fences, text around
+    it, trailing commas and Python literals (single quotes, True/False/None).
+    Raises ValueError if there is none.
+    """
+    text = text.strip()
+    fenced = FENCE.search(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+
+    span = json_span(text)
+    if span is None:
+        raise ValueError(f"no JSON found in: {text[:200]}")
+    for candidate in (span, TRAILING_COMMA.sub(r'\1', span)):
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            pass
+    try:
+        value = ast.literal_eval(TRAILING_COMMA.sub(r'\1', span))
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        raise ValueError(f"invalid JSON: {span[:200]}")
+    if not isinstance(value, (dict, list)):
+        raise ValueError(f"invalid JSON: {span[:200]}")
+    return value
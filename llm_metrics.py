@@ -0,0 +1,276 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+# Per-call instrumentation of every LLM call: the cleaning stages (through
+# llm_cache.chat_completion and llm_batch), faq.py, create_knowledge_base.py and app.py (through
+# LangChain callbacks). Each call is appended as one JSON record to LLM_METRICS_PATH
+# (default ./llm_metrics.jsonl, an empty value turns the file off) with its stage, model,
+# latency, prompt and completion tokens, attempt number, cost and error. The process also
+# keeps per-stage counters and latency / token histograms. They are printed at exit and,
+# with LLM_METRICS_PORT set, served in the Prometheus text format on
+# http://LLM_METRICS_HOST:LLM_METRICS_PORT/metrics. `python llm_metrics.py [records.jsonl]`
+# summarizes the records of earlier runs.
+DEFAULT_METRICS_PATH = './llm_metrics.jsonl'
+DEFAULT_METRICS_HOST = '127.0.0.1'
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)  # seconds
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+# USD per million (input, output) tokens; the Batch API costs half
+PRICES = {
+    'gpt-3.5-turbo': (0.50, 1.50),
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'text-embedding-ada-002': (0.10, 0.0),
+    'text-embedding-3-small': (0.02, 0.0),
+}
+BATCH_DISCOUNT = 0.5
+
+_lock = threading.Lock()
+_series = {}  # (stage, model): counters and histograms
+_stages = {}  # system prompt: stage name
+_server = []  # the metrics HTTP server, once started
+
+def metrics_path():
+    return os.environ.get('LLM_METRICS_PATH', DEFAULT_METRICS_PATH)
+
+def name_stage(stage, system_prompt):
+    """Report calls made with this system prompt under stage (e.g. a task's name)."""
+    _stages[system_prompt] = stage
+
+def stage_of(system_prompt):
+    return _stages.get(system_prompt, 'unknown')
+
+def call_cost(model, prompt_tokens, completion_tokens, batch=False):
+    """The USD cost of a call, or None for a model without a known price."""
+    prices = PRICES.get(model)
+    if prices is None:
+        return None
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1e6 * (BATCH_DISCOUNT if batch else 1)
+
+def new_series():
+    return {
+        'calls': 0, 'errors': 0, 'retries': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cost': 0.0,
+        'latency_sum': 0.0, 'latency_count': 0,
+        'latency_buckets': [0] * len(LATENCY_BUCKETS),
+        'prompt_buckets': [0] * len(TOKEN_BUCKETS),
+        'completion_buckets': [0] * len(TOKEN_BUCKETS),
+    }
+
+def observe(buckets, bounds, value):
+    for index, bound in enumerate(bounds):
+        if value <= bound:
+            buckets[index] += 1
+            return
+
+def aggregate(record):
+    """Add one call record to the counters and histograms; call with _lock held."""
+    series = _series.setdefault((record['stage'], record['model']), new_series())
+    series['calls'] += 1
+    if record['status'] != 'ok':
+        series['errors'] += 1
+    if record['attempt']:
+        series['retries'] += 1
+    series['prompt_tokens'] += record['prompt_tokens']
+    series['completion_tokens'] += record['completion_tokens']
+    series['cost'] += record['cost'] or 0.0
+    if record['latency'] is not None:
+        series['latency_sum'] += record['latency']
+        series['latency_count'] += 1
+        observe(series['latency_buckets'], LATENCY_BUCKETS, record['latency'])
+    if record['status'] == 'ok':
+        observe(series['prompt_buckets'], TOKEN_BUCKETS, record['prompt_tokens'])
+        observe(series['completion_buckets'], TOKEN_BUCKETS, record['completion_tokens'])
+
+def record_call(stage, model, latency, prompt_tokens=0, completion_tokens=0, attempt=0, error=None, batch=False):
+    """
+    Record one LLM call. latency is in seconds (None for Batch API requests), attempt
+    counts from 0 for the first try, and error is the exception of a failed call.
+    """
+    record = {
+        'time': round(time.time(), 3),
+        'stage': stage,
+        'model': model,
+        'latency': None if latency is None else round(latency, 4),
+        'prompt_tokens': prompt_tokens or 0,
+        'completion_tokens': completion_tokens or 0,
+        'cost': call_cost(model, prompt_tokens or 0, completion_tokens or 0, batch),
+        'attempt': attempt,
+        'batch': batch,
+        'status': 'ok' if error is None else 'error',
+        'error': None if error is None else f"{type(error).__name__}: {str(error)[:200]}",
+    }
+    path = metrics_path()
+    with _lock:
+        aggregate(record)
+        if path:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+    start_metrics_server()
+    return record
+
+def usage_tokens(response):
+    """(prompt tokens, completion tokens) of a chat completion response."""
+    usage = response.get('usage') or {}
+    return usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)
+
+def metrics_callbacks(stage):
+    """LangChain callbacks recording every call of a chat model (or LLM) under stage."""
+    from langchain.callbacks.base import BaseCallbackHandler
+
+    class MetricsCallback(BaseCallbackHandler):
+        def __init__(self):
+            self.started = {}  # run id: start time
+
+        def on_llm_start(self, serialized, prompts, **kwargs):
+            self.started[kwargs.get('run_id')] = time.perf_counter()
+
+        def on_chat_model_start(self, serialized, messages, **kwargs):
+            self.started[kwargs.get('run_id')] = time.perf_counter()
+
+        def on_llm_end(self, response, **kwargs):
+            started = self.started.pop(kwargs.get('run_id'), None)
+            output = response.llm_output or {}
+            usage = output.get('token_usage') or {}
+            record_call(stage, output.get('model_name', 'unknown'),
+                        None if started is None else time.perf_counter() - started,
+                        usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+
+        def on_llm_error(self, error, **kwargs):
+            started = self.started.pop(kwargs.get('run_id'), None)
+            record_call(stage, 'unknown', None if started is None else time.perf_counter() - started, error=error)
+
+    return [MetricsCallback()]
+
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def label_text(labels):
+    return ','.join(f'{name}="{label_value(value)}"' for name, value in labels.items())
+
+def histogram_lines(name, labels, buckets, bounds, total, count):
+    lines = []
+    cumulative = 0
+    for bound, observed in zip(bounds, buckets):
+        cumulative += observed
+        lines.append(f'{name}_bucket{{{label_text({**labels, "le": bound})}}} {cumulative}')
+    lines.append(f'{name}_bucket{{{label_text({**labels, "le": "+Inf"})}}} {count}')
+    lines.append(f'{name}_sum{{{label_text(labels)}}} {total}')
+    lines.append(f'{name}_count{{{label_text(labels)}}} {count}')
+    return lines
+
+def prometheus_text():
+    """The counters and histograms of this process in the Prometheus text exposition format."""
+    with _lock:
+        series = {key: dict(value) for key, value in _series.items()}
+    metrics = {
+        'llm_calls_total': ('counter', 'LLM calls, by outcome.', []),
+        'llm_retries_total': ('counter', 'LLM calls that were a retry of a failed call.', []),
+        'llm_prompt_tokens_total': ('counter', 'Prompt tokens sent.', []),
+        'llm_completion_tokens_total': ('counter', 'Completion tokens received.', []),
+        'llm_cost_usd_total': ('counter', 'Cost of the calls at list prices.', []),
+        'llm_call_latency_seconds': ('histogram', 'Latency of synchronous LLM calls.', []),
+        'llm_prompt_tokens': ('histogram', 'Prompt tokens per successful call.', []),
+        'llm_completion_tokens': ('histogram', 'Completion tokens per successful call.', []),
+    }
+    for (stage, model), values in sorted(series.items()):
+        labels = {'stage': stage, 'model': model}
+        metrics['llm_calls_total'][2].extend([
+            f'llm_calls_total{{{label_text({**labels, "status": "ok"})}}} {values["calls"] - values["errors"]}',
+            f'llm_calls_total{{{label_text({**labels, "status": "error"})}}} {values["errors"]}',
+        ])
+        metrics['llm_retries_total'][2].append(f'llm_retries_total{{{label_text(labels)}}} {values["retries"]}')
+        metrics['llm_prompt_tokens_total'][2].append(
+            f'llm_prompt_tokens_total{{{label_text(labels)}}} {values["prompt_tokens"]}')
+        metrics['llm_completion_tokens_total'][2].append(
+            f'llm_completion_tokens_total{{{label_text(labels)}}} {values["completion_tokens"]}')
+        metrics['llm_cost_usd_total'][2].append(f'llm_cost_usd_total{{{label_text(labels)}}} {values["cost"]:.6f}')
+        metrics['llm_call_latency_seconds'][2].extend(histogram_lines(
+            'llm_call_latency_seconds', labels, values['latency_buckets'], LATENCY_BUCKETS,
+            round(values['latency_sum'], 4), values['latency_count']))
+        successful = values['calls'] - values['errors']
+        metrics['llm_prompt_tokens'][2].extend(histogram_lines(
+            'llm_prompt_tokens', labels, values['prompt_buckets'], TOKEN_BUCKETS, values['prompt_tokens'], successful))
+        metrics['llm_completion_tokens'][2].extend(histogram_lines(
+            'llm_completion_tokens', labels, values['completion_buckets'], TOKEN_BUCKETS,
+            values['completion_tokens'], successful))
+    lines = []
+    for name, (kind, help_text, samples) in metrics.items():
+        lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} {kind}'] + samples)
+    return '\n'.join(lines) + '\n'
+
+def start_metrics_server():
+    """Serve /metrics if LLM_METRICS_PORT is set (once per process); returns the port or None."""
+    port = os.environ.get('LLM_METRICS_PORT')
+    if not port:
+        return None
+    with _lock:
+        if _server:
+            return _server[0].server_address[1]
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer((os.environ.get('LLM_METRICS_HOST', DEFAULT_METRICS_HOST), int(port)),
+                                         MetricsHandler)
+        except OSError as e:
+            print(f"LLM metrics: could not serve on port {port} ({e}).")
+            _server.append(None)
+            return None
+        _server.append(server)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"LLM metrics served on http://{server.server_address[0]}:{server.server_address[1]}/metrics")
+    return server.server_address[1]
+
+def latency_quantile(values, quantile):
+    """Upper bound of the latency bucket holding the quantile, e.g. 2.5 for 'at most 2.5 s'."""
+    target = quantile * values['latency_count']
+    cumulative = 0
+    for bound, observed in zip(LATENCY_BUCKETS, values['latency_buckets']):
+        cumulative += observed
+        if cumulative >= target:
+            return bound
+    return float('inf')
+
+def print_summary():
+    """Calls, errors, retries, latency, tokens and cost per stage and model."""
+    with _lock:
+        series = {key: dict(value) for key, value in _series.items()}
+    if not series:
+        return
+    print("LLM calls by stage:")
+    for (stage, model), values in sorted(series.items(), key=lambda item: -item[1]['cost']):
+        latency = ''
+        if values['latency_count']:
+            latency = (f", {values['latency_sum'] / values['latency_count']:.2f} s mean / "
+                       f"<= {latency_quantile(values, 0.95):g} s p95 latency")
+        print(f"  {stage} ({model}): {values['calls']:,} calls, {values['errors']} errors, "
+              f"{values['retries']} retries{latency}, {values['prompt_tokens']:,} prompt + "
+              f"{values['completion_tokens']:,} completion tokens, ${values['cost']:,.4f}")
+
+atexit.register(print_summary)
+
+def load_records(path=None):
+    """Aggregate the records written by earlier runs, so they are summarized at exit like a run's own."""
+    with open(path or metrics_path(), encoding='utf-8') as f:
+        with _lock:
+            for line in f:
+                if line.strip():
+                    aggregate(json.loads(line))
+
+if __name__ == '__main__':
+    load_records(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,140 @@
+import os
+import threading
+from collections import namedtuple
+
+# Process-wide tokenizer service for token budgets. Encodings are created the first time
+# they are used and shared by every thread afterwards. Each model is counted with the
+# encoding it actually uses: cl100k_base for gpt-3.5 and gpt-4, o200k_base for gpt-4o. These
+# are tiktoken encodings built from vocab files in TOKENIZER_DIR (TIKTOKEN_ENCODINGS has
+# their download URLs), so counting tokens never needs the network; a missing file is
+# reported when the encoding is first needed, which run_tasks does before writing anything.
+# LLM_TOKENIZER in the environment forces one encoding for every model (e.g. gpt2 for the
+# Hugging Face GPT-2 tokenizer). Whole chunks of rows are encoded in one batch call, and
+# count_and_truncate counts and cuts texts with a single encoding pass.
+TOKENIZER_DIR = './Tokenizers'
+DEFAULT_ENCODING = 'cl100k_base'
+MODEL_ENCODINGS = (  # model name prefix: encoding, most specific first
+    ('gpt-4o', 'o200k_base'),
+    ('gpt-4', 'cl100k_base'),
+    ('gpt-3.5', 'cl100k_base'),
+    ('text-embedding', 'cl100k_base'),
+)
+
+# name: (vocab file URL, its sha256, split pattern, special tokens), as tiktoken defines them
+TIKTOKEN_ENCODINGS = {
+    'cl100k_base': (
+        'https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken',
+        '223921b76ee99bde995b7ff738513eef100fb51d18c93597a113bcffe865b2a7',
+        r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+| ?[^\s\p{L}\p{N}]++[\r\n]*+|\s++$|\s*[\r\n]|\s+(?!\S)|\s""",
+        {'<|endoftext|>': 100257, '<|fim_prefix|>': 100258, '<|fim_middle|>': 100259, '<|fim_suffix|>': 100260,
+         '<|endofprompt|>': 100276},
+    ),
+    'o200k_base': (
+        'https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken',
+        '446a9538cb6c348e3516120d7c08b09f57c36495e2acfffe59a5bf8b0cfb1a2d',
+        '|'.join([
+            r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+            r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+            r"""\p{N}{1,3}""",
+            r""" ?[^\s\p{L}\p{N}]+[\r\n/]*""",
+            r"""\s*[\r\n]+""",
+            r"""\s+(?!\S)""",
+            r"""\s+""",
+        ]),
+        {'<|endoftext|>': 199999, '<|endofprompt|>': 200018},
+    ),
+}
+
+# encode_batch(texts) -> list of token id lists; decode(token ids) -> text
+Encoding = namedtuple('Encoding', ['name', 'encode_batch', 'decode'])
+
+_lock = threading.Lock()
+_loaders = {}  # encoding name: function creating the Encoding
+_encodings = {}  # encoding name: Encoding, once created
+
+def register_encoding(name, loader):
+    """Make an encoding available under name; loader() creates it when first used."""
+    with _lock:
+        _loaders[name] = loader
+        _encodings.pop(name, None)
+
+def vocab_path(name):
+    return os.path.join(TOKENIZER_DIR, f'{name}.tiktoken')
+
+def load_tiktoken(name):
+    def loader():
+        url, sha256, pattern, special_tokens = TIKTOKEN_ENCODINGS[name]
+        path = vocab_path(name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"The {name} tokenizer vocab is missing; download it once with: "
+                f"mkdir -p {TOKENIZER_DIR} && curl -o {path} {url}"
+            )
+        import tiktoken
+        from tiktoken.load import load_tiktoken_bpe
+
+        encoding = tiktoken.Encoding(name, pat_str=pattern, mergeable_ranks=load_tiktoken_bpe(path, sha256),
+                                     special_tokens=special_tokens)
+        # encode_ordinary: text like "<|endoftext|>" in an email is counted, not rejected
+        return Encoding(name, encoding.encode_ordinary_batch, encoding.decode)
+
+    return loader
+
+def load_gpt2():
+    from transformers import GPT2TokenizerFast
+
+    tokenizer = GPT2TokenizerFast.from_pretrained('gpt2')
+    return Encoding('gpt2', lambda texts: tokenizer(texts)['input_ids'], tokenizer.decode)
+
+register_encoding('cl100k_base', load_tiktoken('cl100k_base'))
+register_encoding('o200k_base', load_tiktoken('o200k_base'))
+register_encoding('gpt2', load_gpt2)
+
+def encoding_for_model(model):
+    """The name of the encoding used to count tokens for a model."""
+    if os.environ.get('LLM_TOKENIZER'):
+        return os.environ['LLM_TOKENIZER']
+    for prefix, name in MODEL_ENCODINGS:
+        if model.startswith(prefix):
+            return name
+    return DEFAULT_ENCODING
+
+def get_encoding(name=None):
+    """The shared Encoding called name (default: the one of the default model), created once."""
+    name = name or encoding_for_model('')
+    with _lock:
+        if name not in _encodings:
+            if name not in _loaders:
+                raise ValueError(f"unknown tokenizer encoding {name!r}; known: {', '.join(sorted(_loaders))}")
+            _encodings[name] = _loaders[name]()
+        return _encodings[name]
+
+def encode_batch(texts, encoding=None):
+    """The token ids of each text, in one tokenizer call."""
+    texts = list(texts)
+    if not texts:
+        return []
+    return get_encoding(encoding).encode_batch(texts)
+
+def count_tokens(texts, encoding=None):
+    """The number of tokens of each text, in one tokenizer call."""
+    return [len(tokens) for tokens in encode_batch(texts, encoding)]
+
+def truncate(text, tokens, max_tokens, encoding=None):
+    """text cut to its first max_tokens tokens, given its tokens from encode_batch."""
+    if max_tokens is None or len(tokens) <= max_tokens:
+        return text
+    return get_encoding(encoding).decode(tokens[:max(max_tokens, 0)])
+
+def count_and_truncate(texts, max_tokens, encoding=None):
+    """
+    (text cut to max_tokens, its token count before cutting) for each text, with one
+    encoding pass; only the texts over the limit are decoded. max_tokens is one limit for
+    all texts, a list with one per text, or None for no limit.
+    """
+    texts = list(texts)
+    limits = max_tokens if isinstance(max_tokens, (list, tuple)) else [max_tokens] * len(texts)
+    return [
+        (truncate(text, tokens, limit, encoding), len(tokens))
+        for text, tokens, limit in zip(texts, encode_batch(texts, encoding), limits)
+    ]
@@ -0,0 +1,138 @@
+import json
+import os
+import pickle
+import random
+import re
+
+from email_store import iter_rows, row_key
+
+# A local pre-classifier for the label a task asks the LLM for (e.g. "importance"). It is
+# trained offline from the labels earlier LLM runs gave, as TF-IDF features of each
+# email's subject, sender and start of the body fed to a logistic regression, and answers
+# in microseconds on CPU. run_tasks logs the label of every parsed LLM answer, before the
+# task's keep filter drops any row, next to the output (<output>.labels.jsonl), so
+# training sees every label and not only the kept ones. Only a confident label among the
+# task's classifier_labels (those for which the other fields keep their defaults, such as
+# "not important") is answered locally; every other email goes to the LLM as before.
+CLASSIFIER_DIR = './Classifiers'
+DEFAULT_THRESHOLD = 0.9
+TEXT_BODY_CHARS = 2000  # start of the body used as features
+HOLDOUT_FRACTION = 0.2
+MIN_TRAINING_ROWS = 50
+
+_classifiers = {}  # path: loaded model, or None if there is none
+
+def classifier_threshold():
+    return float(os.environ.get('LOCAL_CLASSIFIER_THRESHOLD', DEFAULT_THRESHOLD))
+
+def classifier_path(task):
+    """Where a task's classifier is stored, e.g. ./Classifiers/social_emails.pkl."""
+    return os.path.join(CLASSIFIER_DIR, re.sub(r'\W+', '_', task.name.lower()).strip('_') + '.pkl')
+
+def classifier_text(row):
+    return f"{row.get('Subject', '')}\n{row.get('From', '')}\n{(row.get('Body') or '')[:TEXT_BODY_CHARS]}"
+
+def labels_path(output_csv_path):
+    """The log of the labels the LLM gave a task's emails, e.g. ./Clean_Mails/clean_mails_social.labels.jsonl."""
+    return os.path.splitext(output_csv_path)[0] + '.labels.jsonl'
+
+def record_labels(output_csv_path, labels):
+    """Append (input row key, label) pairs from parsed LLM answers to the task's label log."""
+    labels = [(key, label) for key, label in labels if isinstance(label, str) and label]
+    if labels:
+        with open(labels_path(output_csv_path), mode='a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps([key, label]) + '\n' for key, label in labels))
+
+def load_training_rows(task, input_csv_path, output_csv_path):
+    """
+    (text, label) pairs for a task: the labels logged by earlier runs (the latest per email),
+    joined back to the emails of its input table by row key.
+    """
+    labels = {}
+    with open(labels_path(output_csv_path), encoding='utf-8') as f:
+        for line in f:
+            try:
+                key, label = json.loads(line)
+            except ValueError:  # torn by a crash
+                continue
+            labels[key] = label
+    examples = []
+    for row in iter_rows(input_csv_path, ['Message-ID', 'Subject', 'From', 'Body']):
+        label = labels.get(row_key(row['Message-ID'], row['Body']))
+        if label is not None:
+            examples.append((classifier_text(row), label))
+    return examples
+
+def build_model():
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+
+    return make_pipeline(
+        TfidfVectorizer(sublinear_tf=True, ngram_range=(1, 2), min_df=2, max_features=50000),
+        LogisticRegression(max_iter=1000, class_weight='balanced')
+    )
+
+def evaluate(model, examples, threshold, local_labels):
+    """(share of examples answered locally: confidently and with one of local_labels, accuracy on those)."""
+    predictions = classify(model, [text for text, label in examples], threshold)
+    confident = [(label, predicted) for (text, label), (predicted, confidence) in zip(examples, predictions)
+                 if predicted in local_labels]
+    if not confident:
+        return 0.0, 0.0
+    return len(confident) / len(examples), sum(1 for label, predicted in confident if label == predicted) / len(confident)
+
+def train_classifier(task, input_csv_path, output_csv_path, threshold=None, seed=0):
+    """
+    Train a task's classifier from an earlier LLM run and save it to classifier_path(task).
+    Prints, for a held-out share of the rows, how many calls it would save at the threshold
+    and how accurate those answers are.
+    """
+    threshold = threshold or classifier_threshold()
+    examples = load_training_rows(task, input_csv_path, output_csv_path)
+    if len(examples) < MIN_TRAINING_ROWS or len({label for text, label in examples}) < 2:
+        print(f"{task.name}: only {len(examples)} labeled emails found, need {MIN_TRAINING_ROWS} with two labels.")
+        return None
+    random.Random(seed).shuffle(examples)
+    holdout = examples[:int(len(examples) * HOLDOUT_FRACTION)]
+    training = examples[len(holdout):]
+
+    model = build_model()
+    model.fit([text for text, label in training], [label for text, label in training])
+    coverage, accuracy = evaluate(model, holdout, threshold, task.classifier_labels)
+    print(f"{task.name}: trained on {len(training)} emails. On {len(holdout)} held out, {coverage:.0%} are answered "
+          f"locally at confidence {threshold} ({accuracy:.1%} agree with the LLM).")
+
+    # Keep everything for the saved model
+    model = build_model()
+    model.fit([text for text, label in examples], [label for text, label in examples])
+    os.makedirs(CLASSIFIER_DIR, exist_ok=True)
+    path = classifier_path(task)
+    with open(path, 'wb') as f:
+        pickle.dump(model, f)
+    _classifiers.pop(path, None)
+    print(f"Classifier saved to {path}.")
+    return model
+
+def load_classifier(task):
+    """A task's trained classifier, or None if it has not been trained."""
+    path = classifier_path(task)
+    if path not in _classifiers:
+        _classifiers[path] = None
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                _classifiers[path] = pickle.load(f)
+        else:
+            print(f"{task.name}: no local classifier at {path}; every email goes to the LLM.")
+    return _classifiers[path]
+
+def classify(model, texts, threshold):
+    """(label, confidence) per text; label is None where the confidence is below threshold."""
+    if not texts:
+        return []
+    results = []
+    for probabilities in model.predict_proba(texts):
+        best = probabilities.argmax()
+        label = model.classes_[best] if probabilities[best] >= threshold else None
+        results.append((label, float(probabilities[best])))
+    return results
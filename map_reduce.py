@@ -0,0 +1,102 @@
+from llm_tokens import count_tokens, encode_batch, get_encoding
+
+# Map-reduce for emails over a task's token limit. Instead of cutting such an email off
+# (often right before the deadline or link that matters), it is split into parts that each
+# fit the limit, cut at the coarsest boundary that allows it: paragraphs, then lines, then
+# sentences, then words, and only as a last resort in the middle of a word. Every part is
+# sent as its own request alongside the other emails' requests, so a long email takes
+# about as long as one part. The parts' answers are then merged field by field with
+# deterministic rules that depend only on the answers and their order:
+#   first_value: the first answer that differs from the default (text fields)
+#   union: every list item once, in order of appearance (list fields)
+#   ranked(labels): the highest-ranked label any part gave (e.g. importance)
+#   join_distinct: the distinct non-default answers, joined (e.g. actions to take)
+SEPARATORS = ('\n\n', '\n', '. ', ' ')
+MAX_PARTS = 20  # parts sent per email; anything after them is dropped
+
+def cut_tokens(text, max_tokens, encoding=None):
+    """text cut into pieces of max_tokens tokens, regardless of word boundaries."""
+    tokens = encode_batch([text], encoding)[0]
+    decode = get_encoding(encoding).decode
+    return [decode(tokens[start:start + max_tokens]) for start in range(0, len(tokens), max_tokens)]
+
+def split_text(text, max_tokens, encoding=None, separators=SEPARATORS):
+    """
+    Split text into parts of at most max_tokens tokens (as counted piece by piece), at the
+    coarsest of separators that keeps every part under the limit.
+    """
+    if not separators:
+        return cut_tokens(text, max_tokens, encoding)
+    separator = separators[0]
+    pieces = text.split(separator)
+    pieces = [piece + separator for piece in pieces[:-1]] + pieces[-1:]
+    parts = []
+    current, current_tokens = '', 0
+    for piece, tokens in zip(pieces, count_tokens(pieces, encoding)):
+        if tokens > max_tokens:
+            if current:
+                parts.append(current)
+            parts.extend(split_text(piece, max_tokens, encoding, separators[1:]))
+            current, current_tokens = '', 0
+            continue
+        if current and current_tokens + tokens > max_tokens:
+            parts.append(current)
+            current, current_tokens = '', 0
+        current += piece
+        current_tokens += tokens
+    if current:
+        parts.append(current)
+    return [part for part in parts if part.strip()]
+
+def split_email(body, max_tokens, encoding=None):
+    """The parts an email over max_tokens is sent in, each marked with its position."""
+    parts = split_text(body, max_tokens, encoding)
+    if len(parts) > MAX_PARTS:
+        print(f"Email split into {len(parts)} parts; only the first {MAX_PARTS} are sent.")
+        parts = parts[:MAX_PARTS]
+    return [f"(Part {number} of {len(parts)} of a long email)\n{part}" for number, part in enumerate(parts, start=1)]
+
+def first_value(values, default):
+    return next((value for value in values if value not in (default, '', None)), default)
+
+def union(values, default):
+    items = []
+    for value in values:
+        for item in value if isinstance(value, list) else [value]:
+            if item not in (None, '') and item not in items:
+                items.append(item)
+    return items or default
+
+def ranked(*labels):
+    """A rule keeping the label ranked highest (first in labels) among the answers."""
+    def rule(values, default):
+        found = [labels.index(value) for value in values if value in labels]
+        return labels[min(found)] if found else first_value(values, default)
+
+    return rule
+
+def join_distinct(separator='; '):
+    """A rule joining the distinct non-default answers, in order of appearance."""
+    def rule(values, default):
+        distinct = []
+        for value in values:
+            if value not in (default, '', None) and value not in distinct:
+                distinct.append(value)
+        return separator.join(str(value) for value in distinct) if distinct else default
+
+    return rule
+
+def merge_answers(fields, rules, answers):
+    """
+    Merge the parsed answers to the parts of an email into one answer. fields are the task's
+    [(JSON key, default)], rules {JSON key: rule(values, default)} for the fields that do not
+    use the default rule (union for lists, first_value otherwise).
+    """
+    merged = {}
+    for key, default in fields:
+        values = [answer[key] for answer in answers if key in answer]
+        if not values:
+            continue
+        rule = rules.get(key) or (union if isinstance(default, list) else first_value)
+        merged[key] = rule(values, default)
+    return merged
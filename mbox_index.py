@@ -0,0 +1,226 @@
+import hashlib
+import mmap
+import os
+import re
+import struct
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+
+# Sidecar index written by mbox_to_csv next to each converted table (Past_email_mbox/Sent.idx).
+# A fixed-size header naming the source mbox (and so the label, see email_store.table_label)
+# is followed by one fixed-size record per table row, in row order, so record i describes
+# row i and can be read from a memory map in O(1). Records are little-endian:
+#   offset     Q  byte offset of the message's "From " line in the mbox
+#   length     Q  length of the raw message following that line (0 if it is gone)
+#   date       q  Date header as a Unix timestamp (0 if missing or unparsable)
+#   thread_id  Q  Gmail X-GM-THRID, or a hash of the thread's root Message-ID
+#   id_hash    Q  hash of the Message-ID, see message_id_hash
+#   parent     Q  hash of the Message-ID it replies to (In-Reply-To, else the last References entry)
+INDEX_MAGIC = b'MBOXIDX2'
+INDEX_HEADER_SIZE = 256
+INDEX_EXTENSION = '.idx'
+RECORD = struct.Struct('<QQqQQQ')
+
+# Message-ID lookups binary-search a second sidecar (Past_email_mbox/Sent.ids): the
+# (id_hash, row) pairs of the index sorted by hash, behind a header holding the size and
+# mtime of the index they were built from. Conversions keep appending to the index alone;
+# the first lookup after one finds the stamp out of date and rebuilds the table.
+ID_TABLE_MAGIC = b'MBOXIDS1'
+ID_TABLE_HEADER = struct.Struct('<8sQQ')
+ID_TABLE_EXTENSION = '.ids'
+ID_ENTRY = struct.Struct('<QQ')
+
+IndexRecord = namedtuple('IndexRecord', ['offset', 'length', 'date', 'thread_id', 'id_hash', 'parent'])
+MISSING_RECORD = IndexRecord(0, 0, 0, 0, 0, 0)
+
+_MESSAGE_ID = re.compile(r'<[^<>\s]+>')
+
+def index_path_for(table_path):
+    """The sidecar index path of a converted CSV file or Parquet dataset."""
+    return os.path.splitext(os.path.normpath(table_path))[0] + INDEX_EXTENSION
+
+def id_table_path_for(index_path):
+    return os.path.splitext(index_path)[0] + ID_TABLE_EXTENSION
+
+def hash64(value):
+    return int.from_bytes(hashlib.sha1(value.encode('utf-8', errors='replace')).digest()[:8], 'little')
+
+def message_id_hash(message_id):
+    """64-bit hash of a Message-ID as stored in the index (0 for messages without one)."""
+    message_id = str(message_id).strip() if message_id else ''
+    return hash64(message_id) if message_id else 0
+
+def thread_id(message):
+    """Gmail's thread id when the export has one, otherwise a hash of the thread's root Message-ID."""
+    gmail_thread_id = message['x-gm-thrid']
+    if gmail_thread_id and str(gmail_thread_id).strip().isdigit():
+        return int(str(gmail_thread_id).strip()) & 0xFFFFFFFFFFFFFFFF
+    references = str(message['references'] or '').split()
+    root = references[0] if references else str(message['in-reply-to'] or message['message-id'] or '').strip()
+    return hash64(root) if root else 0
+
+def parent_id_hash(message):
+    """Hash of the Message-ID a message replies to (0 for messages that start a thread)."""
+    in_reply_to = _MESSAGE_ID.findall(str(message['in-reply-to'] or ''))
+    if in_reply_to:
+        return message_id_hash(in_reply_to[0])
+    references = _MESSAGE_ID.findall(str(message['references'] or ''))
+    return message_id_hash(references[-1]) if references else 0
+
+def message_record(offset, raw_message, message):
+    """Build the index record of a message; message may be a headers-only parse."""
+    try:
+        date = int(parsedate_to_datetime(str(message['date'])).timestamp())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        date = 0
+    return IndexRecord(offset, len(raw_message), date, thread_id(message), message_id_hash(message['message-id']),
+                       parent_id_hash(message))
+
+def open_index_for_append(index_path, mbox_file_path, records=0):
+    """
+    Open an index for appending records.
+    With records=0 the index is recreated; otherwise it is cut back to its first
+    records entries, matching a CSV truncated to the last checkpoint.
+    """
+    if records == 0:
+        with open(index_path, 'wb') as file:
+            name = os.path.basename(mbox_file_path).encode('utf-8')[:INDEX_HEADER_SIZE - len(INDEX_MAGIC)]
+            file.write((INDEX_MAGIC + name).ljust(INDEX_HEADER_SIZE, b'\0'))
+    else:
+        with open(index_path, 'r+b') as file:
+            file.truncate(INDEX_HEADER_SIZE + records * RECORD.size)
+    return open(index_path, 'ab')
+
+def index_record_count(index_path):
+    """Number of complete records in an index file (0 if it does not exist or has an older format)."""
+    if not os.path.exists(index_path):
+        return 0
+    with open(index_path, 'rb') as file:
+        if file.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+            return 0
+    return max(0, os.path.getsize(index_path) - INDEX_HEADER_SIZE) // RECORD.size
+
+def write_index(index_path, mbox_file_path, records):
+    """Write a complete index from an iterable of records."""
+    with open_index_for_append(index_path, mbox_file_path) as file:
+        for record in records:
+            file.write(RECORD.pack(*record))
+
+def overwrite_records(index_path, records):
+    """Replace records in place, given {row: record}."""
+    with open(index_path, 'r+b') as file:
+        for row, record in records.items():
+            file.seek(INDEX_HEADER_SIZE + row * RECORD.size)
+            file.write(RECORD.pack(*record))
+
+def load_index(index_path):
+    """
+    Memory-map an index for reading.
+    Returns (mbox filename, mapping); records are read from the mapping with read_record.
+    """
+    with open(index_path, 'rb') as file:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapping[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+        mapping.close()
+        raise ValueError(f"{index_path} is not an mbox index")
+    mbox_filename = mapping[len(INDEX_MAGIC):INDEX_HEADER_SIZE].rstrip(b'\0').decode('utf-8')
+    return mbox_filename, mapping
+
+def record_count(mapping):
+    return (len(mapping) - INDEX_HEADER_SIZE) // RECORD.size
+
+def read_record(mapping, row):
+    """The record of a table row, in O(1)."""
+    if not 0 <= row < record_count(mapping):
+        raise IndexError(f"row {row} is not in the index")
+    return IndexRecord(*RECORD.unpack_from(mapping, INDEX_HEADER_SIZE + row * RECORD.size))
+
+def iter_records(mapping):
+    """Yield every record of a memory-mapped index in row order."""
+    for row in range(record_count(mapping)):
+        yield read_record(mapping, row)
+
+def index_stamp(index_path):
+    stat = os.stat(index_path)
+    return stat.st_size, stat.st_mtime_ns
+
+def write_id_table(index_path):
+    """Build the sorted (id_hash, row) table of an index; messages without a Message-ID are left out."""
+    size, mtime_ns = index_stamp(index_path)
+    mbox_filename, mapping = load_index(index_path)
+    try:
+        entries = sorted((record.id_hash, row) for row, record in enumerate(iter_records(mapping)) if record.id_hash)
+    finally:
+        mapping.close()
+    id_table_path = id_table_path_for(index_path)
+    with open(id_table_path + '.tmp', 'wb') as file:
+        file.write(ID_TABLE_HEADER.pack(ID_TABLE_MAGIC, size, mtime_ns))
+        for entry in entries:
+            file.write(ID_ENTRY.pack(*entry))
+    os.replace(id_table_path + '.tmp', id_table_path)
+
+def load_id_table(index_path):
+    """Memory-map the sorted id table of an index, rebuilding it first if the index changed since."""
+    id_table_path = id_table_path_for(index_path)
+    stamp = (ID_TABLE_MAGIC,) + index_stamp(index_path)
+    if not os.path.exists(id_table_path) or os.path.getsize(id_table_path) < ID_TABLE_HEADER.size:
+        write_id_table(index_path)
+    else:
+        with open(id_table_path, 'rb') as file:
+            if ID_TABLE_HEADER.unpack(file.read(ID_TABLE_HEADER.size)) != stamp:
+                write_id_table(index_path)
+    with open(id_table_path, 'rb') as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+def find_rows(index_path, message_id):
+    """Rows whose Message-ID hash matches, in row order, by binary search of the id table in O(log n)."""
+    wanted = message_id_hash(message_id)
+    if not wanted:
+        return []
+    mapping = load_id_table(index_path)
+    try:
+        count = (len(mapping) - ID_TABLE_HEADER.size) // ID_ENTRY.size
+
+        def entry(position):
+            return ID_ENTRY.unpack_from(mapping, ID_TABLE_HEADER.size + position * ID_ENTRY.size)
+
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if entry(middle)[0] < wanted:
+                low = middle + 1
+            else:
+                high = middle
+        rows = []
+        while low < count and entry(low)[0] == wanted:
+            rows.append(entry(low)[1])
+            low += 1
+        return rows
+    finally:
+        mapping.close()
+
+def read_raw_message(mbox_file_path, record):
+    """Read one raw message straight from the mbox without scanning it."""
+    if not record.length:
+        return None
+    with open(mbox_file_path, 'rb') as mbox_file:
+        mbox_file.seek(record.offset)
+        mbox_file.readline()  # the "From " separator line
+        return mbox_file.read(record.length)
+
+def load_raw_message(index_path, mbox_dir, row=None, message_id=None):
+    """
+    Load the raw bytes of one message by table row or Message-ID, using the sidecar
+    index of its table and the source mbox in mbox_dir.
+    """
+    if row is None:
+        rows = find_rows(index_path, message_id)
+        if not rows:
+            return None
+        row = rows[0]
+    mbox_filename, mapping = load_index(index_path)
+    try:
+        record = read_record(mapping, row)
+    finally:
+        mapping.close()
+    return read_raw_message(os.path.join(mbox_dir, mbox_filename), record)
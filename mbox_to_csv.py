@@ -1,11 +1,201 @@
-import mailbox
 import csv
+import hashlib
+import json
 import os
-from email import policy
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from email.parser import BytesParser
+from email_store import (
+    DEDUP_INDEX_FILENAME, PARQUET_EXTENSION, parquet_part_path, row_key, table_label, write_dedup_index,
+    write_parquet_part
+)
+from html_to_text import html_part_to_text
+from mbox_index import (
+    MISSING_RECORD, RECORD, index_path_for, index_record_count, message_record, open_index_for_append,
+    overwrite_records, write_index
+)
+
+CSV_HEADER = ['Subject', 'From', 'Date', 'To', 'Message-ID', 'Body']
+
+# Files smaller than this are converted as a single shard
+MIN_SHARD_BYTES = 64 * 1024 * 1024
+
+# Checkpoint manifest kept next to the CSV files for incremental conversion. It holds a few
+# numbers per mbox; the key of every row is appended to a sidecar next to the CSV instead
+# (Past_email_mbox/Sent.keys), so a checkpoint costs the same however many rows there are.
+MANIFEST_FILENAME = '.mbox_manifest.json'
+KEYS_EXTENSION = '.keys'
+CHECKPOINT_EVERY = 1000  # messages written between manifest checkpoints
+FINGERPRINT_BYTES = 64 * 1024
+
+# When a message appears under several labels, the cleaning stage of the first label here
+# processes it (see email_store.write_dedup_index); other labels rank after, alphabetically
+LABEL_PRIORITY = [
+    'Action Needed', 'Assessment', 'Interview', 'Sent', 'Important', 'Category Updates',
+    'Category Social', 'Category Promotions', 'Archived'
+]
+
+def iter_mbox_messages(mbox_file_path, start=0, end=None):
+    """
+    Stream the raw bytes of each message in an mbox file.
+    Message boundaries are the "From " separator lines, found while reading the file
+    line by line, so only the current message is ever held in memory.
+    If start/end are given, only messages whose "From " line lies in [start, end) are read;
+    start must be a message boundary (see find_shard_boundaries).
+    Yields (offset, raw_message) where offset is the byte position of the "From " line.
+    """
+    with open(mbox_file_path, 'rb', buffering=1024 * 1024) as mbox_file:
+        mbox_file.seek(start)
+        position = start
+        offset = None
+        lines = []
+        for line in mbox_file:
+            if line.startswith(b'From '):
+                if end is not None and position >= end:
+                    break
+                if offset is not None:
+                    yield offset, _join_message_lines(lines)
+                offset = position
+                lines = []
+            elif offset is not None:
+                lines.append(line)
+            position += len(line)
+        if offset is not None:
+            yield offset, _join_message_lines(lines)
+
+def _join_message_lines(lines):
+    # Drop the blank line that separates a message from the next "From " line
+    if lines and lines[-1] in (b'\n', b'\r\n'):
+        lines = lines[:-1]
+    return b''.join(lines)
+
+def find_shard_boundaries(mbox_file_path, shard_count, start=0, end=None):
+    """
+    Split the [start, end) range of an mbox file (the whole file by default) into at most
+    shard_count byte ranges aligned to message boundaries.
+    Returns a list of (start, end) offsets covering the range in order.
+    """
+    if end is None:
+        end = os.path.getsize(mbox_file_path)
+    boundaries = [start]
+    with open(mbox_file_path, 'rb') as mbox_file:
+        for index in range(1, shard_count):
+            target = max(start + (end - start) * index // shard_count, boundaries[-1] + 1)
+            if target >= end:
+                break
+            # Finish the line containing target - 1 so reading resumes at a line start
+            mbox_file.seek(target - 1)
+            mbox_file.readline()
+            position = mbox_file.tell()
+            for line in mbox_file:
+                if position >= end:
+                    break
+                if line.startswith(b'From '):
+                    boundaries.append(position)
+                    break
+                position += len(line)
+            if boundaries[-1] != position:
+                break
+    boundaries.append(end)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+def parse_message(raw_message):
+    """Parse raw message bytes the same way mailbox.mbox does."""
+    return BytesParser().parsebytes(raw_message)
+
+_HEADER_END = re.compile(rb'\n\r?\n')
+
+def split_headers(data):
+    """Split raw message or MIME part bytes into (header block, body) at the first blank line."""
+    if data.startswith((b'\n', b'\r\n')):
+        return b'', data[data.index(b'\n') + 1:]
+    match = _HEADER_END.search(data)
+    if match is None:
+        return data, b''
+    return data[:match.start() + 1], data[match.end():]
+
+def parse_headers(raw_message):
+    """
+    Headers-only fast path: parse just the header block of a raw message.
+    The returned message answers header lookups (Subject, From, Date, To, Message-ID, ...)
+    exactly like a full parse, but the body is never read.
+    """
+    return BytesParser().parsebytes(split_headers(raw_message)[0], headersonly=True)
+
+def _iter_leaf_parts(headers, body):
+    """
+    Yield (content type, raw part bytes) for the leaf parts of a multipart body, in the
+    order message.walk() visits them, reading only the headers of each part.
+    Raises ValueError for structures this shortcut does not handle (digests, attached
+    messages, missing boundaries); the caller then parses the whole message instead.
+    """
+    boundary = headers.get_boundary()
+    if not boundary or headers.get_content_subtype() == 'digest':
+        raise ValueError("unsupported multipart structure")
+    delimiter = re.compile(rb'^--' + re.escape(boundary.encode('ascii', 'surrogateescape')) +
+                           rb'(--)?[ \t]*(?:\r\n|\r|\n|$)', re.M)
+    start = None
+    for match in delimiter.finditer(body):
+        if start is not None:
+            # The line break before a delimiter belongs to the delimiter
+            end = match.start()
+            end -= 2 if body[end - 2:end] == b'\r\n' else 1 if body[end - 1:end] in (b'\n', b'\r') else 0
+            part = body[start:max(start, end)]
+            part_header_bytes, part_body = split_headers(part)
+            part_headers = BytesParser().parsebytes(part_header_bytes, headersonly=True)
+            if part_headers.defects or part_headers.get_content_maintype() == 'message':
+                raise ValueError("unsupported part")
+            if part_headers.get_content_maintype() == 'multipart':
+                yield from _iter_leaf_parts(part_headers, part_body)
+            else:
+                yield part_headers.get_content_type(), part
+        if match.group(1):
+            return
+        start = match.end()
+    raise ValueError("missing closing boundary")
+
+def parse_message_lazily(raw_message):
+    """
+    Parse a message for conversion without building its full MIME tree.
+    Returns (headers, body) where headers is a headers-only message (see parse_headers)
+    and body holds the same bytes get_body extracts from the full parse. Parts are scanned in
+    order until the first usable body is found; attachments are skipped by their
+    headers, so their payloads are never parsed or decoded. Falls back to the full
+    parse for single-part messages and unusual multipart structures.
+    """
+    header_bytes, body = split_headers(raw_message)
+    headers = BytesParser().parsebytes(header_bytes, headersonly=True)
+    if not headers.defects and headers.get_content_maintype() == 'multipart':
+        try:
+            html_part = None
+            for content_type, part in _iter_leaf_parts(headers, body):
+                if content_type == 'text/plain':
+                    return headers, parse_message(part).get_payload(decode=True)
+                if content_type == 'text/html' and html_part is None:
+                    html_part = part
+            if html_part is not None:
+                return headers, html_part_to_text(parse_message(html_part)).encode('utf-8')
+            return headers, b''
+        except ValueError:
+            pass
+    message = parse_message(raw_message)
+    return message, get_body(message)
+
+def iter_mbox_headers(mbox_file_path, start=0, end=None):
+    """Yield (offset, headers) for each message of an mbox file, parsing only the headers."""
+    for offset, raw_message in iter_mbox_messages(mbox_file_path, start, end):
+        yield offset, parse_headers(raw_message)
 
 def get_body(message):
+    """
+    Return the first text/plain part of a message as bytes.
+    HTML-only messages fall back to their first text/html part, converted to plain text
+    so that markup never reaches the cleaning stages.
+    """
     if message.is_multipart():
+        html_part = None
         for part in message.walk():
             if part.is_multipart():
                 for subpart in part.walk():
@@ -13,44 +203,406 @@ def get_body(message):
                         return subpart.get_payload(decode=True)
             elif part.get_content_type() == 'text/plain':
                 return part.get_payload(decode=True)
+            elif part.get_content_type() == 'text/html' and html_part is None:
+                html_part = part
+        if html_part is not None:
+            return html_part_to_text(html_part).encode('utf-8')
+    elif message.get_content_type() == 'text/html':
+        return html_part_to_text(message).encode('utf-8')
     else:
         return message.get_payload(decode=True)
 
-def mbox_to_csv(mbox_file_path, csv_file_path):
-    mbox = mailbox.mbox(mbox_file_path)
+def message_to_row(message, body=None):
+    """
+    Convert a parsed message into a CSV row matching CSV_HEADER.
+    body is the result of get_body when the caller already has it (see parse_message_lazily).
+    """
+    if body is None:
+        body = get_body(message)  # Get the message body using the new get_body function
+    if body:
+        body = body.decode('utf-8', errors='replace').replace('\n', ' ').replace('\r', '')
+    else:
+        body = ''
+    return [
+        message['subject'],
+        message['from'],
+        message['date'],
+        message['to'],
+        message['message-id'],
+        body
+    ]
+
+def convert_message(offset, raw_message, skip_keys=None):
+    """
+    Parse one raw message into (key, row, index record), where key is email_store.row_key
+    of the row. row is None when the key is in skip_keys; for messages with a Message-ID
+    that check only parses the headers.
+    """
+    if skip_keys:
+        headers = parse_headers(raw_message)
+        if headers['message-id'] and row_key(headers['message-id'], '') in skip_keys:
+            return row_key(headers['message-id'], ''), None, message_record(offset, raw_message, headers)
+    message, body = parse_message_lazily(raw_message)
+    row = message_to_row(message, body)
+    key = row_key(row[4], row[5])
+    record = message_record(offset, raw_message, message)
+    if skip_keys and key in skip_keys:
+        return key, None, record
+    return key, row, record
+
+def load_manifest(manifest_path):
+    """Load the checkpoint manifest, keyed by mbox filename."""
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, encoding='utf-8') as file:
+        return json.load(file)
+
+def save_manifest(manifest, manifest_path):
+    """Write the manifest atomically so an interrupted run never leaves it half written."""
+    temp_path = f'{manifest_path}.tmp'
+    with open(temp_path, mode='w', encoding='utf-8') as file:
+        json.dump(manifest, file)
+    os.replace(temp_path, manifest_path)
+
+def mbox_fingerprint(mbox_file_path, offset):
+    """
+    Hash the start of the mbox and the bytes just before offset.
+    A matching fingerprint means the file was only appended to since offset was recorded.
+    """
+    digest = hashlib.sha1()
+    with open(mbox_file_path, 'rb') as mbox_file:
+        digest.update(mbox_file.read(FINGERPRINT_BYTES))
+        mbox_file.seek(max(0, offset - 4096))
+        digest.update(mbox_file.read(offset - mbox_file.tell()))
+    return digest.hexdigest()
+
+def keys_path_for(csv_file_path):
+    """The sidecar holding the key (see email_store.row_key) of each CSV row, one JSON string per line."""
+    return os.path.splitext(os.path.normpath(csv_file_path))[0] + KEYS_EXTENSION
+
+def read_keys(keys_path, rows):
+    """The keys of the first rows rows, or None if the sidecar has fewer."""
+    if not os.path.exists(keys_path):
+        return None
+    with open(keys_path, encoding='utf-8') as file:
+        keys = [json.loads(line) for line in islice(file, rows)]
+    return keys if len(keys) == rows else None
+
+def open_keys_for_append(keys_path, rows=0):
+    """
+    Open the keys sidecar for appending, cut back to its first rows lines (so it matches a
+    CSV truncated to the last checkpoint, like open_index_for_append).
+    """
+    with open(keys_path, 'a+b') as file:
+        file.seek(0)
+        for _ in range(rows):
+            file.readline()
+        file.truncate(file.tell())
+    return open(keys_path, mode='a', encoding='utf-8')
+
+def resume_point(entry, mbox_file_path, csv_file_path):
+    """
+    Work out where an incremental conversion should continue from, given the manifest entry.
+    Returns (start, csv_size, rescan_rows, keys): csv_size is None when the CSV has to be
+    rewritten from scratch, and keys are the keys of the rows kept. When the mbox was
+    re-exported it has to be rescanned from the beginning, and rescan_rows is the number of
+    existing rows whose messages must be skipped (and whose index records must be
+    re-pointed at the new file); it stays set in the manifest until the rescan completes,
+    so an interrupted rescan resumes as one.
+    """
+    if not entry or 'rows' not in entry or not os.path.exists(csv_file_path) \
+            or os.path.getsize(csv_file_path) < entry['csv_size'] \
+            or index_record_count(index_path_for(csv_file_path)) < entry['rows']:
+        return 0, None, 0, []
+    keys = read_keys(keys_path_for(csv_file_path), entry['rows'])
+    if keys is None:
+        return 0, None, 0, []
+    if entry['offset'] <= os.path.getsize(mbox_file_path) and \
+            mbox_fingerprint(mbox_file_path, entry['offset']) == entry['fingerprint']:
+        return entry['offset'], entry['csv_size'], entry.get('rescan_rows', 0), keys
+    return 0, entry['csv_size'], entry['rows'], keys
+
+def open_csv_output(csv_file_path, csv_size=None):
+    """
+    Open a CSV file for writing rows.
+    With csv_size None the file is rewritten with a header; otherwise anything written after
+    the last checkpoint is cut off and new rows are appended.
+    """
+    if csv_size is None:
+        file = open(csv_file_path, mode='w', newline='', encoding='utf-8')
+        csv.writer(file).writerow(CSV_HEADER)
+        return file
+    with open(csv_file_path, 'r+b') as file:
+        file.truncate(csv_size)
+    return open(csv_file_path, mode='a', newline='', encoding='utf-8')
 
-    with open(csv_file_path, mode='w', newline='', encoding='utf-8') as file:
+def save_checkpoint(manifest, manifest_path, mbox_file_path, files, offset, rows, rescan_rows=0):
+    """
+    Record that every message before offset has been written, as rows rows, to files: the
+    (CSV, index, keys) files being written.
+    """
+    for file in files:
+        file.flush()
+        os.fsync(file.fileno())
+    manifest[os.path.basename(mbox_file_path)] = {
+        'offset': offset,
+        'fingerprint': mbox_fingerprint(mbox_file_path, offset),
+        'csv_size': os.fstat(files[0].fileno()).st_size,
+        'rows': rows,
+        'rescan_rows': rescan_rows
+    }
+    save_manifest(manifest, manifest_path)
+
+def start_rescan(index_path, rescan_rows):
+    """Mark the index records of existing rows as missing until the rescan finds their messages."""
+    overwrite_records(index_path, {row: MISSING_RECORD for row in range(rescan_rows)})
+
+def repoint_rescanned_rows(index_path, message_ids, rescan_rows, rescanned):
+    """Point existing rows at the records of their messages found during a rescan."""
+    overwrite_records(index_path, {
+        row: rescanned[key] for row, key in enumerate(message_ids[:rescan_rows]) if key in rescanned
+    })
+    rescanned.clear()
+
+def mbox_to_csv(mbox_file_path, csv_file_path, manifest_path=None, checkpoint_every=CHECKPOINT_EVERY):
+    """
+    Convert an mbox file into a CSV file.
+    With a manifest_path the conversion is incremental: only messages added since the last
+    run are appended, and the manifest is checkpointed every checkpoint_every messages so an
+    interrupted run picks up where it stopped.
+    A sidecar index (see mbox_index) with one record per CSV row is written alongside.
+    Returns the number of rows written and the keys of every message in the CSV, in order.
+    """
+    manifest = load_manifest(manifest_path) if manifest_path else {}
+    entry = manifest.get(os.path.basename(mbox_file_path))
+    start, csv_size, rescan_rows, message_ids = resume_point(entry, mbox_file_path, csv_file_path)
+    skip_keys = set(message_ids[:rescan_rows]) if rescan_rows else None
+    index_path = index_path_for(csv_file_path)
+    end = os.path.getsize(mbox_file_path)
+    written = last_checkpoint = 0
+    rescanned = {}
+
+    with open_csv_output(csv_file_path, csv_size) as file, \
+            open_index_for_append(index_path, mbox_file_path, len(message_ids)) as index_file, \
+            open_keys_for_append(keys_path_for(csv_file_path), len(message_ids)) as keys_file:
         writer = csv.writer(file)
-        writer.writerow(['Subject', 'From', 'Date', 'To', 'Message-ID', 'Body'])
+        if rescan_rows and start == 0:
+            start_rescan(index_path, rescan_rows)
 
-        for message in mbox:
-            body = get_body(message)  # Get the message body using the new get_body function
-            if body:
-                body = body.decode('utf-8', errors='replace').replace('\n', ' ').replace('\r', '')
-            else:
-                body = ''
-            writer.writerow([
-                message['subject'],
-                message['from'],
-                message['date'],
-                message['to'],
-                message['message-id'],
-                body
-            ])
-
-def convert_mboxes_to_csv(input_dir, output_dir):
+        # Messages are parsed and written one at a time, so memory stays flat
+        # regardless of the size of the mbox file
+        for offset, raw_message in iter_mbox_messages(mbox_file_path, start, end):
+            # Counted in rows written, so the messages a rescan skips never trigger one
+            if manifest_path and written - last_checkpoint >= checkpoint_every:
+                repoint_rescanned_rows(index_path, message_ids, rescan_rows, rescanned)
+                save_checkpoint(manifest, manifest_path, mbox_file_path, (file, index_file, keys_file), offset,
+                                len(message_ids), rescan_rows)
+                last_checkpoint = written
+            key, row, record = convert_message(offset, raw_message, skip_keys)
+            if row is None:
+                rescanned[key] = record
+                continue
+            writer.writerow(row)
+            index_file.write(RECORD.pack(*record))
+            keys_file.write(json.dumps(key) + '\n')
+            message_ids.append(key)
+            written += 1
+
+        index_file.flush()
+        repoint_rescanned_rows(index_path, message_ids, rescan_rows, rescanned)
+        if manifest_path:
+            save_checkpoint(manifest, manifest_path, mbox_file_path, (file, index_file, keys_file), end,
+                            len(message_ids))
+    return written, message_ids
+
+def reset_parquet_dataset(parquet_dir_path):
+    """Remove any previous output and create an empty Parquet dataset directory."""
+    if os.path.isdir(parquet_dir_path):
+        shutil.rmtree(parquet_dir_path)
+    os.makedirs(parquet_dir_path)
+
+def iter_converted_rows(mbox_file_path, keys, records, start=0, end=None):
+    """Yield a row for every message in the byte range, appending its key and index record."""
+    for offset, raw_message in iter_mbox_messages(mbox_file_path, start, end):
+        key, row, record = convert_message(offset, raw_message)
+        keys.append(key)
+        records.append(record)
+        yield row
+
+def mbox_to_parquet(mbox_file_path, parquet_dir_path):
+    """
+    Convert an mbox file into a Parquet dataset with the same columns as the CSV output.
+    Bodies live in their own zstd-compressed column, so header-only loaders skip them.
+    The dataset is rewritten on every run; incremental conversion applies to CSV output only.
+    Returns the keys of every message written, in order.
+    """
+    reset_parquet_dataset(parquet_dir_path)
+    keys, records = [], []
+    rows = iter_converted_rows(mbox_file_path, keys, records)
+    write_parquet_part(rows, parquet_part_path(parquet_dir_path, 0), CSV_HEADER)
+    write_index(index_path_for(parquet_dir_path), mbox_file_path, records)
+    return keys
+
+def convert_shard_to_parquet(mbox_file_path, start, end, part_file_path):
+    """
+    Convert the messages in one byte range of an mbox file into a Parquet part file.
+    Runs inside a worker process and returns the written message keys and index records.
+    """
+    keys, records = [], []
+    write_parquet_part(iter_converted_rows(mbox_file_path, keys, records, start, end), part_file_path, CSV_HEADER)
+    return keys, records
+
+def convert_shard_to_csv(mbox_file_path, start, end, part_file_path, skip_keys=None):
+    """
+    Convert the messages in one byte range of an mbox file into a headerless CSV part file.
+    Runs inside a worker process and returns the part file path, the written message keys
+    and index records, and {key: record} for the messages skipped because of skip_keys.
+    """
+    keys, records, skipped = [], [], {}
+    with open(part_file_path, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        for offset, raw_message in iter_mbox_messages(mbox_file_path, start, end):
+            key, row, record = convert_message(offset, raw_message, skip_keys)
+            if row is None:
+                skipped[key] = record
+                continue
+            writer.writerow(row)
+            keys.append(key)
+            records.append(record)
+    return part_file_path, keys, records, skipped
+
+def merge_csv_parts(part_file_paths, file):
+    """Append CSV part files to an open CSV file in the given order."""
+    for part_file_path in part_file_paths:
+        with open(part_file_path, newline='', encoding='utf-8') as part_file:
+            shutil.copyfileobj(part_file, file, 1024 * 1024)
+        os.remove(part_file_path)
+
+def convert_mboxes_to_parquet(mbox_filenames, input_dir, output_dir, workers=None, min_shard_bytes=MIN_SHARD_BYTES):
+    """
+    Convert mbox files into Parquet datasets; in parallel, each shard becomes one part file.
+    Returns {label: message keys} for the dedup index.
+    """
+    label_keys = {}
+    if not workers or workers <= 1:
+        for filename in mbox_filenames:
+            mbox_file_path = os.path.join(input_dir, filename)
+            parquet_dir_path = os.path.join(output_dir, filename.replace('.mbox', PARQUET_EXTENSION))
+            keys = label_keys[table_label(filename)] = mbox_to_parquet(mbox_file_path, parquet_dir_path)
+            print(f'Converted {mbox_file_path} to {parquet_dir_path} ({len(keys)} messages)')
+        return label_keys
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        jobs = []
+        for filename in mbox_filenames:
+            mbox_file_path = os.path.join(input_dir, filename)
+            parquet_dir_path = os.path.join(output_dir, filename.replace('.mbox', PARQUET_EXTENSION))
+            reset_parquet_dataset(parquet_dir_path)
+
+            shard_count = max(1, min(workers, os.path.getsize(mbox_file_path) // min_shard_bytes))
+            futures = [
+                executor.submit(convert_shard_to_parquet, mbox_file_path, start, end,
+                                parquet_part_path(parquet_dir_path, index))
+                for index, (start, end) in enumerate(find_shard_boundaries(mbox_file_path, shard_count))
+            ]
+            jobs.append((filename, mbox_file_path, parquet_dir_path, futures))
+
+        for filename, mbox_file_path, parquet_dir_path, futures in jobs:
+            results = [future.result() for future in futures]
+            keys = [key for shard_keys, records in results for key in shard_keys]
+            write_index(index_path_for(parquet_dir_path), mbox_file_path,
+                        (record for shard_keys, records in results for record in records))
+            label_keys[table_label(filename)] = keys
+            print(f'Converted {mbox_file_path} to {parquet_dir_path} ({len(keys)} messages, {len(futures)} shards)')
+    return label_keys
+
+def convert_mboxes_to_csv(input_dir, output_dir, workers=None, min_shard_bytes=MIN_SHARD_BYTES, incremental=True,
+                          output_format='csv', dedupe=True, label_priority=LABEL_PRIORITY):
+    """
+    Convert every .mbox file in input_dir into a .csv file in output_dir.
+    With output_format='parquet', each mbox becomes a Parquet dataset directory instead
+    (see email_store); those are always rebuilt in full.
+    With workers > 1, large mbox files are split into byte ranges aligned to message
+    boundaries and all shards are converted in parallel in a process pool; each file's
+    shards are then merged back in their original order.
+    With incremental=True, a manifest in output_dir records how far each mbox has been
+    converted, so re-running only appends messages that are new since the last run.
+    With dedupe=True, a global dedup index is written to output_dir from the message keys
+    collected during conversion; email_store.iter_unique_rows uses it so that a message
+    exported under several labels reaches the cleaning stages only once.
+    """
     # Get all .mbox files from the input directory
-    for filename in os.listdir(input_dir):
-        if filename.endswith('.mbox'):
+    mbox_filenames = [filename for filename in sorted(os.listdir(input_dir)) if filename.endswith('.mbox')]
+    if output_format not in ('csv', 'parquet'):
+        raise ValueError(f"Unsupported output format: {output_format}")
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME) if incremental else None
+    label_keys = {}
+
+    if output_format == 'parquet':
+        label_keys = convert_mboxes_to_parquet(mbox_filenames, input_dir, output_dir, workers, min_shard_bytes)
+    elif not workers or workers <= 1:
+        for filename in mbox_filenames:
             mbox_file_path = os.path.join(input_dir, filename)
             csv_filename = filename.replace('.mbox', '.csv')  # Change the extension from .mbox to .csv
             csv_file_path = os.path.join(output_dir, csv_filename)
 
             # Call mbox_to_csv for each .mbox file
-            mbox_to_csv(mbox_file_path, csv_file_path)
-            print(f'Converted {mbox_file_path} to {csv_file_path}')
+            written, label_keys[table_label(filename)] = mbox_to_csv(mbox_file_path, csv_file_path, manifest_path)
+            print(f'Converted {mbox_file_path} to {csv_file_path} ({written} new messages)')
+    else:
+        manifest = load_manifest(manifest_path) if manifest_path else {}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            jobs = []
+            for filename in mbox_filenames:
+                mbox_file_path = os.path.join(input_dir, filename)
+                csv_file_path = os.path.join(output_dir, filename.replace('.mbox', '.csv'))
+                entry = manifest.get(filename) if manifest_path else None
+                start, csv_size, rescan_rows, message_ids = resume_point(entry, mbox_file_path, csv_file_path)
+                skip_keys = set(message_ids[:rescan_rows]) if rescan_rows else None
+                end = os.path.getsize(mbox_file_path)
+
+                shard_count = max(1, min(workers, (end - start) // min_shard_bytes))
+                futures = [
+                    executor.submit(convert_shard_to_csv, mbox_file_path, shard_start, shard_end,
+                                    f'{csv_file_path}.part{index}', skip_keys)
+                    for index, (shard_start, shard_end) in enumerate(
+                        find_shard_boundaries(mbox_file_path, shard_count, start, end))
+                ]
+                jobs.append((mbox_file_path, csv_file_path, csv_size, start, rescan_rows, end, message_ids, futures))
+
+            for mbox_file_path, csv_file_path, csv_size, start, rescan_rows, end, message_ids, futures in jobs:
+                results = [future.result() for future in futures]
+                index_path = index_path_for(csv_file_path)
+                with open_csv_output(csv_file_path, csv_size) as file, \
+                        open_index_for_append(index_path, mbox_file_path, len(message_ids)) as index_file, \
+                        open_keys_for_append(keys_path_for(csv_file_path), len(message_ids)) as keys_file:
+                    merge_csv_parts([part_file_path for part_file_path, keys, records, skipped in results], file)
+                    for part_file_path, keys, records, skipped in results:
+                        message_ids.extend(keys)
+                        index_file.writelines(RECORD.pack(*record) for record in records)
+                        keys_file.writelines(json.dumps(key) + '\n' for key in keys)
+                    index_file.flush()
+                    if rescan_rows:
+                        if start == 0:
+                            start_rescan(index_path, rescan_rows)
+                        rescanned = {}
+                        for part_file_path, keys, records, skipped in results:
+                            rescanned.update(skipped)
+                        repoint_rescanned_rows(index_path, message_ids, rescan_rows, rescanned)
+                    if manifest_path:
+                        save_checkpoint(manifest, manifest_path, mbox_file_path, (file, index_file, keys_file), end,
+                                        len(message_ids))
+                label_keys[table_label(mbox_file_path)] = message_ids
+                written = sum(len(keys) for part_file_path, keys, records, skipped in results)
+                print(f'Converted {mbox_file_path} to {csv_file_path} ({written} new messages, {len(futures)} shards)')
+
+    if dedupe:
+        index_path = os.path.join(output_dir, DEDUP_INDEX_FILENAME)
+        unique, duplicates = write_dedup_index(label_keys, index_path, label_priority)
+        print(f'Wrote {index_path}: {unique} unique messages, {duplicates} duplicate rows')
 
-# Usage
-input_dir = './Mbox_Files'  # Directory containing .mbox files
-output_dir = './Past_email_mbox'  # Directory where .csv files will be saved
-convert_mboxes_to_csv(input_dir, output_dir)
+if __name__ == "__main__":
+    # Usage
+    input_dir = './Mbox_Files'  # Directory containing .mbox files
+    output_dir = './Past_email_mbox'  # Directory where .csv files will be saved
+    convert_mboxes_to_csv(input_dir, output_dir, workers=os.cpu_count())
@@ -0,0 +1,737 @@
+import csv
+import json
+import os
+import time
+from collections import namedtuple
+from contextlib import ExitStack
+from itertools import islice
+
+from email_normalizer import DROP_QUOTES, LATEST_QUOTE, NORMALIZER_VERSION, normalize_email, restore_links
+from email_store import iter_unique_rows, row_key
+from email_threads import load_threads, reply_pair
+from llm_cache import DEFAULT_MODEL, cache_delete, cache_get, cache_put, chat_completion, text_hash
+from llm_executor import estimate_tokens, map_concurrently, setting
+from llm_json import extract_json
+from llm_metrics import name_stage
+from llm_tokens import count_tokens, encode_batch, encoding_for_model, get_encoding, truncate
+from local_classifier import classifier_text, classifier_threshold, classify, load_classifier, record_labels
+from map_reduce import merge_answers, split_email
+
+# One engine for every cleaning stage. Each extraction is declared as a Task; run_tasks
+# streams an input table once, prepares every row once (one batched tokenization per
+# chunk of rows when a task truncates) and fans it out to all the tasks given for that table.
+# Bodies are sent normalized (see email_normalizer): without quoted history, signatures,
+# footers and long URLs, whose targets are put back into the answers. The API calls
+# of all tasks then share the response cache, the concurrency and rate limits, and the
+# retry policy below, and each task writes its own output CSV in input order.
+
+# name: label used in progress messages
+# system_prompt: the prompt, already filled in (e.g. with the resume)
+# fields: [(JSON key, default)] read from the model's answer, in output order
+# output_columns: header of the output CSV; copy_columns come first, then fields
+# copy_columns: input columns copied into each output row
+# with_subject: send "Subject: ...\nBody: ..." instead of the body alone
+# max_tokens: truncate the user content to this many tokens (None: never truncate)
+# keep: predicate on the parsed answer deciding whether the row is written (None: always)
+# reply_field: for (original message, reply) tasks, the JSON key of the reply; pairs the
+#   thread structure already gives (see email_threads) skip the API call, and only the
+#   latest turn of the thread is sent otherwise (other tasks get the new text alone)
+# model: chat model to use
+# pack: classify several emails per request (see below), for tasks whose system prompt
+#   outweighs the emails they classify
+# classifier_field: the JSON key a local classifier trained from earlier runs may answer
+#   instead of the LLM when it is confident (see local_classifier)
+# classifier_labels: the labels the classifier may answer alone, those for which the other
+#   fields are irrelevant and keep their defaults; emails with any other label go to the LLM
+# merge: {JSON key: rule} for tasks with max_tokens; an email over the limit is then split
+#   into parts sent concurrently and their answers merged with these rules (fields without
+#   one use the default rules) instead of being truncated (see map_reduce)
+Task = namedtuple(
+    'Task',
+    ['name', 'system_prompt', 'fields', 'output_columns', 'copy_columns', 'with_subject', 'max_tokens', 'keep',
+     'reply_field', 'model', 'pack', 'classifier_field', 'merge', 'classifier_labels'],
+    defaults=((), False, None, None, None, DEFAULT_MODEL, False, None, None, ())
+)
+
+# API errors worth retrying (names in openai.error), with exponential backoff
+RETRY_ATTEMPTS = 5
+RETRY_BASE_DELAY = 2  # seconds, doubled after each failed attempt
+RETRYABLE_ERRORS = ('RateLimitError', 'APIError', 'Timeout', 'ServiceUnavailableError', 'APIConnectionError')
+
+# Packed requests send the system prompt once for up to PACK_MAX_EMAILS emails, as many as
+# fit in PACK_MAX_TOKENS (estimated at four characters per token), and ask for a JSON array
+# keyed by each email's id in the pack. A pack whose answer cannot be parsed is split in
+# half and sent again; emails missing from an answer are sent again on their own.
+PACK_MAX_EMAILS = 20
+PACK_MAX_TOKENS = 8000
+PACK_PROMPT = """
+    You are given several emails at once, each starting with a line "Email <id>:". Handle every email separately, exactly as described above, and answer with a JSON array containing one object per email in the output format above, each with an added "id" key holding the email's id. Return only the JSON array.
+    """
+
+# Input rows handled per round of API calls; each round's output is written before the next
+STREAM_CHUNK_ROWS = 500
+
+# Rows whose answer could not be used (API error, no JSON, wrong shape) go to a dead-letter
+# queue next to the output (<output>.failed.jsonl) instead of being dropped. retry_failed
+# sends only those rows again, waiting RETRY_QUEUE_BASE_DELAY seconds after a row's first
+# failure and doubling the wait after each further one, up to RETRY_QUEUE_MAX_ATTEMPTS.
+RETRY_QUEUE_BASE_DELAY = 60
+RETRY_QUEUE_MAX_ATTEMPTS = 5
+
+def load_environment():
+    """
+    Load .env (OPENAI_API_KEY and the LLM_* settings) into the environment, when a run
+    starts rather than at import, so importing a stage module has no side effects.
+    """
+    import openai
+    from dotenv import find_dotenv, load_dotenv
+
+    load_dotenv(find_dotenv())
+    openai.api_key = os.environ.get("OPENAI_API_KEY", openai.api_key)
+
+def input_columns(tasks):
+    """The input columns the tasks need, so Parquet tables only read those."""
+    columns = ['Message-ID', 'Body']
+    for task in tasks:
+        columns.extend(task.copy_columns)
+        if task.with_subject:
+            columns.append('Subject')
+        if task.classifier_field:
+            columns.extend(['Subject', 'From'])
+    return list(dict.fromkeys(columns))
+
+def call_with_retries(system_prompt, user_content, model=DEFAULT_MODEL):
+    """Call the API, retrying rate limits and transient errors with exponential backoff."""
+    import openai
+
+    retryable = tuple(getattr(openai.error, name) for name in RETRYABLE_ERRORS)
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            return chat_completion(system_prompt, user_content, model, attempt)
+        except retryable as e:
+            if attempt == RETRY_ATTEMPTS - 1:
+                raise
+            delay = RETRY_BASE_DELAY * 2 ** attempt
+            print(f"API error: {e}. Retrying in {delay}s...")
+            time.sleep(delay)
+
+def name_stages(tasks):
+    """Report each task's API calls, packed or not, under its name in llm_metrics."""
+    for task in tasks:
+        name_stage(task.name, task.system_prompt)
+        name_stage(task.name, task.system_prompt + PACK_PROMPT)
+
+def complete(request):
+    """Run one (model, system prompt, user content) request and cache its answer; None on failure."""
+    import openai
+
+    model, system_prompt, user_content = request
+    try:
+        content = call_with_retries(system_prompt, user_content, model)
+    except openai.error.OpenAIError as e:
+        print(f"Error in API call: {e}")
+        return None
+    cache_put(model, system_prompt, user_content, content)
+    return content
+
+def group_tokens(group):
+    return estimate_tokens(''.join(request[2] for index, request in group))
+
+def pack_groups(requests, packed, tokens=None):
+    """
+    Group request indices into packs: requests of packed tasks that share a model and
+    system prompt are packed together up to the email and token limits, every other
+    request is a group of one. Each group is a list of (index, request). tokens gives the
+    user content's token count of each request if known (else estimated from its length).
+    """
+    groups = []
+    open_packs = {}  # (model, system prompt): (pack, estimated tokens)
+    for index, request in enumerate(requests):
+        if not packed[index]:
+            groups.append([(index, request)])
+            continue
+        key = request[:2]
+        request_tokens = tokens[index] if tokens is not None else len(request[2]) // 4
+        pack, pack_tokens = open_packs.get(key, (None, 0))
+        if pack is None or len(pack) >= PACK_MAX_EMAILS or pack_tokens + request_tokens > PACK_MAX_TOKENS:
+            pack, pack_tokens = [], 0
+            groups.append(pack)
+        pack.append((index, request))
+        open_packs[key] = (pack, pack_tokens + request_tokens)
+    return groups
+
+def unpack_answers(content):
+    """{email id: answer} from a packed response; raises ValueError if it is not a JSON array."""
+    data = extract_json(content)
+    if isinstance(data, dict):  # the array wrapped in an object, e.g. {"emails": [...]}
+        data = next((value for value in data.values() if isinstance(value, list)), None)
+    if not isinstance(data, list):
+        raise ValueError(f"expected a JSON array, got: {content[:200]}")
+    return {
+        str(item['id']): {key: value for key, value in item.items() if key != 'id'}
+        for item in data if isinstance(item, dict) and 'id' in item
+    }
+
+def complete_group(group):
+    """Send one group of requests; returns {index: response} for the requests that were answered."""
+    import openai
+
+    if len(group) == 1:
+        index, request = group[0]
+        response = complete(request)
+        return {} if response is None else {index: response}
+
+    model, system_prompt = group[0][1][:2]
+    content = '\n\n'.join(f"Email {number}:\n{request[2]}" for number, (index, request) in enumerate(group, start=1))
+    try:
+        answers = unpack_answers(call_with_retries(system_prompt + PACK_PROMPT, content, model))
+    except openai.error.OpenAIError as e:
+        print(f"Error in API call: {e}")
+        return {}
+    except ValueError as e:
+        print(f"Could not parse the answer for {len(group)} packed emails ({e}). Splitting the pack...")
+        return {}
+
+    # Cache each email's answer on its own, as if it had been sent alone
+    responses = {}
+    for number, (index, request) in enumerate(group, start=1):
+        if str(number) in answers:
+            responses[index] = json.dumps(answers[str(number)])
+            cache_put(*request, responses[index])
+    return responses
+
+def run_requests(requests, packed):
+    """
+    Send requests concurrently, packing those marked in packed; returns the responses in
+    request order (None for failed requests).
+    """
+    responses = [None] * len(requests)
+    groups = pack_groups(requests, packed)
+    packs = [group for group in groups if len(group) > 1]
+    if packs:
+        print(f"Packed {sum(len(group) for group in packs)} emails into {len(packs)} requests.")
+    while groups:
+        retry = []
+        for group, answered in zip(groups, map_concurrently(complete_group, groups, count_tokens=group_tokens)):
+            for index, response in answered.items():
+                responses[index] = response
+            missing = [(index, request) for index, request in group if index not in answered]
+            if len(group) == 1 or not missing:
+                continue
+            if answered:  # partly answered: send the rest again
+                retry.append(missing)
+            else:  # unparseable: split in half
+                retry.extend([group[:len(group) // 2], group[len(group) // 2:]])
+        groups = retry
+    return responses
+
+def task_encoding(task):
+    """The tokenizer encoding of a task's model (see llm_tokens)."""
+    return encoding_for_model(task.model)
+
+def load_tokenizers(tasks):
+    """Load the encodings the tasks count tokens with, so a missing one stops a run before it writes anything."""
+    for name in {task_encoding(task) for task in tasks if task.max_tokens is not None}:
+        get_encoding(name)
+
+def quotes_mode(task):
+    """What a task's requests keep of quoted history (see email_normalizer)."""
+    return LATEST_QUOTE if task.reply_field else DROP_QUOTES
+
+def normalize_bodies(tasks, bodies):
+    """{quotes mode: [(normalized body, its link targets)]} of a chunk's bodies, for the tasks' modes."""
+    normalized = {}
+    for mode in {quotes_mode(task) for task in tasks}:
+        normalized[mode] = []
+        for body in bodies:
+            links = []
+            normalized[mode].append((normalize_email(body, mode, links=links), links))
+    return normalized
+
+def truncates(task):
+    return task.max_tokens is not None and not task.reply_field
+
+def subject_line(row):
+    return f"Subject: {row.get('Subject', '').strip()}\n"
+
+def chunk_tokens(tasks, rows, bodies):
+    """
+    {encoding: (body tokens, subject line token counts or None)} of a chunk of rows, for the
+    encodings of the tasks that truncate, each from one batched tokenizer call. bodies are
+    normalized with DROP_QUOTES, as for every task that truncates.
+    """
+    names = {task_encoding(task) for task in tasks if truncates(task)}
+    subject_names = {task_encoding(task) for task in tasks if truncates(task) and task.with_subject}
+    return {
+        name: (
+            encode_batch(bodies, name),
+            count_tokens([subject_line(row) for row in rows], name) if name in subject_names else None
+        )
+        for name in names
+    }
+
+def row_tokens(task, tokens, position):
+    """(body tokens, subject line token count) of a chunk's row for a task; (None, 0) if it never truncates."""
+    if not truncates(task):
+        return None, 0
+    body_tokens, subject_tokens = tokens[task_encoding(task)]
+    return body_tokens[position], subject_tokens[position] if task.with_subject else 0
+
+def truncate_tokens(task, text, tokens, max_tokens):
+    """Cut text to its first max_tokens tokens, given its already computed tokens."""
+    if max_tokens is None or len(tokens) <= max_tokens:
+        return text
+    print(f"Email exceeds token limit ({len(tokens)} tokens). Truncating...")
+    return truncate(text, tokens, max_tokens, task_encoding(task))
+
+def with_subject_line(task, row, body):
+    return f"{subject_line(row)}Body: {body}" if task.with_subject else body
+
+def user_content(task, row, body, body_tokens=None, subject_tokens=0):
+    """The user message a task sends for a row's normalized body, given its tokens from chunk_tokens."""
+    if task.reply_field:
+        return body
+    if task.max_tokens is not None:
+        body = truncate_tokens(task, body, body_tokens, task.max_tokens - subject_tokens)
+    return with_subject_line(task, row, body)
+
+def row_requests(task, row, body, body_tokens=None, subject_tokens=0):
+    """
+    The (model, system prompt, user content) requests a task sends for a row: one, or one
+    per part when the email is over the limit of a task that merges.
+    """
+    if task.merge is not None and truncates(task) and len(body_tokens) > task.max_tokens - subject_tokens:
+        parts = split_email(body, task.max_tokens - subject_tokens, task_encoding(task))
+        print(f"Email exceeds token limit ({len(body_tokens)} tokens). Splitting it into {len(parts)} parts...")
+        return [(task.model, task.system_prompt, with_subject_line(task, row, part)) for part in parts]
+    return [(task.model, task.system_prompt, user_content(task, row, body, body_tokens, subject_tokens))]
+
+def output_row(task, row, data):
+    """The output CSV row of a task for an input row and the model's parsed answer."""
+    values = [row.get(column, '').strip() for column in task.copy_columns]
+    for key, default in task.fields:
+        value = data.get(key, default)
+        values.append(', '.join(str(item) for item in value) if isinstance(value, list) else value)
+    return values
+
+def journal_path(output_csv_path):
+    return output_csv_path + '.progress'
+
+def task_signature(task):
+    """Changes whenever a task would write different rows, so a stale journal is not resumed."""
+    return text_hash(json.dumps([task.system_prompt, task.fields, task.output_columns, task.copy_columns,
+                                 task.with_subject, task.max_tokens, task.model, task.merge is not None,
+                                 NORMALIZER_VERSION]))
+
+def read_journal(path, signature):
+    """
+    (input row keys already processed, output CSV size after the last of them) from a
+    progress journal, or (set(), None) when there is nothing to resume.
+    """
+    if not os.path.exists(path):
+        return set(), None
+    with open(path, encoding='utf-8') as f:
+        lines = f.read().split('\n')
+    if lines[0] != json.dumps(signature):
+        print(f"{path} was written for a different task. Starting over...")
+        return set(), None
+    done, size = set(), None
+    for line in lines[1:]:
+        try:
+            key, size = json.loads(line)
+        except ValueError:  # the last line may be torn by a crash
+            break
+        done.add(key)
+    return done, size
+
+def open_output(task, output_csv_path, stack):
+    """
+    Open a task's output CSV and progress journal for appending, resuming an interrupted
+    run when its journal matches the task. Returns (csvfile, journal, keys already done).
+    """
+    path = journal_path(output_csv_path)
+    signature = task_signature(task)
+    done, size = read_journal(path, signature)
+    if size is not None and os.path.exists(output_csv_path):
+        # Drop rows written after the last journal entry; they are processed again
+        os.truncate(output_csv_path, size)
+        csvfile = stack.enter_context(open(output_csv_path, mode='a', newline='', encoding='utf-8'))
+        print(f"{task.name}: resuming after {len(done)} rows already processed.")
+    else:
+        done = set()
+        csvfile = stack.enter_context(open(output_csv_path, mode='w', newline='', encoding='utf-8'))
+        csv.writer(csvfile).writerow(task.output_columns)
+        # Every row is processed again
+        for stale_path in (failed_path(output_csv_path), retry_journal_path(output_csv_path)):
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+    journal = stack.enter_context(open(path, mode='w', encoding='utf-8'))
+    journal.write(json.dumps(signature) + '\n')
+    size = csvfile.tell()
+    for key in done:
+        journal.write(json.dumps([key, size]) + '\n')
+    journal.flush()
+    return csvfile, journal, done
+
+def write_rows(csvfile, journal, rows, keys):
+    """Append output rows, then record the input rows they came from once the rows are on disk."""
+    csv.writer(csvfile).writerows(rows)
+    csvfile.flush()
+    os.fsync(csvfile.fileno())
+    size = csvfile.tell()
+    journal.write(''.join(json.dumps([key, size]) + '\n' for key in keys))
+    journal.flush()
+    os.fsync(journal.fileno())
+
+def check_answer(task, answer):
+    """
+    (parsed data, None) for a usable response or ready answer, else (None, the reason).
+    A usable answer is a JSON object with at least one of the task's fields, none of them
+    holding a nested object.
+    """
+    if answer is None:
+        return None, "API call failed"
+    if isinstance(answer, str):
+        try:
+            answer = extract_json(answer)
+        except ValueError as e:
+            return None, f"Error decoding JSON: {e}"
+    if not isinstance(answer, dict):
+        return None, f"Expected a JSON object, got: {str(answer)[:200]}"
+    keys = [key for key, default in task.fields]
+    if not any(key in answer for key in keys):
+        return None, f"None of the fields {keys} in: {json.dumps(answer)[:200]}"
+    nested = [key for key in keys if isinstance(answer.get(key), dict)]
+    if nested:
+        return None, f"Unexpected nested objects in {nested}"
+    return answer, None
+
+def check_request(task, request, answer):
+    """
+    check_answer for the answer to a request, or for the answers to every part of a split
+    email (a list of requests), merged into one. Unusable answers are removed from the cache.
+    """
+    if not isinstance(request, list):
+        data, error = check_answer(task, answer)
+        if error and request is not None:
+            cache_delete(*request)  # never serve an unusable answer again
+        return data, error
+    parts = []
+    for number, (part, part_answer) in enumerate(zip(request, answer), start=1):
+        data, error = check_answer(task, part_answer)
+        if error:
+            cache_delete(*part)
+            return None, f"Part {number} of {len(request)}: {error}"
+        parts.append(data)
+    return merge_answers(task.fields, task.merge, parts), None
+
+def failed_path(output_csv_path):
+    return os.path.splitext(output_csv_path)[0] + '.failed.jsonl'
+
+def retry_journal_path(output_csv_path):
+    return failed_path(output_csv_path) + '.progress'
+
+def failed_entry(task, key, row, request, error, response, attempts=0):
+    """A dead-letter queue entry: enough of the input row to send it again, and why it failed."""
+    return {
+        'key': key,
+        'signature': task_signature(task),
+        'row': {column: row.get(column, '') for column in input_columns([task])},
+        'error': error,
+        'response': response if isinstance(response, str) else None,
+        'attempts': attempts + 1,
+        'next_attempt': time.time() + RETRY_QUEUE_BASE_DELAY * 2 ** attempts,
+    }
+
+def load_failed(path):
+    """{input row key: entry} of a dead-letter queue; later entries for a row win."""
+    entries = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:  # torn by a crash
+                    continue
+                entries[entry['key']] = entry
+    return entries
+
+def save_failed(path, entries):
+    """Rewrite a dead-letter queue with entries ({input row key: entry}), atomically; removed when empty."""
+    temporary_path = path + '.tmp'
+    with open(temporary_path, mode='w', encoding='utf-8') as f:
+        f.write(''.join(json.dumps(entry) + '\n' for entry in entries.values()))
+    os.replace(temporary_path, path)
+    if not entries:
+        os.remove(path)
+
+def finish_retry(output_csv_path, entries):
+    """
+    Complete a retry_failed run interrupted after it started appending to the output CSV,
+    from its journal: the output size before appending, then the keys of the recovered
+    rows once they are on disk. Rows written but not recorded are cut off again (they are
+    retried); recorded ones are removed from entries and the queue.
+    """
+    path = retry_journal_path(output_csv_path)
+    if not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8') as f:
+        lines = f.read().split('\n')
+    try:
+        size = json.loads(lines[0])
+    except ValueError:  # torn by a crash before anything was appended
+        size = None
+    try:
+        recovered = json.loads(lines[1])
+    except (ValueError, IndexError):
+        recovered = None
+    if recovered is not None:
+        for key in recovered:
+            entries.pop(key, None)
+        save_failed(failed_path(output_csv_path), entries)
+    elif size is not None:
+        os.truncate(output_csv_path, size)
+    os.remove(path)
+
+def append_failed(path, entries):
+    if not entries:
+        return
+    with open(path, mode='a', encoding='utf-8') as f:
+        f.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+        f.flush()
+        os.fsync(f.fileno())
+
+def run_tasks(input_csv_path, task_outputs, batch=None, dry_run=False):
+    """
+    Run tasks over one input CSV file or Parquet dataset in a single pass.
+    task_outputs is a list of (task, output_csv_path). With batch (default: LLM_BATCH=1 in
+    the environment), the API calls go through the Batch API instead (see llm_batch).
+
+    Rows are processed STREAM_CHUNK_ROWS at a time and each chunk's output is appended to
+    the CSVs as soon as it is done, along with a progress journal (<output>.progress) of
+    the input rows processed. If a run is interrupted, the next one skips those rows and
+    continues; the journal is removed once a run completes.
+
+    With dry_run, nothing is sent: the run is planned instead (see task_planner).
+    """
+    load_environment()
+    if batch is None:
+        batch = bool(setting('LLM_BATCH', 0))
+    if dry_run:
+        from task_planner import plan_tasks
+
+        return plan_tasks(input_csv_path, task_outputs, batch=batch)
+    tasks = [task for task, output_csv_path in task_outputs]
+    name_stages(tasks)
+    load_tokenizers(tasks)
+    threads = load_threads(input_csv_path) if any(task.reply_field for task in tasks) else None
+    # A batch waits for its results, so batch mode sends the whole input at once
+    chunk_rows = None if batch else STREAM_CHUNK_ROWS
+    counts = [{'rows': 0, 'threads': 0, 'local': 0, 'cached': 0, 'sent': 0, 'split': 0, 'failed': 0} for _ in tasks]
+    classifiers = [load_classifier(task) if task.classifier_field else None for task in tasks]
+    threshold = classifier_threshold()
+
+    with ExitStack() as stack:
+        outputs = [open_output(task, output_csv_path, stack) for task, output_csv_path in task_outputs]
+        rows = iter_unique_rows(input_csv_path, columns=input_columns(tasks))
+        while True:
+            chunk = list(islice(rows, chunk_rows))
+            if not chunk:
+                break
+
+            # The normalized body and tokens of every row still to process, one tokenizer call per encoding
+            keys = [row_key(row.get('Message-ID'), row['Body']) for row in chunk]
+            normalized = normalize_bodies(tasks, [
+                row['Body'] if any(key not in output[2] for output in outputs) else ''
+                for key, row in zip(keys, chunk)
+            ])
+            tokens = chunk_tokens(tasks, chunk, [body for body, links in normalized.get(DROP_QUOTES, [])])
+
+            # Per task, in row order: (row key, row, request, answer) where answer is parsed
+            # data, a cached response, or the index of a request still to be sent (for an
+            # email split into parts, a list of requests and a list of such answers)
+            answers = [[] for _ in tasks]
+            row_links = [{} for _ in tasks]  # per task, {row key: link targets} of the rows with placeholders
+            requests = []
+            packed = []  # per request, whether its task packs emails
+            # Local classifier answers for the whole chunk at once: (label or None, confidence) per row
+            local_answers = [
+                classify(classifier, [classifier_text(row) for row in chunk], threshold) if classifier else None
+                for classifier in classifiers
+            ]
+            for position, row in enumerate(chunk):
+                key = keys[position]
+                pending = [task_index for task_index in range(len(tasks)) if key not in outputs[task_index][2]]
+                if not pending:
+                    continue
+
+                for task_index in pending:
+                    task = tasks[task_index]
+                    body, links = normalized[quotes_mode(task)][position]
+                    if not body:
+                        print("Empty email body found. Skipping...")
+                        answers[task_index].append((key, row, None, {}))
+                        continue
+                    if links:
+                        row_links[task_index][key] = links
+                    if task.reply_field:
+                        original_message, reply, unambiguous = reply_pair(threads, row)
+                        if unambiguous:
+                            answers[task_index].append(
+                                (key, row, None, {'original_message': original_message, task.reply_field: reply})
+                            )
+                            counts[task_index]['threads'] += 1
+                            continue
+                    parts = row_requests(task, row, body, *row_tokens(task, tokens, position))
+                    request = parts[0] if len(parts) == 1 else parts
+                    cached = [cache_get(*part) for part in parts]
+                    label = local_answers[task_index][position][0] if local_answers[task_index] else None
+                    counts[task_index]['split'] += len(parts) > 1
+                    if None not in cached:  # an earlier LLM answer beats the local classifier
+                        answers[task_index].append((key, row, request, cached[0] if len(parts) == 1 else cached))
+                        counts[task_index]['cached'] += 1
+                    elif label in task.classifier_labels:
+                        answers[task_index].append((key, row, None, {task.classifier_field: label}))
+                        counts[task_index]['local'] += 1
+                    else:
+                        # Parts answered before are reused; the others are sent with every other request
+                        indices = []
+                        for part, response in zip(parts, cached):
+                            if response is None:
+                                response = len(requests)
+                                requests.append(part)
+                                packed.append(task.pack)
+                            indices.append(response)
+                        answers[task_index].append((key, row, request, indices[0] if len(parts) == 1 else indices))
+                        counts[task_index]['sent'] += 1
+
+            # Every task's API calls share one pool (or one batch), so the limits apply across
+            # tasks. Batches are already billed at half price and are not packed.
+            if batch:
+                from llm_batch import run_batch
+
+                responses = run_batch(requests, task_outputs[0][1])
+            else:
+                responses = run_requests(requests, packed)
+
+            for task_index, (task, output_csv_path) in enumerate(task_outputs):
+                processed_data = []
+                failed = []
+                labels = []  # (row key, label) of every parsed LLM answer, for local_classifier
+                for key, row, request, answer in answers[task_index]:
+                    if request is None and not answer:  # empty body
+                        continue
+                    if isinstance(answer, int):
+                        answer = responses[answer]
+                    elif isinstance(answer, list):
+                        answer = [responses[part] if isinstance(part, int) else part for part in answer]
+                    data, error = check_request(task, request, answer)
+                    if error:
+                        print(f"{error}. Queued for retry.")
+                        failed.append(failed_entry(task, key, row, request, error, answer))
+                        continue
+                    if task.classifier_field and request is not None:
+                        labels.append((key, data.get(task.classifier_field)))
+                    data = restore_links(data, row_links[task_index].get(key))
+                    if task.keep is None or task.keep(data):
+                        processed_data.append(output_row(task, row, data))
+                # Failed rows are queued before their rows are journaled as processed
+                append_failed(failed_path(output_csv_path), failed)
+                record_labels(output_csv_path, labels)
+                csvfile, journal, done = outputs[task_index]
+                write_rows(csvfile, journal, processed_data, [key for key, row, request, answer in answers[task_index]])
+                counts[task_index]['rows'] += len(processed_data)
+                counts[task_index]['failed'] += len(failed)
+
+    for task_index, (task, output_csv_path) in enumerate(task_outputs):
+        os.remove(journal_path(output_csv_path))
+        print(
+            f"{task.name}: {counts[task_index]['rows']} rows written ({counts[task_index]['threads']} from the "
+            f"thread structure, {counts[task_index]['cached']} cached, {counts[task_index]['sent']} sent to the API)."
+        )
+        if counts[task_index]['split']:
+            print(f"{counts[task_index]['split']} emails over the token limit were split into parts and merged.")
+        if classifiers[task_index] is not None:
+            considered = counts[task_index]['local'] + counts[task_index]['cached'] + counts[task_index]['sent']
+            print(f"Local classifier answered {counts[task_index]['local']} of {considered} emails at confidence "
+                  f"{threshold}, saving {counts[task_index]['local'] / max(considered, 1):.0%} of the LLM calls.")
+        if counts[task_index]['failed']:
+            print(f"{counts[task_index]['failed']} rows failed; retry them with retry_failed "
+                  f"(queued in {failed_path(output_csv_path)}).")
+        print(f"Processed data has been saved to {output_csv_path}.")
+
+def retry_failed(task, output_csv_path):
+    """
+    Send the rows in a task's dead-letter queue that are due again, and append the ones that
+    now succeed to its output CSV (after the rows of the original run). Rows failing again
+    are rescheduled with a doubled delay, until RETRY_QUEUE_MAX_ATTEMPTS. The appended rows
+    are journaled (see finish_retry), so an interrupted retry never writes a row twice.
+    """
+    load_environment()
+    path = failed_path(output_csv_path)
+    entries = load_failed(path)
+    finish_retry(output_csv_path, entries)
+    if not entries:
+        print(f"No failed rows queued for {output_csv_path}.")
+        return
+    signature = task_signature(task)
+    now = time.time()
+    due = [
+        entry for entry in entries.values()
+        if entry['signature'] == signature and entry['attempts'] < RETRY_QUEUE_MAX_ATTEMPTS
+        and entry['next_attempt'] <= now
+    ]
+    print(f"{task.name}: retrying {len(due)} of {len(entries)} failed rows.")
+    name_stages([task])
+
+    rows = [entry['row'] for entry in due]
+    normalized = normalize_bodies([task], [row['Body'] for row in rows])[quotes_mode(task)]
+    bodies = [body for body, links in normalized]
+    tokens = chunk_tokens([task], rows, bodies)
+    row_parts = [
+        row_requests(task, row, body, *row_tokens(task, tokens, position))
+        for position, (row, body) in enumerate(zip(rows, bodies))
+    ]
+    requests = [part for parts in row_parts for part in parts]
+    responses = iter(run_requests(requests, [task.pack] * len(requests)))
+
+    processed_data = []
+    recovered = []
+    labels = []
+    for entry, parts, (body, links) in zip(due, row_parts, normalized):
+        answers = [next(responses) for part in parts]
+        request, response = (parts[0], answers[0]) if len(parts) == 1 else (parts, answers)
+        data, error = check_request(task, request, response)
+        if error:
+            print(f"{error}. Attempt {entry['attempts'] + 1} failed.")
+            entries[entry['key']] = failed_entry(
+                task, entry['key'], entry['row'], request, error, response, entry['attempts']
+            )
+            continue
+        del entries[entry['key']]
+        recovered.append(entry['key'])
+        if task.classifier_field:
+            labels.append((entry['key'], data.get(task.classifier_field)))
+        data = restore_links(data, links)
+        if task.keep is None or task.keep(data):
+            processed_data.append(output_row(task, entry['row'], data))
+
+    with open(output_csv_path, mode='a', newline='', encoding='utf-8') as csvfile, \
+            open(retry_journal_path(output_csv_path), mode='w', encoding='utf-8') as journal:
+        journal.write(json.dumps(csvfile.tell()) + '\n')
+        journal.flush()
+        os.fsync(journal.fileno())
+        csv.writer(csvfile).writerows(processed_data)
+        csvfile.flush()
+        os.fsync(csvfile.fileno())
+        journal.write(json.dumps(recovered) + '\n')
+        journal.flush()
+        os.fsync(journal.fileno())
+    record_labels(output_csv_path, labels)
+    # Rewrite the queue with what is left
+    save_failed(path, entries)
+    os.remove(retry_journal_path(output_csv_path))
+
+    given_up = sum(1 for entry in entries.values() if entry['attempts'] >= RETRY_QUEUE_MAX_ATTEMPTS)
+    print(f"{task.name}: {len(recovered)} rows recovered, "
+          f"{len(entries)} still failing ({given_up} after {RETRY_QUEUE_MAX_ATTEMPTS} attempts).")
@@ -0,0 +1,175 @@
+import csv
+import os
+from itertools import islice
+
+from email_store import iter_unique_rows, row_key
+from email_threads import load_threads, reply_pair
+from llm_executor import DEFAULT_MAX_CONCURRENCY, DEFAULT_RPM, DEFAULT_TPM, setting
+from llm_metrics import BATCH_DISCOUNT, PRICES
+from llm_tokens import count_tokens
+from map_reduce import MAX_PARTS
+from task_engine import PACK_PROMPT, input_columns, normalize_bodies, pack_groups, quotes_mode, subject_line, task_encoding
+
+# Dry-run planning of a cleaning run. Every row is prepared as run_tasks would prepare it
+# and tokenized with the real prompts (PLAN_BATCH_ROWS rows per tokenizer call), but
+# nothing is sent. The report gives token totals and percentiles, how many emails would
+# be truncated or split into parts, the number of requests after packing, and the
+# projected cost and wall time. A length-sorted plan of the rows is written next to each output
+# (<output>.plan.csv) so they can be scheduled in buckets of similar size.
+PLAN_BATCH_ROWS = 256
+PERCENTILES = (50, 90, 99)
+MESSAGE_OVERHEAD_TOKENS = 7  # chat formatting of the two messages of a request
+PACKED_EMAIL_OVERHEAD_TOKENS = 4  # the "Email <id>:" line of each email in a pack
+COMPLETION_TOKENS_PER_FIELD = 20  # expected answer length per output field
+SECONDS_PER_CALL = 2.0  # typical latency of one chat completion
+
+def plan_path(output_csv_path):
+    return os.path.splitext(output_csv_path)[0] + '.plan.csv'
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, round(percent / 100 * (len(sorted_values) - 1)))]
+
+def token_bucket(tokens, smallest=64):
+    """The power of two at or above tokens, for grouping rows of similar length."""
+    bucket = smallest
+    while bucket < tokens:
+        bucket *= 2
+    return bucket
+
+def format_duration(seconds):
+    if seconds < 120:
+        return f"{seconds:.0f} s"
+    if seconds < 7200:
+        return f"{seconds / 60:.1f} min"
+    return f"{seconds / 3600:.1f} h"
+
+def plan_tasks(input_csv_path, task_outputs, batch=False, max_concurrency=None, rpm=None, tpm=None,
+               seconds_per_call=SECONDS_PER_CALL):
+    """
+    Plan run_tasks(input_csv_path, task_outputs) without calling the API: print the
+    report, write each task's execution plan and return a summary per task.
+    Limits left as None come from the environment or llm_executor's defaults.
+    """
+    max_concurrency = max_concurrency or setting('LLM_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY)
+    rpm = rpm or setting('LLM_RPM', DEFAULT_RPM)
+    tpm = tpm or setting('LLM_TPM', DEFAULT_TPM)
+    tasks = [task for task, output_csv_path in task_outputs]
+    threads = load_threads(input_csv_path) if any(task.reply_field for task in tasks) else None
+
+    # Per task: (row key, email tokens, tokens sent, truncated, parts) of every email to send
+    emails = [[] for _ in tasks]
+    from_threads = [0 for _ in tasks]
+    empty = 0
+    rows = iter_unique_rows(input_csv_path, columns=input_columns(tasks))
+    while True:
+        chunk = list(islice(rows, PLAN_BATCH_ROWS))
+        if not chunk:
+            break
+        nonempty = [row for row in chunk if row['Body'].strip()]
+        empty += len(chunk) - len(nonempty)
+        chunk = nonempty
+        normalized = normalize_bodies(tasks, [row['Body'] for row in chunk])
+
+        for task_index, task in enumerate(tasks):
+            keys, texts, subjects = [], [], []
+            for row, (body, links) in zip(chunk, normalized[quotes_mode(task)]):
+                if not body:  # nothing left once normalized
+                    continue
+                if task.reply_field and reply_pair(threads, row)[2]:
+                    from_threads[task_index] += 1
+                    continue
+                keys.append(row_key(row.get('Message-ID'), row['Body']))
+                texts.append(body)
+                subjects.append(subject_line(row))
+            body_tokens = count_tokens(texts, task_encoding(task))
+            subject_tokens = count_tokens(subjects, task_encoding(task)) if task.with_subject else [0] * len(texts)
+            for key, tokens, prefix in zip(keys, body_tokens, subject_tokens):
+                budget = None if task.max_tokens is None or task.reply_field else task.max_tokens - prefix
+                over = budget is not None and tokens > budget
+                if over and task.merge is not None:  # split into parts of up to budget tokens
+                    parts = min(-(-tokens // max(budget, 1)), MAX_PARTS)
+                    emails[task_index].append((key, tokens, parts * prefix + min(tokens, parts * budget), False, parts))
+                else:
+                    emails[task_index].append((key, tokens, prefix + (budget if over else tokens), over, 1))
+
+    summaries = []
+    total_requests = 0
+    total_tokens = 0
+    for task_index, (task, output_csv_path) in enumerate(task_outputs):
+        planned = emails[task_index]
+        # Tokens of each request, a split email's parts counted as equal shares
+        sent = [email[2] // email[4] for email in planned for part in range(email[4])]
+        system_tokens, pack_tokens = count_tokens([task.system_prompt, PACK_PROMPT], task_encoding(task))
+
+        # Requests after packing, and the input tokens they add up to
+        # (batches are not packed)
+        requests = [(task.model, task.system_prompt, '')] * len(sent)
+        groups = pack_groups(requests, [task.pack and not batch] * len(sent), sent)
+        input_tokens = 0
+        for group in groups:
+            input_tokens += system_tokens + MESSAGE_OVERHEAD_TOKENS + sum(sent[index] for index, request in group)
+            if len(group) > 1:
+                input_tokens += pack_tokens + PACKED_EMAIL_OVERHEAD_TOKENS * len(group)
+        output_tokens = len(sent) * COMPLETION_TOKENS_PER_FIELD * len(task.fields)
+        prices = PRICES.get(task.model)
+        cost = None
+        if prices:
+            cost = (input_tokens * prices[0] + output_tokens * prices[1]) / 1e6 * (BATCH_DISCOUNT if batch else 1)
+
+        # Execution plan, shortest emails first
+        with open(plan_path(output_csv_path), mode='w', newline='', encoding='utf-8') as csvfile:
+            csv_writer = csv.writer(csvfile)
+            csv_writer.writerow(['Key', 'Email Tokens', 'Sent Tokens', 'Truncated', 'Parts', 'Bucket'])
+            for key, tokens, sent_tokens, truncated, parts in sorted(planned, key=lambda email: email[2]):
+                csv_writer.writerow([key, tokens, sent_tokens, truncated, parts, token_bucket(sent_tokens // parts)])
+
+        lengths = sorted(email[1] for email in planned)
+        summary = {
+            'task': task.name,
+            'emails': len(planned),
+            'from_threads': from_threads[task_index],
+            'email_tokens': sum(lengths),
+            'percentiles': {percent: percentile(lengths, percent) for percent in PERCENTILES},
+            'max_tokens': lengths[-1] if lengths else 0,
+            'truncated': sum(1 for email in planned if email[3]),
+            'split': sum(1 for email in planned if email[4] > 1),
+            'parts': sum(email[4] for email in planned if email[4] > 1),
+            'requests': len(groups),
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'cost': cost,
+        }
+        summaries.append(summary)
+        total_requests += len(groups)
+        total_tokens += input_tokens + output_tokens
+
+        print(f"{task.name}: {summary['emails']} emails to send, {summary['from_threads']} more answered by the "
+              f"thread structure")
+        print(f"  email tokens: {summary['email_tokens']:,} total, " + ", ".join(
+            f"p{percent} {value:,}" for percent, value in summary['percentiles'].items()
+        ) + f", max {summary['max_tokens']:,}")
+        if task.max_tokens is not None and not task.reply_field and task.merge is not None:
+            print(f"  split at {task.max_tokens} tokens: {summary['split']} emails into {summary['parts']} parts")
+        elif task.max_tokens is not None and not task.reply_field:
+            print(f"  truncated at {task.max_tokens} tokens: {summary['truncated']} emails")
+        print(f"  requests: {summary['requests']:,}{' (packed)' if task.pack and not batch else ''}, "
+              f"{input_tokens:,} input + {output_tokens:,} output tokens, "
+              + (f"${cost:,.2f}{' (Batch API)' if batch else ''}" if cost is not None else f"no price for {task.model}"))
+        print(f"  execution plan: {plan_path(output_csv_path)}")
+
+    if empty:
+        print(f"{empty} emails with an empty body would be skipped.")
+    if batch:
+        print("Batch API: results within 24 hours.")
+    else:
+        limits = {
+            f"concurrency {max_concurrency}": total_requests * seconds_per_call / max_concurrency,
+            f"{rpm} requests/min": total_requests / rpm * 60,
+            f"{tpm} tokens/min": total_tokens / tpm * 60,
+        }
+        limit = max(limits, key=limits.get)
+        print(f"Projected wall time: {format_duration(limits[limit])} for {total_requests:,} requests "
+              f"(limited by {limit}, at {seconds_per_call:g} s per call).")
+    return summaries
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+# The pipeline modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def word_tokenizer(monkeypatch):
+    """Count every whitespace-separated word as one token, so no tokenizer vocab is needed."""
+    import llm_tokens
+
+    llm_tokens.register_encoding('words', lambda: llm_tokens.Encoding(
+        'words', lambda texts: [text.split() for text in texts], ' '.join
+    ))
+    monkeypatch.setenv('LLM_TOKENIZER', 'words')
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    """
+    Point the openai client at benchmarks.fake_openai, with the response cache and the
+    metrics records turned off. Returns the server's stats ('requests' served so far).
+    Tests using it are skipped when openai is not installed.
+    """
+    openai = pytest.importorskip('openai')
+    pytest.importorskip('dotenv')  # load_environment reads .env with it
+    from benchmarks.fake_openai import start_fake_openai
+
+    server, api_base, stats = start_fake_openai(latency=0)
+    monkeypatch.setattr(openai, 'api_base', api_base)
+    monkeypatch.setattr(openai, 'api_key', None)
+    monkeypatch.setenv('OPENAI_API_KEY', 'fake')
+    monkeypatch.setenv('LLM_CACHE_PATH', '')
+    monkeypatch.setenv('LLM_METRICS_PATH', '')
+    yield stats
+    server.shutdown()
@@ -0,0 +1,38 @@
+from email_normalizer import LATEST_QUOTE, normalize_email, restore_links
+
+LONG_URL = 'https://boards.greenhouse.io/example/jobs/12345?gh_src=abcdef0123456789&utm_source=email&utm_medium=mail'
+
+def test_footers_are_cut_only_where_a_trailing_block_starts():
+    body = ('Hi Zeel,\n\nThanks for your interest in the role. Our next step is a call on Friday.\n\n'
+            '--------\nTo unsubscribe from these emails, click here.\n(c) 2024 Example Inc. All rights reserved.')
+    assert normalize_email(body) == ('Hi Zeel,\n\nThanks for your interest in the role. '
+                                     'Our next step is a call on Friday.')
+    # Flattened as in the tables: the blank line before the footer is two spaces
+    shipped = 'Your order has shipped and will arrive on Tuesday. Track it from your account page.'
+    assert normalize_email(f'{shipped}  You are receiving this email because you ordered.') == shipped
+
+def test_a_body_that_only_mentions_footer_words_is_kept():
+    body = ('Hi Zeel, could you review the privacy policy draft and the unsubscribe flow before launch? '
+            'Legal wants the \xa9 line in the app to say all rights reserved. Thanks')
+    assert normalize_email(body) == body
+    multi_line = 'Hi Zeel,\n\nPlease check the unsubscribe link in the privacy policy page.\nIt is broken.\n\nThanks'
+    assert normalize_email(multi_line) == multi_line
+
+def test_quoted_history_is_dropped_but_its_deadlines_are_kept():
+    body = ('Sounds good, see you then.\n\nOn Mon, Jan 6, 2025 at 9:00 AM Jane Doe <jane@example.com> wrote:\n'
+            '> Please confirm your slot by Friday.\n> Thanks, Jane')
+    assert normalize_email(body) == 'Sounds good, see you then. [deadline: Please confirm your slot by Friday.]'
+    assert normalize_email(body, LATEST_QUOTE).startswith('Sounds good, see you then.\n\nOn Mon, Jan 6')
+
+def test_only_the_standard_signature_delimiter_starts_a_signature():
+    assert normalize_email('See you at the interview.\n-- \nJane Doe\nRecruiter') == 'See you at the interview.'
+    assert normalize_email('Agenda:\n--\nIntro and demo') == 'Agenda:\n--\nIntro and demo'
+
+def test_long_urls_become_placeholders_that_answers_get_back():
+    links = []
+    text = normalize_email(f'Apply here: {LONG_URL}. Pixel: https://t.example.com/open/abc.gif', links=links)
+    assert text == 'Apply here: [link 1: boards.greenhouse.io]. Pixel:'
+    assert links == [LONG_URL]
+    assert restore_links({'next_step': 'Apply at [link 1: boards.greenhouse.io]', 'links': ['[link 1]']}, links) == {
+        'next_step': f'Apply at {LONG_URL}', 'links': [LONG_URL]
+    }
@@ -0,0 +1,45 @@
+import mbox_to_csv
+from email_store import load_rows
+from email_threads import load_threads, reply_pair, split_quote
+
+def message(message_id, body, in_reply_to=None):
+    reply_header = f"In-Reply-To: {in_reply_to}\n" if in_reply_to else ''
+    return (f"From someone@example.com Mon Jan  6 09:00:00 2025\nMessage-ID: {message_id}\n{reply_header}"
+            f"Date: Mon, 6 Jan 2025 09:00:00 +0000\nSubject: Interview\n\n{body}\n\n")
+
+def convert(tmp_path, label, messages):
+    mbox_path, csv_path = tmp_path / f'{label}.mbox', tmp_path / 'Past_email_mbox' / f'{label}.csv'
+    mbox_path.write_text(''.join(messages), encoding='utf-8')
+    mbox_to_csv.mbox_to_csv(str(mbox_path), str(csv_path))
+    return str(csv_path)
+
+def test_pairs_come_from_the_reply_graph_and_the_quoted_text(tmp_path):
+    (tmp_path / 'Past_email_mbox').mkdir()
+    inbox = convert(tmp_path, 'Inbox', [message('<q1@example.com>', 'Can you interview on Tuesday?')])
+    sent = convert(tmp_path, 'Sent', [
+        message('<r1@example.com>', 'Tuesday works for me.\n\nOn Mon, Jan 6, 2025 at 9:00 AM Jane <jane@example.com> '
+                'wrote:\n> Can you interview on Tuesday?', '<q1@example.com>'),
+        message('<r2@example.com>', 'Hello, I would like to apply for the role.'),
+        message('<r3@example.com>', 'Yes, I can send it.\n\nOn Sun, Jan 5, 2025 at 8:00 AM Bob <bob@example.com> '
+                'wrote:\n> Could you send your portfolio?', '<gone@example.com>'),
+        message('<r4@example.com>', 'Sounds good.', '<gone@example.com>'),
+    ])
+
+    threads = load_threads(sent)
+    assert [reply_pair(threads, row) for row in load_rows(sent)] == [
+        ('Can you interview on Tuesday?', 'Tuesday works for me.', True),  # from the parent's body
+        ('', 'Hello, I would like to apply for the role.', True),  # starts its thread
+        ('Could you send your portfolio?', 'Yes, I can send it.', True),  # parent not archived: the quote
+        ('', 'Sounds good.', False),  # neither: the LLM has to work it out
+    ]
+    threads = load_threads(inbox)
+    assert [reply_pair(threads, row) for row in load_rows(inbox)] == [
+        ('Can you interview on Tuesday?', 'Tuesday works for me.', True)
+    ]
+
+def test_split_quote_stops_the_quoted_message_at_the_next_attribution():
+    body = ('Thanks! On Tue, Jan 7, 2025 Jane <jane@example.com> wrote: > Here is the offer. '
+            '> On Mon, Jan 6, 2025 Zeel <zeel@example.com> wrote: > > Any news?')
+    new_text, quoted, rest = split_quote(body)
+    assert (new_text, quoted) == ('Thanks!', 'Here is the offer.')
+    assert rest.startswith('On Mon, Jan 6, 2025')
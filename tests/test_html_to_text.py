@@ -0,0 +1,21 @@
+from html_to_text import html_to_text
+
+def test_blocks_become_lines_and_non_text_elements_are_dropped():
+    markup = ('<html><head><title>Newsletter</title><style>p { color: red; }</style></head><body>'
+              '<div style="display:none">Preheader text</div><!-- comment -->'
+              '<table><tr><td>Hello&nbsp;there,</td><td>friend</td></tr></table>'
+              '<p>Fish &amp; chips</p><img src="https://t.example.com/open.gif"><script>track()</script>'
+              '</body></html>')
+    assert html_to_text(markup) == 'Hello there, friend\nFish & chips'
+
+def test_links_keep_their_targets():
+    markup = ('<p><a href="https://example.com/jobs?id=1&amp;src=mail">View the <b>role</b></a></p>'
+              "<p><a href='https://example.com/apply'>https://example.com/apply</a></p>"
+              '<p><a href="https://example.com/logo"><img src="logo.png"></a></p>'
+              '<p><a href="#top">Back to top</a></p>')
+    assert html_to_text(markup).split('\n') == [
+        'View the role (https://example.com/jobs?id=1&src=mail)',
+        'https://example.com/apply',
+        'https://example.com/logo',
+        'Back to top',
+    ]
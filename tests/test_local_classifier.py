@@ -0,0 +1,63 @@
+import csv
+import json
+
+import pytest
+
+import local_classifier
+import task_engine
+from mbox_to_csv import CSV_HEADER
+from task_engine import Task, run_tasks
+
+pytest.importorskip('sklearn')
+
+TASK = Task(
+    name='social test',
+    system_prompt='Is this email important? Answer with a JSON object with "importance" and "action_required".',
+    fields=[('importance', 'not important'), ('action_required', 'No action required')],
+    output_columns=['Subject', 'Importance', 'Action Required'],
+    copy_columns=['Subject'],
+    classifier_field='importance',
+    classifier_labels=('not important',),
+    keep=lambda data: data.get('importance') == 'important',
+)
+
+def write_table(path, bodies):
+    with open(path, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_HEADER)
+        for number, body in enumerate(bodies):
+            writer.writerow([f's{number}', 'a@example.com', '', 'b@example.com', f'<{number}@example.com>', body])
+
+def answer(request):
+    """The LLM's answer in these tests: recruiters are important, newsletters are not."""
+    if 'recruiter' in request[2]:
+        return json.dumps({'importance': 'important', 'action_required': 'Reply to the recruiter'})
+    return json.dumps({'importance': 'not important', 'action_required': 'No action required'})
+
+def test_classifier_learns_dropped_rows_and_only_answers_labels_that_need_nothing_else(tmp_path, monkeypatch,
+                                                                                        fake_api, word_tokenizer):
+    monkeypatch.setattr(local_classifier, 'CLASSIFIER_DIR', str(tmp_path / 'Classifiers'))
+    monkeypatch.setattr(local_classifier, '_classifiers', {})
+    sent = []
+
+    def run_requests(requests, packed):
+        sent.extend(requests)
+        return [answer(request) for request in requests]
+
+    monkeypatch.setattr(task_engine, 'run_requests', run_requests)
+    bodies = [f'A recruiter wants to talk about role {number}.' if number % 2 else
+              f'Weekly newsletter with discount code {number}.' for number in range(80)]
+    input_path, output_path = str(tmp_path / 'Social.csv'), str(tmp_path / 'social.csv')
+    write_table(input_path, bodies)
+    run_tasks(input_path, [(TASK, output_path)])
+    assert len(sent) == 80
+
+    # The newsletters the stage drops are still training data
+    assert local_classifier.train_classifier(TASK, input_path, output_path, threshold=0.6) is not None
+
+    sent.clear()
+    write_table(input_path, ['A recruiter asks about your availability.', 'Weekly newsletter with a discount code.'])
+    run_tasks(input_path, [(TASK, str(tmp_path / 'again.csv'))])
+    assert [request[2] for request in sent] == ['A recruiter asks about your availability.']
+    with open(tmp_path / 'again.csv', newline='', encoding='utf-8') as file:
+        assert [row['Action Required'] for row in csv.DictReader(file)] == ['Reply to the recruiter']
@@ -0,0 +1,47 @@
+from map_reduce import first_value, join_distinct, merge_answers, ranked, split_email, split_text, union
+
+FIELDS = [('importance', 'not important'), ('action', 'No action required'), ('links', []), ('title', '')]
+RULES = {'importance': ranked('urgent', 'important', 'not important'), 'action': join_distinct()}
+
+def test_merge_answers_applies_each_fields_rule():
+    answers = [
+        {'importance': 'not important', 'action': 'No action required', 'links': ['a'], 'title': ''},
+        {'importance': 'important', 'action': 'Reply by Friday', 'links': ['b', 'a'], 'title': 'Offer'},
+        {'importance': 'not important', 'action': 'Book a slot', 'links': [], 'title': 'Later title'},
+        {'action': 'Reply by Friday'},
+    ]
+    assert merge_answers(FIELDS, RULES, answers) == {
+        'importance': 'important',
+        'action': 'Reply by Friday; Book a slot',
+        'links': ['a', 'b'],
+        'title': 'Offer',
+    }
+
+def test_merge_answers_leaves_out_fields_no_part_answered():
+    assert merge_answers(FIELDS, RULES, [{'title': 'Only this'}]) == {'title': 'Only this'}
+
+def test_rules_fall_back_to_the_default():
+    assert first_value(['', None, 'x'], '') == 'x'
+    assert first_value(['', None], 'none') == 'none'
+    assert union(['', None], []) == []
+    assert union(['a', ['a', 'b']], []) == ['a', 'b']
+    assert ranked('high', 'low')(['unknown', 'other'], 'low') == 'unknown'
+    assert join_distinct()(['No action required'], 'No action required') == 'No action required'
+
+def test_split_text_cuts_at_the_coarsest_boundary_that_fits(word_tokenizer):
+    short = 'One short paragraph.'
+    long = ' '.join(f'Sentence {number} has five words.' for number in range(6))
+    parts = split_text(f'{short}\n\n{long}', 12)
+    assert parts[0] == f'{short}\n\n'
+    assert all(len(part.split()) <= 12 for part in parts)
+    assert ' '.join(parts).split() == f'{short}\n\n{long}'.split()
+
+def test_split_text_cuts_words_only_as_a_last_resort(word_tokenizer):
+    assert split_text('a b c d e', 2, separators=()) == ['a b', 'c d', 'e']
+
+def test_split_email_numbers_its_parts(word_tokenizer):
+    parts = split_email('First part here.\n\nSecond part here.', 3)
+    assert parts == [
+        '(Part 1 of 2 of a long email)\nFirst part here.\n\n',
+        '(Part 2 of 2 of a long email)\nSecond part here.',
+    ]
@@ -0,0 +1,31 @@
+import os
+
+import mbox_to_csv
+from mbox_index import find_rows, id_table_path_for, index_path_for, load_raw_message
+
+def message(number, message_id=None):
+    message_id = message_id or f'<{number}@example.com>'
+    return (f"From someone@example.com Mon Jan  1 00:00:00 2024\nMessage-ID: {message_id}\n"
+            f"Subject: s{number}\n\nBody {number}\n\n")
+
+def write_mbox(path, messages, mode='w'):
+    with open(path, mode=mode, encoding='utf-8') as file:
+        file.write(''.join(messages))
+
+def test_message_id_lookup_finds_every_row_and_follows_appends(tmp_path):
+    mbox_path, csv_path, manifest_path = str(tmp_path / 'Inbox.mbox'), str(tmp_path / 'Inbox.csv'), str(tmp_path / 'm')
+    write_mbox(mbox_path, [message(number) for number in range(50)] + [message(50, '<7@example.com>')])
+    mbox_to_csv.mbox_to_csv(mbox_path, csv_path, manifest_path)
+    index_path = index_path_for(csv_path)
+
+    assert find_rows(index_path, '<7@example.com>') == [7, 50]
+    assert find_rows(index_path, '<missing@example.com>') == []
+    assert load_raw_message(index_path, str(tmp_path), message_id='<42@example.com>').startswith(
+        b'Message-ID: <42@example.com>\nSubject: s42\n')
+    assert os.path.exists(id_table_path_for(index_path))
+
+    # Rows appended by the next conversion are found once the stale table is rebuilt
+    write_mbox(mbox_path, [message(number) for number in range(51, 55)], mode='a')
+    mbox_to_csv.mbox_to_csv(mbox_path, csv_path, manifest_path)
+    assert find_rows(index_path, '<53@example.com>') == [53]
+    assert find_rows(index_path, '<3@example.com>') == [3]
@@ -0,0 +1,116 @@
+import csv
+import json
+from email.message import EmailMessage
+
+import pytest
+
+import mbox_to_csv
+from mbox_index import index_record_count, index_path_for
+from mbox_to_csv import keys_path_for
+
+def message(number):
+    return (f"From someone@example.com Mon Jan  1 00:00:00 2024\nMessage-ID: <{number}@example.com>\n"
+            f"Subject: s{number}\n\nBody {number}\n\n")
+
+def write_mbox(path, numbers, mode='w'):
+    with open(path, mode=mode, encoding='utf-8') as file:
+        file.write(''.join(message(number) for number in numbers))
+
+def subjects(csv_path):
+    with open(csv_path, newline='', encoding='utf-8') as file:
+        return [row['Subject'] for row in csv.DictReader(file)]
+
+def test_interrupted_conversion_resumes_from_its_last_checkpoint(tmp_path, monkeypatch):
+    mbox_path, csv_path, manifest_path = str(tmp_path / 'Inbox.mbox'), str(tmp_path / 'Inbox.csv'), str(tmp_path / 'm')
+    write_mbox(mbox_path, range(5))
+    convert_message = mbox_to_csv.convert_message
+    converted = []
+
+    def interrupted(*args, **kwargs):
+        converted.append(args[0])
+        if len(converted) == 4:
+            raise KeyboardInterrupt
+        return convert_message(*args, **kwargs)
+
+    monkeypatch.setattr(mbox_to_csv, 'convert_message', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        mbox_to_csv.mbox_to_csv(mbox_path, csv_path, manifest_path, checkpoint_every=2)
+    with open(manifest_path, encoding='utf-8') as file:
+        entry = json.load(file)['Inbox.mbox']
+    assert set(entry) == {'offset', 'fingerprint', 'csv_size', 'rows', 'rescan_rows'}
+    assert entry['rows'] == 2
+
+    monkeypatch.setattr(mbox_to_csv, 'convert_message', convert_message)
+    write_mbox(mbox_path, [5, 6], mode='a')
+    written, keys = mbox_to_csv.mbox_to_csv(mbox_path, csv_path, manifest_path, checkpoint_every=2)
+    assert written == 5
+    assert subjects(csv_path) == [f's{number}' for number in range(7)]
+    assert keys == [f'<{number}@example.com>' for number in range(7)]
+    assert mbox_to_csv.read_keys(keys_path_for(csv_path), 7) == keys
+    assert index_record_count(index_path_for(csv_path)) == 7
+
+def test_reexported_mbox_only_adds_messages_not_converted_before(tmp_path):
+    mbox_path, csv_path, manifest_path = str(tmp_path / 'Inbox.mbox'), str(tmp_path / 'Inbox.csv'), str(tmp_path / 'm')
+    write_mbox(mbox_path, range(3))
+    mbox_to_csv.mbox_to_csv(mbox_path, csv_path, manifest_path)
+
+    write_mbox(mbox_path, [9, 0, 1, 2, 3])
+    written, keys = mbox_to_csv.mbox_to_csv(mbox_path, csv_path, manifest_path)
+    assert written == 2
+    assert subjects(csv_path) == ['s0', 's1', 's2', 's9', 's3']
+
+def test_rescan_only_checkpoints_after_new_rows(tmp_path, monkeypatch):
+    mbox_path, csv_path, manifest_path = str(tmp_path / 'Inbox.mbox'), str(tmp_path / 'Inbox.csv'), str(tmp_path / 'm')
+    write_mbox(mbox_path, range(6))
+    mbox_to_csv.mbox_to_csv(mbox_path, csv_path, manifest_path)
+    save_checkpoint = mbox_to_csv.save_checkpoint
+    checkpoints = []
+
+    def counted(*args, **kwargs):
+        checkpoints.append(args[5])  # rows
+        return save_checkpoint(*args, **kwargs)
+
+    monkeypatch.setattr(mbox_to_csv, 'save_checkpoint', counted)
+    write_mbox(mbox_path, [9, 10] + list(range(6)) + [7])
+    written, keys = mbox_to_csv.mbox_to_csv(mbox_path, csv_path, manifest_path, checkpoint_every=2)
+    assert written == 3
+    assert checkpoints == [8, 9]  # one after the first two new rows (not per skipped message), and the final one
+
+
+def sample_messages():
+    """Raw messages covering the structures parse_message_lazily reads without a full parse, and its fallbacks."""
+    plain = EmailMessage()
+    plain['Subject'], plain['Message-ID'] = 'Plain', '<plain@example.com>'
+    plain.set_content('Just text.\nTwo lines.')
+
+    alternative = EmailMessage()
+    alternative['Subject'] = 'Alternative'
+    alternative.set_content('Plain version café', cte='base64')
+    alternative.add_alternative('<p>HTML version</p>', subtype='html')
+
+    html_only = EmailMessage()
+    html_only['Subject'] = 'HTML only'
+    html_only.set_content('<p>Only <a href="https://example.com">markup</a></p>', subtype='html')
+    html_only.add_attachment(b'%PDF-1.4 binary', maintype='application', subtype='pdf', filename='cv.pdf')
+
+    mixed = EmailMessage()
+    mixed['Subject'] = 'Attachment first'
+    mixed.make_mixed()
+    mixed.add_attachment(b'\x00\x01' * 500, maintype='application', subtype='octet-stream', filename='data.bin')
+    nested = EmailMessage()
+    nested.set_content('Nested plain text', charset='iso-8859-1', cte='quoted-printable')
+    nested.add_alternative('<b>Nested HTML</b>', subtype='html')
+    mixed.attach(nested)
+
+    forwarded = EmailMessage()
+    forwarded['Subject'] = 'Forwarded message'
+    forwarded.set_content('See below')
+    forwarded.add_attachment(plain)
+
+    crlf = alternative.as_bytes().replace(b'\n', b'\r\n')
+    return [message.as_bytes() for message in (plain, alternative, html_only, mixed, forwarded)] + [crlf]
+
+def test_lazy_parsing_gives_the_same_rows_as_the_full_parse():
+    for raw_message in sample_messages():
+        message, body = mbox_to_csv.parse_message_lazily(raw_message)
+        assert mbox_to_csv.message_to_row(message, body) == mbox_to_csv.message_to_row(mbox_to_csv.parse_message(raw_message))
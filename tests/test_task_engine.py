@@ -0,0 +1,184 @@
+import csv
+import json
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import task_engine
+from mbox_to_csv import CSV_HEADER
+from task_engine import (
+    RETRY_QUEUE_BASE_DELAY, Task, failed_path, journal_path, load_failed, pack_groups, retry_failed, run_tasks,
+    unpack_answers
+)
+
+TASK = Task(
+    name='test',
+    system_prompt='Classify the email. Answer with a JSON object with "importance" and "category".',
+    fields=[('importance', ''), ('category', '')],
+    output_columns=['Subject', 'importance', 'category'],
+    copy_columns=['Subject'],
+)
+
+def write_table(tmp_path, bodies):
+    """An input table with one message per body, subjects s0, s1, ..."""
+    path = str(tmp_path / 'Inbox.csv')
+    with open(path, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_HEADER)
+        for number, body in enumerate(bodies):
+            writer.writerow([f's{number}', 'a@example.com', '', 'b@example.com', f'<{number}@example.com>', body])
+    return path
+
+def subjects(output_path):
+    with open(output_path, newline='', encoding='utf-8') as file:
+        return [row['Subject'] for row in csv.DictReader(file)]
+
+def test_interrupted_run_resumes_without_sending_finished_rows_again(tmp_path, monkeypatch, fake_api, word_tokenizer):
+    input_path = write_table(tmp_path, [f'Email number {number} about the project.' for number in range(5)])
+    output_path = str(tmp_path / 'out.csv')
+    monkeypatch.setattr(task_engine, 'STREAM_CHUNK_ROWS', 2)
+    run_requests = task_engine.run_requests
+    rounds = []
+
+    def interrupted(requests, packed):
+        rounds.append(len(requests))
+        if len(rounds) == 2:
+            raise KeyboardInterrupt
+        return run_requests(requests, packed)
+
+    monkeypatch.setattr(task_engine, 'run_requests', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        run_tasks(input_path, [(TASK, output_path)])
+    assert subjects(output_path) == ['s0', 's1']
+    assert os.path.exists(journal_path(output_path))
+
+    monkeypatch.setattr(task_engine, 'run_requests', run_requests)
+    sent = fake_api['requests']
+    run_tasks(input_path, [(TASK, output_path)])
+    assert subjects(output_path) == ['s0', 's1', 's2', 's3', 's4']
+    assert fake_api['requests'] - sent == 3
+    assert not os.path.exists(journal_path(output_path))
+
+def test_journal_of_a_changed_task_is_not_resumed(tmp_path, fake_api, word_tokenizer):
+    input_path = write_table(tmp_path, ['First email.', 'Second email.'])
+    output_path = str(tmp_path / 'out.csv')
+    with open(journal_path(output_path), mode='w', encoding='utf-8') as journal:
+        journal.write(json.dumps('another signature') + '\n' + json.dumps(['<0@example.com>', 10]) + '\n')
+
+    run_tasks(input_path, [(TASK, output_path)])
+    assert subjects(output_path) == ['s0', 's1']
+    assert fake_api['requests'] == 2
+
+def test_failed_rows_go_to_the_dead_letter_queue_and_are_retried_when_due(tmp_path, monkeypatch, fake_api,
+                                                                          word_tokenizer):
+    input_path = write_table(tmp_path, ['A fine email.', 'A broken email.', 'Another fine email.'])
+    output_path = str(tmp_path / 'out.csv')
+    run_requests = task_engine.run_requests
+
+    def garbled(requests, packed):
+        responses = run_requests(requests, packed)
+        return ['not JSON' if 'broken' in request[2] else response for request, response in zip(requests, responses)]
+
+    monkeypatch.setattr(task_engine, 'run_requests', garbled)
+    run_tasks(input_path, [(TASK, output_path)])
+    assert subjects(output_path) == ['s0', 's2']
+    entries = load_failed(failed_path(output_path))
+    assert list(entries) == ['<1@example.com>']
+    assert entries['<1@example.com>']['attempts'] == 1
+    assert entries['<1@example.com>']['error'].startswith('Error decoding JSON')
+
+    # Not due yet: nothing is sent
+    sent = fake_api['requests']
+    retry_failed(TASK, output_path)
+    assert fake_api['requests'] == sent
+    assert list(load_failed(failed_path(output_path))) == ['<1@example.com>']
+
+    # Due, and failing again: the delay doubles
+    later = time.time() + RETRY_QUEUE_BASE_DELAY + 1
+    monkeypatch.setattr(task_engine, 'time', SimpleNamespace(time=lambda: later, sleep=time.sleep))
+    retry_failed(TASK, output_path)
+    entry = load_failed(failed_path(output_path))['<1@example.com>']
+    assert entry['attempts'] == 2
+    assert entry['next_attempt'] == later + RETRY_QUEUE_BASE_DELAY * 2
+
+    # Due again, and answered: appended to the output and removed from the queue
+    later += RETRY_QUEUE_BASE_DELAY * 2 + 1
+    monkeypatch.setattr(task_engine, 'run_requests', run_requests)
+    retry_failed(TASK, output_path)
+    assert subjects(output_path) == ['s0', 's2', 's1']
+    assert not os.path.exists(failed_path(output_path))
+
+def test_retry_interrupted_after_appending_does_not_write_rows_twice(tmp_path, monkeypatch, fake_api, word_tokenizer):
+    input_path = write_table(tmp_path, ['A fine email.', 'A broken email.'])
+    output_path = str(tmp_path / 'out.csv')
+    run_requests = task_engine.run_requests
+    monkeypatch.setattr(task_engine, 'run_requests', lambda requests, packed: [None] * len(requests))
+    monkeypatch.setattr(task_engine, 'RETRY_QUEUE_BASE_DELAY', 0)
+    run_tasks(input_path, [(TASK, output_path)])
+    assert subjects(output_path) == []
+
+    # Interrupted after the recovered rows are on disk, before the queue is rewritten
+    monkeypatch.setattr(task_engine, 'run_requests', run_requests)
+    save_failed = task_engine.save_failed
+
+    def interrupted(path, entries):
+        monkeypatch.setattr(task_engine, 'save_failed', save_failed)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(task_engine, 'save_failed', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        retry_failed(TASK, output_path)
+    assert subjects(output_path) == ['s0', 's1']
+
+    sent = fake_api['requests']
+    retry_failed(TASK, output_path)
+    assert fake_api['requests'] == sent
+    assert subjects(output_path) == ['s0', 's1']
+    assert not os.path.exists(failed_path(output_path))
+    assert not os.path.exists(task_engine.retry_journal_path(output_path))
+
+def test_pack_groups_respects_the_email_and_token_limits(monkeypatch):
+    monkeypatch.setattr(task_engine, 'PACK_MAX_EMAILS', 3)
+    monkeypatch.setattr(task_engine, 'PACK_MAX_TOKENS', 10)
+    requests = [('model', 'prompt', 'x' * 8)] * 4 + [('model', 'other prompt', 'x' * 8), ('model', 'prompt', 'x' * 40)]
+    packed = [True, True, True, True, True, False]
+    groups = pack_groups(requests, packed)
+    assert [[index for index, request in group] for group in groups] == [[0, 1, 2], [3], [4], [5]]
+    # Known token counts replace the length estimate
+    groups = pack_groups(requests, packed, tokens=[5, 5, 5, 5, 5, 5])
+    assert [[index for index, request in group] for group in groups] == [[0, 1], [2, 3], [4], [5]]
+
+def test_unpack_answers_accepts_a_wrapped_array_and_rejects_anything_else():
+    assert unpack_answers('[{"id": 1, "importance": "high"}, {"importance": "low"}]') == {'1': {'importance': 'high'}}
+    assert unpack_answers('{"emails": [{"id": "2", "category": "x"}]}') == {'2': {'category': 'x'}}
+    with pytest.raises(ValueError):
+        unpack_answers('{"importance": "high"}')
+
+def test_packed_requests_share_one_call_and_each_get_their_own_answer(fake_api):
+    task_engine.load_environment()
+    requests = [('gpt-3.5-turbo', 'Classify.', f'Email body number {number}') for number in range(5)]
+    responses = task_engine.run_requests(requests, [True] * 5)
+    assert fake_api['requests'] == 1
+    assert [json.loads(response)['original_message'] for response in responses] == [
+        request[2] for request in requests
+    ]
+
+def test_unparseable_packs_are_split_and_missing_emails_sent_again(monkeypatch, fake_api):
+    contents = []
+
+    def call_with_retries(system_prompt, content, model):
+        contents.append(content)
+        emails = content.count('Email ')
+        if emails == 4:
+            return 'Sorry, I cannot help with that.'
+        if emails == 2:  # answers only the first email of the pack
+            return json.dumps([{'id': 1, 'importance': 'high'}])
+        return json.dumps({'importance': 'low'})
+
+    monkeypatch.setattr(task_engine, 'call_with_retries', call_with_retries)
+    requests = [('gpt-3.5-turbo', 'Classify.', f'Body {number}') for number in range(4)]
+    responses = task_engine.run_requests(requests, [True] * 4)
+    assert [json.loads(response)['importance'] for response in responses] == ['high', 'low', 'high', 'low']
+    assert len(contents) == 5  # the pack, its two halves, and the two emails the halves left out